@@ -1,14 +1,28 @@
 from random import randint
 
+import numpy as np
+
 from mdl_anonymizer.aggregation.TrajectoryAggregationInterface import TrajectoryAggregationInterface
+from mdl_anonymizer.distances.trajectory.Martinez2021.Distance import bounded_distances_to_many
 from mdl_anonymizer.entities.TimestampedLocation import TimestampedLocation
 from mdl_anonymizer.entities.Trajectory import Trajectory
+from mdl_anonymizer.utils import projection
 
 
 class Closest_trajectory_to_mean_trajectory(TrajectoryAggregationInterface):
 
     def __init__(self, p_lambda: float):
         self.p_lambda = p_lambda
+        self.sp_type = 'Haversine'
+        self.meters_per_unit = 1000  # km
+
+    def set_crs(self, crs):
+        if projection.is_projected(crs):
+            self.sp_type = 'Euclidean'
+            self.meters_per_unit = 1
+        else:
+            self.sp_type = 'Haversine'
+            self.meters_per_unit = 1000
 
     def compute(self, trajectories: list) -> Trajectory:
 
@@ -41,15 +55,20 @@ class Closest_trajectory_to_mean_trajectory(TrajectoryAggregationInterface):
         centroid_trajectory.add_locations(aggregated_locations)
 
         # Search the closest real trajectory to the centroid trajectory
-        min_trajectory = trajectories[0]
-        min_dist = float('inf')
-        for trajectory in trajectories:
-            dist = centroid_trajectory.default_distance(trajectory, self.p_lambda)
-            if dist < min_dist:
-                min_dist = dist
-                min_trajectory = trajectory
+        speeds = [self.__get_avg_speed(t) for t in trajectories]
+        distances = bounded_distances_to_many(centroid_trajectory, trajectories, self.p_lambda,
+                                              self.__get_avg_speed(centroid_trajectory), speeds, self.sp_type,
+                                              self.meters_per_unit)
+        min_trajectory = trajectories[int(np.argmin(distances))]
 
         aggregated_trajectory = Trajectory("C_" + str(randint(0, 10000)))
         aggregated_trajectory.add_locations(min_trajectory.locations)
 
         return aggregated_trajectory
+
+    def __get_avg_speed(self, trajectory: Trajectory) -> float:
+        # km/h, as in Martinez2021.Distance
+        if self.sp_type == 'Euclidean':
+            return trajectory.get_avg_speed(sp_type='Euclidean') / 1000
+
+        return trajectory.get_avg_speed(sp_type='Haversine')
@@ -7,3 +7,9 @@ class TrajectoryAggregationInterface:
 
     def compute(self, trajectories: list) -> Trajectory:
         pass
+
+    def set_crs(self, crs):
+        '''
+        CRS of the trajectories to aggregate, for the methods computing spatial distances (see Dataset.project)
+        '''
+        pass
@@ -8,8 +8,9 @@ from shapely.ops import transform
 from geopandas import GeoDataFrame
 import pyproj
 from functools import partial
-from haversine import haversine, Unit
+from mdl_anonymizer.utils import geodesic
 import math
+import numpy as np
 
 DEFAULT_VALUES = {
     "min_k": 5,
@@ -79,9 +80,10 @@ class QuadTreeHeatMap(AnalysisMethodInterface):
         This new dataset can be obtained with the export_result method.
         Two tqdm progress bars are used.
         """
-        # Transform dataset to NumPy
+        # Transform dataset to NumPy. Sectors are always in longitude and latitude, even if the dataset is projected
         logging.info("Transforming dataset to NumPy...")
-        np_dataset = self.dataset.to_numpy()
+        lon, lat, _, _ = self.dataset._export_columns()
+        np_dataset = np.column_stack((lon, lat))
 
         # Initialize QuadTree with bounding box
         logging.info("Initializing QuadTree...")
@@ -115,8 +117,8 @@ class QuadTreeHeatMap(AnalysisMethodInterface):
             QuadTree with the corresponding bounding box and locations inserted.
         """
         (min_x, min_y, max_x, max_y) = bbox
-        x_dist = haversine((min_y, min_x), (min_y, max_x), unit=Unit.METERS)
-        y_dist = haversine((min_y, min_x), (max_y, min_x), unit=Unit.METERS)
+        x_dist = geodesic.haversine(min_y, min_x, min_y, max_x) * 1000  # meters
+        y_dist = geodesic.haversine(min_y, min_x, max_y, min_x) * 1000  # meters
         min_side_dist = min(x_dist, y_dist)
         max_depth = int(
             math.log(min_side_dist / self.min_sector_length, 2))  # min_sector_length = min_side_dist / 2^max_depth
@@ -26,16 +26,17 @@ class SwapLocations(AnonymizationMethodInterface):
         :param R_s: km
         :param clustering_method:
         :param distance:
-        :param aggregation_method:
+        :param aggregation_method: default is Mean_trajectory
         '''
         self.dataset = dataset
         self.distance = distance if distance else Distance(dataset)
-        self.aggregation_method = aggregation_method if aggregation_method else Aggregation
+        self.aggregation_method = aggregation_method if aggregation_method else Mean_trajectory
         self.clustering_method = clustering_method if clustering_method \
             else SimpleMDAV(SimpleMDAVDataset(dataset, self.distance, self.aggregation_method))
 
         self.clusters = {}
         self.anonymized_dataset = dataset.__class__()
+        self.anonymized_dataset.set_crs(dataset.crs)
 
         self.k = k
         self.R_t = R_t
@@ -94,7 +95,7 @@ class SwapLocations(AnonymizationMethodInterface):
                         # Check temporal distance from 'landa' to 'l'
                         if landa.temporal_distance(l) <= self.R_t:
                             # Check spatial distance from 'landa' to 'l'
-                            if 0 <= landa.spatial_distance(l) <= self.R_s:
+                            if 0 <= self.__spatial_distance(landa, l) <= self.R_s:
                                 # We take the location with the minimum intra-cluster distance
                                 if TimestampedLocation.compute_centroid([tuple[1] for tuple in U]).distance(l) < d:
                                     d = landa.distance(l)
@@ -132,6 +133,13 @@ class SwapLocations(AnonymizationMethodInterface):
 
         logging.info("Done!\n")
 
+    def __spatial_distance(self, l1: TimestampedLocation, l2: TimestampedLocation) -> float:
+        # km. Projected coordinates are in meters (see Dataset.project)
+        if self.dataset.is_projected():
+            return l1.spatial_distance(l2, 'Euclidean') / 1000
+
+        return l1.spatial_distance(l2)
+
 
     def get_anonymized_dataset(self):
         return self.anonymized_dataset
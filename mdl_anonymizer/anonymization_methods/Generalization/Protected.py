@@ -647,8 +647,14 @@ class ProtectedGeneralization(AnonymizationMethodInterface):
                  strategy: str = DEFAULT_VALUES['strategy'],
                  time_strategy: str = DEFAULT_VALUES['time_strategy']):
 
+        # Tiles are merged and measured in longitude and latitude
+        if dataset.is_projected():
+            raise ValueError("ProtectedGeneralization does not support projected datasets. Unproject the dataset "
+                             "(see Dataset.unproject)")
+
         self.dataset = dataset
         self.anonymized_dataset = dataset.__class__()
+        self.anonymized_dataset.set_crs(dataset.crs)
 
         self.tile_size = tile_size
         self.time_interval = time_interval
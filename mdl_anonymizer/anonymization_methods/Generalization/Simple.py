@@ -36,6 +36,7 @@ class SimpleGeneralization(AnonymizationMethodInterface):
 
         self.dataset = dataset
         self.anonymized_dataset = dataset.__class__()
+        self.anonymized_dataset.set_crs(dataset.crs)
 
         self.tile_size = tile_size
         self.tile_shape = "squared"
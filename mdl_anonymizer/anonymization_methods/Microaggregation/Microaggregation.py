@@ -1,7 +1,7 @@
 import logging
 import random
 import time
-from mdl_anonymizer.aggregation import TrajectoryAggregationInterface
+from mdl_anonymizer.aggregation.TrajectoryAggregationInterface import TrajectoryAggregationInterface
 from mdl_anonymizer.anonymization_methods.AnonymizationMethodInterface import AnonymizationMethodInterface
 from mdl_anonymizer.clustering.ClusteringInterface import ClusteringInterface
 from mdl_anonymizer.entities.Dataset import Dataset
@@ -31,11 +31,14 @@ class Microaggregation(AnonymizationMethodInterface):
 
         self.dataset = dataset
         self.aggregation_method = aggregation_method
+        if isinstance(self.aggregation_method, TrajectoryAggregationInterface):
+            self.aggregation_method.set_crs(dataset.crs)
         self.clustering_method = clustering_method
 
         self.clusters = {}
         self.centroids = {}
         self.anonymized_dataset = dataset.__class__()
+        self.anonymized_dataset.set_crs(dataset.crs)
 
         self.k = k
 
@@ -50,6 +53,9 @@ class Microaggregation(AnonymizationMethodInterface):
         end = time.time()
         logging.info(f"Clustering finished! Time: {end - start}")
         logging.debug(self.clustering_method.mdav_dataset.assigned_to)
+        cache_stats = self.clustering_method.mdav_dataset.distance.cache_stats()
+        if cache_stats:
+            logging.info(f"Distance cache: {cache_stats}")
 
         logging.info("Building anonymized dataset...")
         self.clusters = self.clustering_method.get_clusters()
@@ -1,6 +1,6 @@
 import logging
 import time
-from mdl_anonymizer.aggregation import TrajectoryAggregationInterface
+from mdl_anonymizer.aggregation.TrajectoryAggregationInterface import TrajectoryAggregationInterface
 from mdl_anonymizer.clustering.ClusteringInterface import ClusteringInterface
 from mdl_anonymizer.anonymization_methods.AnonymizationMethodInterface import AnonymizationMethodInterface
 from mdl_anonymizer.entities.Dataset import Dataset
@@ -33,11 +33,14 @@ class TimePartMicroaggregation(AnonymizationMethodInterface):
 
         self.dataset = dataset
         self.aggregation_method = aggregation_method
+        if isinstance(self.aggregation_method, TrajectoryAggregationInterface):
+            self.aggregation_method.set_crs(dataset.crs)
         self.clustering_method = clustering_method
 
         self.clusters = {}
         self.centroids = {}
         self.anonymized_dataset = dataset.__class__()
+        self.anonymized_dataset.set_crs(dataset.crs)
 
         self.k = k
         self.interval = interval
@@ -62,6 +65,7 @@ class TimePartMicroaggregation(AnonymizationMethodInterface):
                     partition.append(ordered_trajectories[index])
                     index += 1
             dataset = Dataset()
+            dataset.set_crs(self.dataset.crs)
             dataset.trajectories = partition
             datasets.append(dataset)
             ordered_trajectories = ordered_trajectories[index:]
@@ -84,6 +88,9 @@ class TimePartMicroaggregation(AnonymizationMethodInterface):
         end = time.time()
         logging.info(f"Clustering finished! Time: {end - start}")
         logging.debug(self.clustering_method.mdav_dataset.assigned_to)
+        cache_stats = self.clustering_method.mdav_dataset.distance.cache_stats()
+        if cache_stats:
+            logging.info(f"Distance cache: {cache_stats}")
         logging.info('Anonymization finished!')
 
     def process_clusters(self):
@@ -10,7 +10,7 @@ from mdl_anonymizer.anonymization_methods.AnonymizationMethodInterface import An
 from mdl_anonymizer.anonymization_methods.SwapAllLocations.trajectory_anonymization import \
     apply_trajectory_anonymization
 from mdl_anonymizer.entities.Dataset import Dataset
-from mdl_anonymizer.utils import utils
+from mdl_anonymizer.utils import geodesic, utils
 
 DEFAULT_VALUES = {
     "k": 3,
@@ -55,6 +55,7 @@ class SwapLocations(AnonymizationMethodInterface):
 
         self.dataset = dataset
         self.anonymized_dataset = dataset.__class__()
+        self.anonymized_dataset.set_crs(dataset.crs)
         self.k = k
         self.min_r_s = min_r_s
         self.max_r_s = max_r_s
@@ -90,9 +91,13 @@ class SwapLocations(AnonymizationMethodInterface):
 
             # We have enough locations, check the spatial range
 
-            # Compute all the distances from tdf2 points to our timestamped_location
-            tdf2['distance'] = haversine_vector(tdf2[['lat', 'lng']].to_numpy(), l[['lat', 'lng']].to_numpy(),
-                                                unit=Unit.METERS, comb=True).flatten()
+            # Compute all the distances (meters) from tdf2 points to our timestamped_location
+            if self.dataset.is_projected():
+                tdf2['distance'] = geodesic.euclidean_pairwise(tdf2['lng'].to_numpy(), tdf2['lat'].to_numpy(),
+                                                               l['lng'].iloc[0], l['lat'].iloc[0])
+            else:
+                tdf2['distance'] = haversine_vector(tdf2[['lat', 'lng']].to_numpy(), l[['lat', 'lng']].to_numpy(),
+                                                    unit=Unit.METERS, comb=True).flatten()
 
             for R_s in spatial_range:
                 # tdf3 has all the locations inside both temporal and spatial range
@@ -159,7 +164,7 @@ class SwapLocations(AnonymizationMethodInterface):
         # anon_tdf.to_csv("anonymized_dataset_details_pre_traj.csv")
 
         logging.info("Applying trajectory anonymization")
-        anon_tdf = apply_trajectory_anonymization(anon_tdf, tile_size=self.tile_size)
+        anon_tdf = apply_trajectory_anonymization(anon_tdf, tile_size=self.tile_size, crs=self.dataset.crs)
         # anon_tdf.to_csv("anonymized_dataset_details_pre_remove_1loc.csv")
 
         # Remove again trajectories with just one location
@@ -1,17 +1,19 @@
 import logging
 
 import pandas
-from haversine import haversine, Unit
 from more_itertools import pairwise
+from skmob.utils.constants import DEFAULT_CRS
 
+from mdl_anonymizer.utils import geodesic, projection
 from mdl_anonymizer.utils.tessellation import spatial_tessellation
 
 tessellation_shape_type = "squared"
 
 
-def apply_trajectory_anonymization(tdf, tile_size: int = 1000):
+def apply_trajectory_anonymization(tdf, tile_size: int = 1000, crs=DEFAULT_CRS):
     '''
     Apply a simple trajectory anonymization method. Use when you have previously anonymized a dataset at location level.
+    If crs is projected, coordinates are taken as meters.
     :return:
     '''
 
@@ -25,15 +27,24 @@ def apply_trajectory_anonymization(tdf, tile_size: int = 1000):
     temp_tdf['p_lat'] = temp_tdf['lat'].shift(1)
     temp_tdf['p_datetime'] = temp_tdf['datetime'].shift(1)
 
+    # Distance (meters) to the previous location
+    if projection.is_projected(crs):
+        temp_tdf['distance'] = geodesic.euclidean_pairwise(temp_tdf['lng'].to_numpy(), temp_tdf['lat'].to_numpy(),
+                                                           temp_tdf['p_lng'].to_numpy(),
+                                                           temp_tdf['p_lat'].to_numpy())
+    else:
+        temp_tdf['distance'] = geodesic.haversine_pairwise(temp_tdf['lat'].to_numpy(), temp_tdf['lng'].to_numpy(),
+                                                           temp_tdf['p_lat'].to_numpy(),
+                                                           temp_tdf['p_lng'].to_numpy()) * 1000
+
     fake_locations = []
-    for index, l in temp_tdf.iterrows():
-        distance = haversine((l['lat'], l['lng']), (l['p_lat'], l['p_lng']), unit=Unit.METERS)
-        if l['tid'] == l['p_tid'] and distance >= tile_size:
-            # We create a list fake locations with just the timestamp (we interpolate the position later)
-            n_fakes = int(distance / tile_size)
-            for i in range(1, n_fakes + 1):
-                new_timestamp = l['p_datetime'] + (i * (l['datetime'] - l['p_datetime']) / (n_fakes + 1))
-                fake_locations.append([l['uid'], l['tid'], None, None, new_timestamp])
+    far_tdf = temp_tdf[(temp_tdf['tid'] == temp_tdf['p_tid']) & (temp_tdf['distance'] >= tile_size)]
+    for l in far_tdf.to_dict('records'):
+        # We create a list fake locations with just the timestamp (we interpolate the position later)
+        n_fakes = int(l['distance'] / tile_size)
+        for i in range(1, n_fakes + 1):
+            new_timestamp = l['p_datetime'] + (i * (l['datetime'] - l['p_datetime']) / (n_fakes + 1))
+            fake_locations.append([l['uid'], l['tid'], None, None, new_timestamp])
 
     # Data frame with just the fake locations to be computed
     fl_df = pandas.DataFrame(fake_locations, columns=['uid', 'tid', 'lng', 'lat', 'datetime'])
@@ -48,8 +59,8 @@ def apply_trajectory_anonymization(tdf, tile_size: int = 1000):
     logging.info(f"{len(fake_locations)} new fake locations created")
     logging.info(f"Tessellating")
     # Tessellate both the original dataframe and the datafram with fake locations
-    mfl_tdf, tessellation = spatial_tessellation(fl_tdf, tiles_shape="squared", meters=tile_size)
-    mtdf, tessellation = spatial_tessellation(tdf, tiles=tessellation)
+    mfl_tdf, tessellation = spatial_tessellation(fl_tdf, tiles_shape="squared", meters=tile_size, crs=crs)
+    mtdf, tessellation = spatial_tessellation(tdf, tiles=tessellation, crs=crs)
 
     # Compute tile sequences of the tdf with fake locations
     logging.info("Computing tile sequences")
@@ -5,13 +5,16 @@ from tqdm import tqdm
 
 from mdl_anonymizer.anonymization_methods.AnonymizationMethodInterface import AnonymizationMethodInterface
 from mdl_anonymizer.entities.Dataset import Dataset
-from mdl_anonymizer.entities.TimestampedLocation import TimestampedLocation
+from mdl_anonymizer.utils import geodesic
 
 DEFAULT_VALUES = {
     "spatial_thold": 0.2,
     "temporal_thold": 30,
 }
 
+# Locations of an interval compared at once with all the others, so memory is linear in the number of locations
+POSSIBLE_SWAPS_BLOCK = 1024
+
 class SwapMob(AnonymizationMethodInterface):
     """Implements the SwapMob anonymization method from Julián Salas, David Megías & Vicenç Torra ( https://doi.org/10.1007/978-3-319-99771-1_22 )"""
 
@@ -40,6 +43,7 @@ class SwapMob(AnonymizationMethodInterface):
         self.seed = seed
 
         self.anonymized_dataset = dataset.__class__()
+        self.anonymized_dataset.set_crs(dataset.crs)
 
     def run(self):
         """Performs the SwapMob anonymization method.
@@ -214,25 +218,27 @@ class SwapMob(AnonymizationMethodInterface):
             List of possible swaps. Each value is a tuple with the location index (within locs_in_inverval array) and
             a list of the close locations indexes (also within locs_in_interval array).
         """
-        # Transform locations in interval to location objects for distance computation
-        locations = []
-        for loc in locs_in_interval:
-            locations.append(TimestampedLocation(loc[2], loc[0], loc[1]))
+        xs = locs_in_interval[:, 0]
+        ys = locs_in_interval[:, 1]
+        trajectory_ids = locs_in_interval[:, 3]
 
-        # Get possible swaps
         possible_swaps = []
-        for idx1, l1 in enumerate(locations):
-            # Get close locations
-            close_locations = []
-            for idx2, l2 in enumerate(locations):
-                # If not comparing with the same location or another location of the trajectory
-                if idx1 != idx2 and locs_in_interval[idx1, 3] != locs_in_interval[idx2, 3]:
-                    # If locations are closer than the threshold
-                    if l1.spatial_distance(l2) < self.spatial_thold:
-                        close_locations.append(idx2)
-            # Add to possible_swaps
-            if len(close_locations) > 0:
-                possible_swaps.append((idx1, close_locations))
+        for start in range(0, len(locs_in_interval), POSSIBLE_SWAPS_BLOCK):
+            end = min(start + POSSIBLE_SWAPS_BLOCK, len(locs_in_interval))
+
+            # Distances (km) between the locations of the block and all the locations in the interval
+            if self.dataset.is_projected():
+                distances = geodesic.euclidean_matrix(xs[start:end], ys[start:end], xs, ys) / 1000
+            else:
+                distances = geodesic.haversine_matrix(ys[start:end], xs[start:end], ys, xs)
+
+            # Close locations, not comparing with the same location or another location of the trajectory
+            close = (distances < self.spatial_thold) & \
+                (trajectory_ids[start:end, np.newaxis] != trajectory_ids[np.newaxis, :])
+
+            # Get possible swaps
+            for row in np.flatnonzero(close.any(axis=1)).tolist():
+                possible_swaps.append((start + row, np.flatnonzero(close[row]).tolist()))
 
         return possible_swaps
 
@@ -82,8 +82,10 @@ def anonymizer(file_path: str):
     # Load dataset
     filename = data.get("input_file")
     dataset = Dataset()
-    dataset.from_file(filename)
+    dataset.from_file(filename, cache_folder=data.get("cache_folder"))
     # print("Dataset loaded")
+    if data.get("projected", False):
+        dataset.project(data.get("crs", None))
 
     # Get instance of requested method
     method = AnonymizationMethodFactory.get(data['method'], dataset, data.get('params', None))
@@ -104,7 +106,7 @@ def anonymizer(file_path: str):
     output_file = data.get('main_output_file', DEFAULT_ANONYMIZE_OUTPUT_FILE)
 
     output = method.get_anonymized_dataset()
-    output.to_csv(f"{output_folder}{output_file}")
+    output.to_file(f"{output_folder}{output_file}")
 
 
 def anonymizer_api(param_file_path: str):
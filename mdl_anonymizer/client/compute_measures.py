@@ -93,12 +93,12 @@ def compute_measures(param_file_path: str):
     typer.secho(f'Loading original dataset')
     filename = data.get("original_dataset")
     original_dataset = Dataset()
-    original_dataset.from_file(filename)
+    original_dataset.from_file(filename, cache_folder=data.get("cache_folder"))
 
     typer.secho(f'Loading anonymized dataset')
     filename = data.get("anonymized_dataset")
     anonymized_dataset = Dataset()
-    anonymized_dataset.from_file(filename)
+    anonymized_dataset.from_file(filename, cache_folder=data.get("cache_folder"))
 
     output_folder = data.get('output_folder', '')
     if output_folder != '':
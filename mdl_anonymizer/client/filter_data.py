@@ -88,7 +88,7 @@ def filter_dataset(param_file_path: str):
             max_speed = method["max_speed"]
     dataset.from_file(filename, min_locations=min_locations, datetime_key="timestamp")
     dataset.filter_by_speed(max_speed_kmh=max_speed)
-    dataset.to_csv(filename=data.get("output_filename"))
+    dataset.to_file(data.get("output_filename"))
 
 
 def filter_dataset_api(param_file_path: str):
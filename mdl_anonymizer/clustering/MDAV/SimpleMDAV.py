@@ -54,8 +54,7 @@ class SimpleMDAV(ClusteringInterface):
             # calculate r (farthest from centroid)
             farthest_r, _ = self.mdav_dataset.farthest_from(centroid)
             # calculate s (Farthest from r)
-            farthest_s, i = self.mdav_dataset.farthest_from(farthest_r)
-            self.mdav_dataset.distances = self.mdav_dataset.distances[:i]+self.mdav_dataset.distances[i+1:]
+            farthest_s, _ = self.mdav_dataset.farthest_from(farthest_r)
             # create cluster with r
             self.mdav_dataset.make_cluster(farthest_r, k)
             pbar.update(1)
@@ -76,6 +75,7 @@ class SimpleMDAV(ClusteringInterface):
         self.mdav_dataset.make_cluster_unselected()
         pbar.update(1)
         pbar.close()
+        logging.info(f"Distance evaluations: {self.mdav_dataset.pruning_stats()}")
 
     def get_clusters(self) -> dict:
         clusters = {}
@@ -6,8 +6,31 @@ from mdl_anonymizer.entities.Trajectory import Trajectory
 from mdl_anonymizer.distances.trajectory.DistanceInterface import DistanceInterface
 import numpy as np
 
+# Number of distances evaluated at once by the pruned farthest and nearest queries. It doubles every batch, up to the
+# maximum
+PRUNING_BATCH = 8
+MAX_PRUNING_BATCH = 1024
+
+
+def _batches(n: int):
+    start = 0
+    size = PRUNING_BATCH
+    while start < n:
+        yield start, min(start + size, n)
+        start += size
+        size = min(size * 2, MAX_PRUNING_BATCH)
+
 
 class SimpleMDAVDataset(MDAVDatasetInterface):
+    '''
+    Trajectories are never moved: the eligible ones are marked by a boolean mask and the distances (and bounds) from
+    the current reference are kept by position of the trajectory in the dataset.
+    Ties are broken by the order of the eligible trajectories, which every partition of the nearest ones changes (as if
+    they were still moved around an array).
+    If the distance can bound the distances to the eligible trajectories (see DistanceInterface.bounds_many), the
+    farthest trajectory is found evaluating only the distances whose upper bounds do not discard it. The nearest ones
+    are not: the order left by the partition depends on every distance
+    '''
 
     def __init__(self, dataset: Dataset, distance: DistanceInterface,
                  aggregation_method: TrajectoryAggregationInterface = None):
@@ -15,8 +38,12 @@ class SimpleMDAVDataset(MDAVDatasetInterface):
         for i, t in enumerate(self.dataset.trajectories):
             t.index = i
         self.distance = distance
-        self.trajectories_elegible = np.array(self.dataset.trajectories)
+        self.__set_trajectories()
         self.distances = None
+        self.reference = None
+        self.upper_bounds = None
+        self.candidates = 0                               # Distances queried
+        self.evaluated = 0                                # Distances actually computed
         self.unselected_len = len(dataset)
         self.assigned_to = {}                             # Cluster assigned to every trajectory
         self.cluster_id = 0
@@ -24,14 +51,24 @@ class SimpleMDAVDataset(MDAVDatasetInterface):
             self.aggregation_method = Mean_trajectory
         else:
             self.aggregation_method = aggregation_method
+        if isinstance(self.aggregation_method, TrajectoryAggregationInterface):
+            # Instances (not classes with static methods) are told the CRS of the trajectories
+            self.aggregation_method.set_crs(dataset.crs)
 
     def set_dataset(self, dataset: Dataset):
         self.dataset = dataset
-        self.trajectories_elegible = np.array(self.dataset.trajectories)
+        self.__set_trajectories()
         self.unselected_len = len(dataset)
         self.assigned_to = {}
         self.cluster_id = 0
 
+    def __set_trajectories(self):
+        self.trajectories = np.array(self.dataset.trajectories)
+        self.eligible = np.ones(len(self.trajectories), dtype=bool)
+        # Order in which the eligible trajectories are considered (ties are broken by it). None while it is the order of
+        # the dataset
+        self.order = None
+
     def reset(self):
         self.unselected_len = len(self.dataset)
         self.assigned_to = {}                        # Cluster assigned to every trajectory
@@ -44,37 +81,98 @@ class SimpleMDAVDataset(MDAVDatasetInterface):
         # Collect unselected trajectories
         raise NotImplementedError
 
+    def __eligible_positions(self) -> np.ndarray:
+        if self.order is None:
+            return np.flatnonzero(self.eligible)
+
+        return self.order[self.eligible[self.order]]
+
     def make_cluster(self, traj: Trajectory, k):
-        self.trajectories_elegible = self.trajectories_elegible[np.argpartition(self.distances, k-1)]
         closest = [traj]
-        closest.extend(self.trajectories_elegible[:k-1])
-        self.trajectories_elegible = self.trajectories_elegible[k-1:]
+        positions = self.__eligible_positions()
+        self.__evaluate(positions)
+        # The eligible trajectories are considered in the order of the partition from now on
+        partition = positions[np.argpartition(self.distances[positions], k-1)]
+        nearest = partition[:k-1]
+        self.order = partition
+        closest.extend(self.trajectories[nearest])
+        self.eligible[nearest] = False
 
         for t in closest:
             self.assigned_to[t.index] = self.cluster_id
         self.cluster_id += 1
 
     def make_cluster_unselected(self):
-        for t in self.trajectories_elegible:
+        for t in self.trajectories[self.__eligible_positions()]:
             self.assigned_to[t.index] = self.cluster_id
         self.cluster_id += 1
 
     def farthest_from(self, traj: Trajectory):
         self.calculate_distances(traj)
-        index = np.argmax(self.distances)
-        farthest = self.trajectories_elegible[index]
-        self.trajectories_elegible = np.delete(self.trajectories_elegible, index)
+        positions = self.__eligible_positions()
+        index = self.__farthest(positions)
+        farthest = self.trajectories[positions[index]]
+        self.eligible[positions[index]] = False
 
         return farthest, index
 
     def calculate_distances(self, traj: Trajectory):
-        self.distances = [self.distance.compute(traj, t) for t in self.trajectories_elegible]
+        '''
+        Distances from the trajectory to the eligible ones. If they can be bounded, they are only computed on demand
+        (NaN until then)
+        '''
+        self.reference = traj
+        positions = self.__eligible_positions()
+        candidates = self.trajectories[positions]
+        self.candidates += len(positions)
+        self.distances = np.full(len(self.trajectories), np.nan)
+
+        bounds = self.distance.bounds_many(traj, candidates)
+        if bounds is None:
+            self.distances[positions] = self.distance.compute_many(traj, candidates)
+            self.evaluated += len(positions)
+            self.upper_bounds = None
+        else:
+            self.upper_bounds = np.full(len(self.trajectories), np.nan)
+            _, self.upper_bounds[positions] = bounds
+
+    def __evaluate(self, positions: np.ndarray):
+        positions = positions[np.isnan(self.distances[positions])]
+        if len(positions) > 0:
+            self.distances[positions] = self.distance.compute_many(self.reference, self.trajectories[positions])
+            self.evaluated += len(positions)
+
+    def __farthest(self, positions: np.ndarray) -> int:
+        '''
+        Index (within the positions) of the farthest eligible trajectory (the first one if tied, as np.argmax)
+        '''
+        if self.upper_bounds is not None:
+            # Candidates by decreasing upper bound, until no other one can reach the farthest distance found
+            upper_bounds = self.upper_bounds[positions]
+            order = np.argsort(-upper_bounds, kind='stable')
+            farthest = -np.inf
+            for start, end in _batches(len(order)):
+                if upper_bounds[order[start]] < farthest:
+                    break
+                batch = positions[order[start:end]]
+                self.__evaluate(batch)
+                farthest = max(farthest, np.max(self.distances[batch]))
+
+        distances = self.distances[positions]
+        return int(np.argmax(np.where(np.isnan(distances), -np.inf, distances)))
+
+    def pruning_stats(self) -> dict:
+        return {
+            'candidates': self.candidates,
+            'evaluated': self.evaluated,
+            'pruning_rate': round(1 - self.evaluated / self.candidates, 4) if self.candidates else 0.0
+        }
 
     def unselected_length(self):
-        return len(self.trajectories_elegible)
+        return int(np.count_nonzero(self.eligible))
 
     def get_num_clusters(self):
         return self.cluster_id
 
     def __len__(self):
-        return len(self.dataset.trajectories)
\ No newline at end of file
+        return len(self.dataset.trajectories)
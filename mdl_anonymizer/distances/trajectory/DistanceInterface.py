@@ -1,5 +1,7 @@
 from abc import abstractmethod, ABC
 
+import numpy as np
+
 from mdl_anonymizer.entities.Trajectory import Trajectory
 
 
@@ -8,6 +10,25 @@ class DistanceInterface(ABC):
     def compute(self, trajectory1: Trajectory, trajectory2: Trajectory) -> float:
         raise NotImplementedError
 
+    def compute_many(self, reference: Trajectory, candidates) -> np.ndarray:
+        '''
+        Distances from the reference trajectory to every candidate trajectory. Override it to batch the computation
+        '''
+        return np.fromiter((self.compute(reference, t) for t in candidates), dtype=np.float64, count=len(candidates))
+
+    def bounds_many(self, reference: Trajectory, candidates):
+        '''
+        Lower and upper bounds (arrays) of the distances from the reference trajectory to every candidate, much cheaper
+        to compute than the distances themselves. None if the distance can not bound them
+        '''
+        return None
+
+    def cache_stats(self) -> dict:
+        '''
+        Statistics of the cache of computed distances (if any)
+        '''
+        return {}
+
     @abstractmethod
     def filter_dataset(self):
         raise NotImplementedError
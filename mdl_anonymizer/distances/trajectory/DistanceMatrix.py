@@ -0,0 +1,299 @@
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from mdl_anonymizer.entities.Trajectory import Trajectory
+from mdl_anonymizer.utils.utils import memory
+
+# Approximate size of an entry of a hash table (int key, float value and OrderedDict node)
+ENTRY_BYTES = 150
+# The available memory is checked every time this number of distances have been hashed
+MEMORY_CHECK_INTERVAL = 100000
+MIN_AVAILABLE_MEMORY = 1000  # MB
+
+
+def fingerprint(trajectories: list) -> str:
+    '''
+    SHA-256 of the locations of the trajectories, in order
+    '''
+    sha = hashlib.sha256()
+    for t in trajectories:
+        for array in t.get_arrays():
+            sha.update(np.int64(len(array)).tobytes())
+            sha.update(np.ascontiguousarray(array).tobytes())
+
+    return sha.hexdigest()
+
+
+class SLRUCache:
+    '''
+    Segmented LRU cache. New entries are probationary and are promoted to the protected segment on their first hit,
+    so entries used once are evicted before the frequently used ones
+    '''
+    PROTECTED_RATIO = 0.8
+
+    def __init__(self, capacity: int):
+        self.capacity = 0
+        self.probationary = OrderedDict()
+        self.protected = OrderedDict()
+        self.evictions = 0
+        self.resize(capacity)
+
+    def resize(self, capacity: int):
+        self.capacity = max(int(capacity), 0)
+        self.__evict()
+
+    def get(self, key):
+        value = self.protected.get(key)
+        if value is not None:
+            self.protected.move_to_end(key)
+            return value
+
+        value = self.probationary.pop(key, None)
+        if value is not None:
+            # Promotion. The least recently used protected entry goes back to the probationary segment
+            self.protected[key] = value
+            if len(self.protected) > self.capacity * self.PROTECTED_RATIO:
+                old_key, old_value = self.protected.popitem(last=False)
+                self.probationary[old_key] = old_value
+
+        return value
+
+    def put(self, key, value):
+        if key in self.protected:
+            self.protected[key] = value
+            self.protected.move_to_end(key)
+            return
+
+        self.probationary[key] = value
+        self.probationary.move_to_end(key)
+        self.__evict()
+
+    def __evict(self):
+        while len(self) > self.capacity:
+            if self.probationary:
+                self.probationary.popitem(last=False)
+            else:
+                self.protected.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.probationary = OrderedDict()
+        self.protected = OrderedDict()
+
+    def __len__(self):
+        return len(self.probationary) + len(self.protected)
+
+
+class DistanceMatrix:
+    '''
+    Store of the distances computed between pairs of trajectories, bounded by a memory budget.
+    The pairs of trajectories of the dataset are indexed by their position in it: in a condensed upper-triangle array
+    if it fits in the budget, in a SLRU cache otherwise. Distances to any other trajectory (e.g. centroids) are
+    cached by trajectory id with the rest of the budget.
+    The condensed array can be a memory-mapped .npy file, so the distances computed by a run are reused by the next ones
+    '''
+
+    def __init__(self, trajectories: list, max_bytes: float = None, dtype=np.float32, filename: str = None):
+        '''
+        max_bytes : float, optional
+                    Memory budget (Default is half of the available memory)
+        filename : str, optional
+                    File to keep the condensed array in (Default is None, in memory)
+        '''
+        # Keep a reference to the trajectories, so their object ids are never reused
+        self.trajectories = list(trajectories)
+        self.positions = {id(t): i for i, t in enumerate(self.trajectories)}
+        self.n = len(self.trajectories)
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+
+        if max_bytes is None:
+            max_bytes = memory() * 1024 * 1024 / 2
+        size = self.n * (self.n - 1) // 2
+        self.dense = size * self.dtype.itemsize <= max_bytes
+        if self.dense:
+            max_bytes -= size * self.dtype.itemsize
+
+        self.filename = filename if self.dense else None
+        self.condensed = None
+        # Pairs of trajectories of the dataset (if not dense) and pairs with other trajectories share the cache
+        self.cache = SLRUCache(max_bytes // ENTRY_BYTES)
+        self.insertions = 0
+        self.clear()
+
+    def clear(self):
+        '''
+        Forget the stored distances. Those of a file are kept, as they are still valid
+        '''
+        if self.filename is not None:
+            if self.condensed is None:
+                self.condensed = self.__open_file()
+        elif self.dense:
+            self.condensed = np.full(self.n * (self.n - 1) // 2, np.nan, dtype=self.dtype)
+        self.cache.clear()
+
+    def __open_file(self) -> np.ndarray:
+        shape = (self.n * (self.n - 1) // 2,)
+        if os.path.isfile(self.filename):
+            try:
+                condensed = np.lib.format.open_memmap(self.filename, mode='r+')
+                if condensed.shape == shape and condensed.dtype == self.dtype:
+                    logging.info(f"Reusing distances stored in {self.filename}")
+                    return condensed
+            except ValueError:
+                pass
+            logging.warning(f"Distances stored in {self.filename} do not match the dataset. Computing them again")
+
+        # Write to a temporary file and rename it, so a partial file is never read
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(dir=folder, suffix=".npy")
+        os.close(fd)
+        condensed = np.lib.format.open_memmap(tmp_filename, mode='w+', dtype=self.dtype, shape=shape)
+        condensed[:] = np.nan
+        condensed.flush()
+        del condensed
+        os.replace(tmp_filename, self.filename)
+
+        return np.lib.format.open_memmap(self.filename, mode='r+')
+
+    def flush(self):
+        '''
+        Write the distances to the file (if any)
+        '''
+        if isinstance(self.condensed, np.memmap):
+            self.condensed.flush()
+
+    def round(self, distances):
+        '''
+        Distances rounded to the precision they are stored with, so computed and stored distances are the same
+        '''
+        rounded = np.asarray(distances, dtype=self.dtype).astype(np.float64)
+
+        return float(rounded) if rounded.ndim == 0 else rounded
+
+    def __cache(self, key, d: float):
+        self.cache.put(key, d)
+
+        # Coarse memory control: shrink the cache if the system is running out of memory
+        self.insertions += 1
+        if self.insertions % MEMORY_CHECK_INTERVAL == 0 and memory() < MIN_AVAILABLE_MEMORY:
+            logging.warning(f"Memory low, shrinking the distance cache to {len(self.cache) // 2} distances")
+            self.cache.resize(len(self.cache) // 2)
+
+    def __condensed_index(self, i, j):
+        # i < j
+        return i * self.n - i * (i + 1) // 2 + j - i - 1
+
+    def __key(self, trajectory1: Trajectory, trajectory2: Trajectory):
+        i = self.positions.get(id(trajectory1))
+        j = self.positions.get(id(trajectory2))
+        if i is None or j is None:
+            return None
+        if i > j:
+            i, j = j, i
+
+        return self.__condensed_index(i, j)
+
+    @staticmethod
+    def __other_key(trajectory1: Trajectory, trajectory2: Trajectory) -> tuple:
+        if trajectory1.str_id <= trajectory2.str_id:
+            return trajectory1.str_id, trajectory2.str_id
+
+        return trajectory2.str_id, trajectory1.str_id
+
+    def get(self, trajectory1: Trajectory, trajectory2: Trajectory):
+        '''
+        Stored distance between both trajectories, None if it has not been computed. The distance of a trajectory to
+        itself is always known (0)
+        '''
+        if trajectory1 is trajectory2:
+            d = 0.0
+        else:
+            key = self.__key(trajectory1, trajectory2)
+            if key is None:
+                d = self.cache.get(self.__other_key(trajectory1, trajectory2))
+            elif self.dense:
+                d = self.condensed[key]
+                d = None if np.isnan(d) else float(d)
+            else:
+                d = self.cache.get(key)
+
+        if d is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return d
+
+    def put(self, trajectory1: Trajectory, trajectory2: Trajectory, d: float):
+        if trajectory1 is trajectory2:
+            # Not stored, see get
+            return
+        key = self.__key(trajectory1, trajectory2)
+        if key is None:
+            self.__cache(self.__other_key(trajectory1, trajectory2), d)
+        elif self.dense:
+            self.condensed[key] = d
+        else:
+            self.__cache(key, d)
+
+    def __condensed_indices(self, reference: Trajectory, candidates) -> np.ndarray:
+        # Condensed index of every pair, -1 for the reference itself (distance 0). Only for dense matrices and trajectories of the
+        # dataset
+        i = self.positions[id(reference)]
+        j = np.fromiter((self.positions[id(t)] for t in candidates), dtype=np.int64, count=len(candidates))
+        low = np.minimum(i, j)
+        high = np.maximum(i, j)
+        indices = low * self.n - low * (low + 1) // 2 + high - low - 1
+
+        return np.where(low == high, -1, indices)
+
+    def __batchable(self, reference: Trajectory, candidates) -> bool:
+        return self.dense and id(reference) in self.positions and all(id(t) in self.positions for t in candidates)
+
+    def get_many(self, reference: Trajectory, candidates) -> np.ndarray:
+        '''
+        Stored distances from the reference trajectory to every candidate, NaN if they have not been computed
+        '''
+        if not self.__batchable(reference, candidates):
+            distances = [self.get(reference, t) for t in candidates]
+            return np.array([np.nan if d is None else d for d in distances], dtype=np.float64)
+
+        indices = self.__condensed_indices(reference, candidates)
+        distances = self.condensed[indices].astype(np.float64)
+        distances[indices < 0] = 0.0
+        missing = int(np.count_nonzero(np.isnan(distances)))
+        self.misses += missing
+        self.hits += len(candidates) - missing
+
+        return distances
+
+    def put_many(self, reference: Trajectory, candidates, distances: np.ndarray):
+        if not self.__batchable(reference, candidates):
+            for t, d in zip(candidates, distances.tolist()):
+                self.put(reference, t, d)
+            return
+
+        indices = self.__condensed_indices(reference, candidates)
+        valid = indices >= 0
+        self.condensed[indices[valid]] = distances[valid]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        return {
+            'dense': self.dense,
+            'file': self.filename,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'cached': len(self.cache),
+            'evictions': self.cache.evictions
+        }
@@ -13,9 +13,15 @@ from mdl_anonymizer.distances.trajectory.DistanceInterface import DistanceInterf
 
 class Distance(DistanceInterface):
 
-    def __init__(self, dataset: Dataset):
+    def __init__(self, dataset: Dataset, batch_size: int = None, n_jobs: int = None):
+        '''
+        batch_size : int, optional
+                     Shortest paths of the distance graph computed from batch_size sources at a time (see DistanceGraph)
+        n_jobs : int, optional
+                     Number of processes to compute the weights of the distance graph (Default is 1)
+        '''
         self.dataset = dataset
-        self.distance_graph = DistanceGraph(dataset)
+        self.distance_graph = DistanceGraph(dataset, batch_size=batch_size, n_jobs=n_jobs)
         self.distance_graph.compute()
         # self.distance_matrix = self.__compute_distance_matrix()
         self.distance_matrix = defaultdict(dict)
@@ -119,7 +125,11 @@ class Distance(DistanceInterface):
     def filter_dataset(self):
         large_component = self.distance_graph.get_large_component()
         filtered_dataset = self.dataset.__class__()
+        filtered_dataset.set_crs(self.dataset.crs)
         filtered_dataset.set_description("FILTERED DATASET")
         filtered_dataset.trajectories = [t for t in self.dataset.trajectories if t.id in large_component]
 
         return filtered_dataset
+
+    def clear_memory(self):
+        self.distance_matrix = defaultdict(dict)
@@ -1,21 +1,91 @@
+import itertools
 import logging
 import math
+from multiprocessing import Pool
+
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
 
-from mdl_anonymizer.distances.trajectory.DomingoTrujillo2012.TrajectoryUtils import get_p_contemporary, get_overlap_time
+from mdl_anonymizer.distances.trajectory.DomingoTrujillo2012.TrajectoryUtils import get_contemporary_pairs
 from mdl_anonymizer.entities.Dataset import Dataset
-from mdl_anonymizer.entities.TimestampedLocation import TimestampedLocation
 from mdl_anonymizer.entities.Trajectory import Trajectory
-from mdl_anonymizer.utils.Interpolation import interpolate
+from mdl_anonymizer.entities.TrajectoryView import TrajectoryView
+
+
+def synchronized_distance(timestamps_1, xs_1, ys_1, timestamps_2, xs_2, ys_2):
+    '''
+    Distance between two trajectories given as arrays sorted by timestamp, None if they are not p-contemporary.
+    The second trajectory must have a location at every timestamp of the first one within their overlap time
+    '''
+    first_1, last_1 = int(timestamps_1[0]), int(timestamps_1[-1])
+    first_2, last_2 = int(timestamps_2[0]), int(timestamps_2[-1])
+
+    # p-contemporary and overlap time, as TrajectoryUtils.get_p_contemporary and get_overlap_time
+    overlap = max(min(last_1, last_2) - max(first_1, first_2), 0)
+    p = round(100 * min((overlap / (last_1 - first_1)), (overlap / (last_2 - first_2))), 2)
+    if p <= 0:
+        return None
+    ot = (max(first_1, first_2), min(last_1, last_2))
+
+    start = np.searchsorted(timestamps_1, ot[0], side='left')
+    end = np.searchsorted(timestamps_1, ot[1], side='right')
+    # First location of every timestamp of the overlap
+    timestamps = timestamps_1[start:end]
+    idx_1 = np.searchsorted(timestamps_1, timestamps, side='left')
+    idx_2 = np.searchsorted(timestamps_2, timestamps, side='left')
+    # Within the overlap, so idx_2 is a valid index even if the timestamp is missing
+    missing = timestamps_2[idx_2] != timestamps
+    if np.any(missing):
+        raise Exception(f"Trajectories must be synchronized: no location at timestamp {timestamps[missing][0]}")
+
+    denominator = float(pow(ot[1] - ot[0], 2))
+    terms = (np.square(xs_1[idx_1] - xs_2[idx_2]) + np.square(ys_1[idx_1] - ys_2[idx_2])) / denominator
+    # Accumulated sequentially (not pairwise as np.sum), so the weights do not depend on the implementation
+    d = float(np.cumsum(terms)[-1]) if len(terms) > 0 else 0.0
+
+    return math.sqrt(d) / p
+
+
+# Synchronized trajectories of the worker processes computing the edge weights
+_shared = {}
+
+
+def _init_graph_worker(packed: dict):
+    _shared['packed'] = packed
+
+
+def _edge_weights(pairs: np.ndarray) -> list:
+    packed = _shared['packed']
+    return [synchronized_distance(*_unpack(packed, i), *_unpack(packed, j)) for i, j in pairs.tolist()]
+
+
+def _unpack(packed: dict, i: int) -> tuple:
+    start, end = packed['offsets'][i], packed['offsets'][i + 1]
+    return packed['timestamps'][start:end], packed['xs'][start:end], packed['ys'][start:end]
 
 
 class DistanceGraph:
-    def __init__(self, dataset: Dataset = None):
+    def __init__(self, dataset: Dataset = None, batch_size: int = None, n_jobs: int = None):
+        '''
+        batch_size : int, optional
+                     Compute the shortest paths with SciPy from up to batch_size sources at a time, caching them for all
+                     the later queries of those sources (Default is None, a NetworkX search for every pair)
+        n_jobs : int, optional
+                     Number of processes to compute the edge weights (Default is 1)
+        '''
         if dataset and dataset.is_loaded():
             self.dataset = dataset
 
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+
         self.graph = nx.Graph()
+        self.__clear_shortest_paths()
 
     def compute(self):
         logging.info("Computing distance graph")
@@ -29,27 +99,17 @@ class DistanceGraph:
         logging.info("\tTrajectories synchronized")
 
         self.__build_graph()
+        self.__clear_shortest_paths()
 
         logging.info("Distance graph computed!")
 
     def __synchronize_trajectories(self):
-        # Collect all timestamps
-        timestamps = []
-        for T in self.dataset.trajectories:
-            for L in T.locations:
-                timestamps.append(L.timestamp)
-
-        # Converting to set we remove duplicates
-        timestamps = list(set(timestamps))
-        timestamps.sort()
-
-        self.synchronyzed_trajectories = []
-        for T_i in self.dataset.trajectories:
-            synchro_T = self.__synchronize_trajectory(T_i, timestamps)
-            self.synchronyzed_trajectories.append(synchro_T)
-            # logging.debug(f'Trajectory {T_i.id} synchronized!')
+        # Collect all timestamps, without duplicates
+        self.timestamps = np.unique(np.concatenate([T.get_arrays()[0] for T in self.dataset.trajectories]))
 
-        # logging.debug(self.synchronyzed_trajectories)
+        self.raw_trajectories = list(self.dataset.trajectories)
+        self.synchronyzed_trajectories = [self.__synchronize_trajectory(T_i, self.timestamps)
+                                          for T_i in self.raw_trajectories]
 
     def __get_synchro_trajectory(self, id):
         for t in self.synchronyzed_trajectories:
@@ -57,53 +117,66 @@ class DistanceGraph:
                 return t
         return None
 
-    def __synchronize_trajectory(self, T: Trajectory, timestamps):
-
-        synchro_T = Trajectory(T.id)
-        filter_timestamps = [t for t in timestamps if (T.get_first_timestamp() <= t <= T.get_last_timestamp())]
-        for ts in filter_timestamps:
-            loc = T.get_location_by_timestamp(ts)
-            if loc:
-                synchro_T.add_location(loc)
-            else:
-                # Interpolate
-                prev_loc = T.get_previous_location_by_timestamp(ts)
-                next_loc = T.get_next_location_by_timestamp(ts)
-                point = interpolate(prev_loc, next_loc, ts)
-                interpolated_location = TimestampedLocation(ts, round(point[0], 6), round(point[1], 6))
-                synchro_T.add_location(interpolated_location)
-
-        return synchro_T
+    def __synchronize_trajectory(self, T: Trajectory, timestamps: np.ndarray) -> TrajectoryView:
+        '''
+        Locations of the trajectory at all the timestamps (sorted) within its time span
+        '''
+        raw_timestamps, _, _ = T.get_arrays()
+        start = np.searchsorted(timestamps, raw_timestamps[0], side='left')
+        end = np.searchsorted(timestamps, raw_timestamps[-1], side='right')
+        timestamps = timestamps[start:end]
+        xs, ys = self.__locations_at(T, timestamps)
+
+        return TrajectoryView(T.id, None, timestamps, xs, ys)
+
+    @staticmethod
+    def __locations_at(T: Trajectory, timestamps: np.ndarray) -> tuple:
+        '''
+        Coordinates of the trajectory at the timestamps (within its time span): those of its location with the same
+        timestamp if any, interpolated between the previous and the next location otherwise (rounded to 6 decimals)
+        '''
+        raw_timestamps, raw_xs, raw_ys = T.get_arrays()
+        idx = np.searchsorted(raw_timestamps, timestamps, side='left')
+        found = raw_timestamps[np.minimum(idx, len(raw_timestamps) - 1)] == timestamps
+
+        xs = np.empty(len(timestamps))
+        ys = np.empty(len(timestamps))
+        xs[found] = raw_xs[idx[found]]
+        ys[found] = raw_ys[idx[found]]
+
+        # Interpolate, as utils.Interpolation.interpolate
+        prev_idx = idx[~found] - 1
+        next_idx = idx[~found]
+        t = (timestamps[~found] - raw_timestamps[prev_idx]) / (raw_timestamps[next_idx] - raw_timestamps[prev_idx])
+        interpolated_xs = (1 - t) * raw_xs[prev_idx] + t * raw_xs[next_idx]
+        interpolated_ys = (1 - t) * raw_ys[prev_idx] + t * raw_ys[next_idx]
+        xs[~found] = [round(x, 6) for x in interpolated_xs.tolist()]
+        ys[~found] = [round(y, 6) for y in interpolated_ys.tolist()]
+
+        return xs, ys
 
     def __resynchronize_trajectories(self, new_t: Trajectory):
         if not self.synchronyzed_trajectories:
             raise Exception("Dataset trajectories must already be synchronized")
 
-        # Collect previous timestamps
-        timestamps = []
-        for T in self.synchronyzed_trajectories:
-            for L in T.locations:
-                timestamps.append(L.timestamp)
-
-        # And the new ones
-        for L in new_t.locations:
-            timestamps.append(L.timestamp)
-
-        # Converting to set we remove duplicates
-        timestamps = list(set(timestamps))
-        timestamps.sort()
-
-        # TODO: Estamos resynchronizando todos los timestamps de todas las trayectorías.
-        #       En realidad, solo haría falta calcular los nuevos timestamps
-        self.synchronyzed_trajectories = []
-        for T_i in self.dataset.trajectories:
-            synchro_T = self.__synchronize_trajectory(T_i, timestamps)
-            self.synchronyzed_trajectories.append(synchro_T)
-            # logging.debug(f'Trajectory {T_i.id} resynchronized!')
+        # Only the timestamps of the new trajectory that are new have to be added to the synchronized trajectories
+        new_timestamps = np.setdiff1d(new_t.get_arrays()[0], self.timestamps)
+        if len(new_timestamps) > 0:
+            for idx, (T_i, synchro_T) in enumerate(zip(self.raw_trajectories, self.synchronyzed_trajectories)):
+                timestamps, xs, ys = synchro_T.get_arrays()
+                inside = new_timestamps[(timestamps[0] <= new_timestamps) & (new_timestamps <= timestamps[-1])]
+                if len(inside) > 0:
+                    new_xs, new_ys = self.__locations_at(T_i, inside)
+                    positions = np.searchsorted(timestamps, inside)
+                    self.synchronyzed_trajectories[idx] = TrajectoryView(synchro_T.id, None,
+                                                                         np.insert(timestamps, positions, inside),
+                                                                         np.insert(xs, positions, new_xs),
+                                                                         np.insert(ys, positions, new_ys))
+            self.timestamps = np.union1d(self.timestamps, new_timestamps)
 
         # Finally add the synchronized new trajectory
-        synchro_T = self.__synchronize_trajectory(new_t, timestamps)
-        self.synchronyzed_trajectories.append(synchro_T)
+        self.raw_trajectories.append(new_t)
+        self.synchronyzed_trajectories.append(self.__synchronize_trajectory(new_t, self.timestamps))
 
         logging.info("\tTrajectories re-synchronized")
 
@@ -120,45 +193,49 @@ class DistanceGraph:
             if s_traj_2 is None:
                 raise Exception(f"Trajectory {id} doesn't exist")
 
-        p = get_p_contemporary(s_traj_1, s_traj_2)
-        # logging.debug(f'\tp-contemporary: {p}')
-        if p > 0:
-            # p-contemporanies
-            ot = get_overlap_time(s_traj_1, s_traj_2)
-            # logging.debug(f'\tot: {ot}')
-            ts_interval = s_traj_1.get_interval_timestamps(ot)
-            # logging.debug(f'\tts_interval length: {len(ts_interval)}')
-
-            d = 0
-            denominator = pow(max(ot) - min(ot), 2)
-            for ts in ts_interval:
-                loc_1 = s_traj_1.get_location_by_timestamp(ts)
-                loc_2 = s_traj_2.get_location_by_timestamp(ts)
-                d += (pow(loc_1.x - loc_2.x, 2) + pow(loc_1.y - loc_2.y, 2)) / denominator
-
-            d = math.sqrt(d)
-            d = d / p
-
-            return d
-        else:
-            return None
+        return synchronized_distance(*s_traj_1.get_arrays(), *s_traj_2.get_arrays())
 
     def __build_graph(self):
 
         # Add nodes
         self.graph.add_nodes_from([t.id for t in self.synchronyzed_trajectories])
 
-        for T_i in self.synchronyzed_trajectories:
-            for T_j in self.synchronyzed_trajectories:
-                # logging.debug(f'Computing distance ({T_i.id, T_j.id})')
-                if T_i != T_j:
-                    # Check if an edge between T_i and T_l already exists
-                    if T_j.id not in self.graph.nodes() or T_i.id not in list(self.graph.neighbors(T_j.id)):
-                        # logging.debug(f'\tActually computing ({T_i.id, T_j.id})')
-                        d = self.get_distance(T_i, T_j)
-                        # logging.debug(f'\td =  {d}')
-                        if d is not None:
-                            self.graph.add_edge(T_i.id, T_j.id, weight=d)
+        # Trajectories with the same locations are not compared (see Trajectory.__eq__)
+        hashes = np.array([hash(t) for t in self.synchronyzed_trajectories], dtype=np.int64)
+        # Only the pairs of trajectories overlapping in time can be p-contemporary. They are processed block by block
+        blocks = (pairs[hashes[pairs[:, 0]] != hashes[pairs[:, 1]]]
+                  for pairs in get_contemporary_pairs(self.synchronyzed_trajectories))
+
+        for pairs, weights in self.__edge_weights(pairs for pairs in blocks if len(pairs) > 0):
+            for (i, j), d in zip(pairs.tolist(), weights):
+                T_i = self.synchronyzed_trajectories[i]
+                T_j = self.synchronyzed_trajectories[j]
+                if d is not None and not self.graph.has_edge(T_i.id, T_j.id):
+                    self.graph.add_edge(T_i.id, T_j.id, weight=d)
+
+    def __edge_weights(self, blocks):
+        '''
+        Every block of pairs with the weights of their edges (None if not p-contemporary)
+        '''
+        n_jobs = self.n_jobs or 1
+        if n_jobs == 1:
+            for pairs in blocks:
+                yield pairs, [self.get_distance(self.synchronyzed_trajectories[i], self.synchronyzed_trajectories[j])
+                              for i, j in pairs.tolist()]
+            return
+
+        arrays = [t.get_arrays() for t in self.synchronyzed_trajectories]
+        packed = {
+            'timestamps': np.concatenate([a[0] for a in arrays]),
+            'xs': np.concatenate([a[1] for a in arrays]),
+            'ys': np.concatenate([a[2] for a in arrays]),
+            'offsets': np.concatenate(([0], np.cumsum([len(a[0]) for a in arrays])))
+        }
+        logging.info(f"\tComputing edge weights ({n_jobs} processes)")
+        with Pool(n_jobs, initializer=_init_graph_worker, initargs=(packed,)) as pool:
+            for pairs in blocks:
+                chunks = np.array_split(pairs, min(n_jobs * 4, len(pairs)))
+                yield pairs, [d for weights in pool.imap(_edge_weights, chunks) for d in weights]
 
     def draw_graph(self):
         pos = nx.spring_layout(self.graph)
@@ -171,6 +248,10 @@ class DistanceGraph:
 
     def get_graph_distance(self, s_traj_1, s_traj_2):
 
+        for s_traj in (s_traj_1, s_traj_2):
+            id = s_traj if isinstance(s_traj, int) or isinstance(s_traj, str) else s_traj.id
+            if id not in self.graph:
+                raise nx.NodeNotFound(f"Node {id} not in the graph")
         if isinstance(s_traj_1, int) or isinstance(s_traj_1, str):
             s_traj_1 = self.__get_synchro_trajectory(s_traj_1)
         if isinstance(s_traj_2, int) or isinstance(s_traj_2, str):
@@ -183,7 +264,73 @@ class DistanceGraph:
         if self.graph.get_edge_data(s_traj_1.id, s_traj_2.id):
             return self.graph[s_traj_1.id][s_traj_2.id]["weight"]
 
-        return nx.shortest_path_length(self.graph, s_traj_1.id, s_traj_2.id, "weight")
+        if self.batch_size is None:
+            return nx.shortest_path_length(self.graph, s_traj_1.id, s_traj_2.id, "weight")
+
+        # The graph is undirected, so the cached shortest paths of either trajectory answer the query
+        source, target = s_traj_1.id, s_traj_2.id
+        if source not in self.shortest_paths and target in self.shortest_paths:
+            source, target = target, source
+        if source not in self.shortest_paths:
+            self.compute_shortest_paths(self.__prefetched_sources(source))
+
+        d = self.shortest_paths[source][self.node_positions[target]]
+        if np.isinf(d):
+            raise nx.NetworkXNoPath(f"Node {target} not reachable from {source}")
+
+        return float(d)
+
+    def compute_shortest_paths(self, sources=None):
+        '''
+        Compute (with SciPy) and cache the shortest path lengths from the sources (Default is all the nodes) to every
+        node, batch_size sources at a time
+        '''
+        if self.csgraph is None:
+            self.__build_csgraph()
+
+        if sources is None:
+            sources = list(self.graph.nodes)
+        sources = [s for s in dict.fromkeys(sources) if s not in self.shortest_paths]
+        batch_size = self.batch_size if self.batch_size is not None else len(sources)
+
+        for start in range(0, len(sources), batch_size):
+            batch = sources[start:start + batch_size]
+            indices = [self.node_positions[s] for s in batch]
+            rows = dijkstra(self.csgraph, directed=False, indices=indices)
+            for s, row in zip(batch, rows):
+                self.shortest_paths[s] = row
+
+    def __prefetched_sources(self, source) -> list:
+        '''
+        The source and the next nodes (in the order of the graph) without cached shortest paths, up to batch_size, so
+        the queries of the following sources are already answered by the same batch
+        '''
+        if self.csgraph is None:
+            self.__build_csgraph()
+
+        nodes = list(self.node_positions)
+        position = self.node_positions[source]
+        following = itertools.chain(nodes[position:], nodes[:position])
+
+        return list(itertools.islice((s for s in following if s not in self.shortest_paths), self.batch_size))
+
+    def __build_csgraph(self):
+        self.node_positions = {node: i for i, node in enumerate(self.graph.nodes)}
+        edges = [(self.node_positions[u], self.node_positions[v], w)
+                 for u, v, w in self.graph.edges(data='weight') if u != v]
+        rows, cols, weights = (np.array(values) for values in zip(*edges)) if edges else ([], [], [])
+        n = len(self.node_positions)
+
+        # Explicit zeros are edges for SciPy, so edges of weight 0 are kept
+        self.csgraph = csr_matrix((np.asarray(weights, dtype=np.float64),
+                                   (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+                                  shape=(n, n))
+
+    def __clear_shortest_paths(self):
+        # Any change of the graph makes the cached shortest paths stale
+        self.csgraph = None
+        self.node_positions = {}
+        self.shortest_paths = {}
 
     def get_components(self):
         return nx.connected_components(self.graph)
@@ -206,6 +353,7 @@ class DistanceGraph:
             d = self.get_distance(t, T_i)
             if d is not None:
                 self.graph.add_edge(t.id, T_i.id, weight=d)
+        self.__clear_shortest_paths()
 
         logging.info(f"New node added: {t.id}")
 
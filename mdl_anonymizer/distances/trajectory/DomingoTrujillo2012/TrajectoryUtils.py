@@ -1,5 +1,10 @@
+import numpy as np
+
 from mdl_anonymizer.entities.Trajectory import Trajectory
 
+# Pairs yielded at once by get_contemporary_pairs
+CONTEMPORARY_BLOCK = 1 << 16
+
 
 def get_p_contemporary(traj_1: Trajectory, traj_2: Trajectory):
     timestamps_1 = traj_1.get_timestamps()
@@ -23,3 +28,37 @@ def get_overlap_time(traj_1: Trajectory, traj_2: Trajectory):
         return ts_1, ts_2
 
     return None
+
+
+def get_contemporary_pairs(trajectories: list, block_size: int = CONTEMPORARY_BLOCK):
+    '''
+    Pairs (i, j), with i < j, of the trajectories whose time spans overlap for some time, i.e. the only ones that can be
+    p-contemporary. Trajectories are swept by their first timestamp, so every trajectory is only paired with those
+    starting before it ends.
+    Pairs are yielded in arrays of whole rows of the sweep, up to block_size pairs (unless a single row has more), so
+    they are never all in memory at once. Pairs of every array are sorted by i and j
+    '''
+    n = len(trajectories)
+    firsts = np.fromiter((t.get_first_timestamp() for t in trajectories), dtype=np.int64, count=n)
+    lasts = np.fromiter((t.get_last_timestamp() for t in trajectories), dtype=np.int64, count=n)
+    # Trajectories without duration do not overlap with any other one
+    lasting = lasts > firsts
+
+    order = np.argsort(firsts, kind='stable')
+    sorted_firsts = firsts[order]
+    # Trajectories after every one in the sweep that start before it ends
+    ends = np.searchsorted(sorted_firsts, lasts[order], side='left')
+    counts = np.maximum(ends - np.arange(n) - 1, 0)
+    total = np.cumsum(counts)
+
+    start = 0
+    while start < n:
+        end = max(int(np.searchsorted(total, total[start] - counts[start] + block_size, side='right')), start + 1)
+        row_counts = counts[start:end]
+        a = np.repeat(np.arange(start, end), row_counts)
+        b = a + 1 + np.arange(len(a)) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+        i, j = order[a], order[b]
+        pairs = np.column_stack((np.minimum(i, j), np.maximum(i, j)))[lasting[i] & lasting[j]]
+        if len(pairs) > 0:
+            yield pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        start = end
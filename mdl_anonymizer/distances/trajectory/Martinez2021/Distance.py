@@ -1,28 +1,355 @@
+import hashlib
 import itertools
+import json
 import logging
 from collections import defaultdict
+from functools import lru_cache
 from math import sqrt
 from tqdm import tqdm
 import math
 import random
 import sys
+import os
+import tempfile
+from multiprocessing import Pool, shared_memory
+import numpy as np
 from mdl_anonymizer.entities.Dataset import Dataset
 from mdl_anonymizer.entities.Trajectory import Trajectory
 from mdl_anonymizer.entities.TimestampedLocation import TimestampedLocation
 from mdl_anonymizer.distances.trajectory.DistanceInterface import DistanceInterface
-from mdl_anonymizer.utils.utils import memory
+from mdl_anonymizer.distances.trajectory.DistanceMatrix import DistanceMatrix, fingerprint
+from mdl_anonymizer.utils import geodesic
+
+MATRIX_FILE_VERSION = 1
+# Maximum number of candidate locations evaluated at once when precomputing the distance matrix
+PRECOMPUTE_BLOCK = 1 << 20
+# Relative margin of the bounds of the distances, to cover rounding errors (and cached float32 distances)
+BOUND_TOLERANCE = 1e-6
+# Resampled pairs of locations accumulated at once by the early abandon of the nearest neighbour searches
+ABANDON_BLOCK = 8
+# Candidates with the lowest bounds computed first by the nearest neighbour searches, to set the initial upper bound
+ABANDON_SEED = 8
+
+
+@lru_cache(maxsize=65536)
+def resampled_indices(length: int, h: int) -> np.ndarray:
+    '''
+    Indices of the h locations of a trajectory of the given length that are compared by the distance. They are
+    equally spaced by length / h, accumulated one step after another (as round(index += gap)). The returned array is
+    shared, so it is read-only
+    '''
+    gaps = np.full(h, length / h)
+    gaps[0] = 0
+    indices = np.round(np.cumsum(gaps)).astype(np.intp)
+    np.minimum(indices, length - 1, out=indices)
+    indices.flags.writeable = False
+
+    return indices
+
+
+def distances_to_many(reference: Trajectory, candidates, p_lambda: float, reference_speed: float, candidate_speeds,
+                      sp_type='Haversine', meters_per_unit=1000) -> np.ndarray:
+    '''
+    Distance (not normalized) from the reference trajectory to every candidate. Speeds are the average speeds (km/h) of
+    the trajectories.
+    The resampled pairs of locations of all the candidates are evaluated at once, as a ragged batch
+    '''
+    if len(candidates) == 0:
+        return np.empty(0)
+
+    timestamps, xs, ys = reference.get_arrays()
+
+    return packed_distances_to_many(timestamps, xs, ys, *_pack(candidates), p_lambda, reference_speed,
+                                    candidate_speeds, sp_type, meters_per_unit)
+
+
+def bounded_distances_to_many(reference: Trajectory, candidates, p_lambda: float, reference_speed: float,
+                              candidate_speeds, sp_type='Haversine', meters_per_unit=1000,
+                              upper_bound=math.inf) -> np.ndarray:
+    '''
+    As distances_to_many, but only for the candidates that may be the nearest one (see early_abandon). The distance to
+    the rest is inf, so the argmin is the same when the nearest distance does not exceed the upper bound
+    '''
+    distances = np.full(len(candidates), np.inf)
+    if len(candidates) == 0:
+        return distances
+
+    timestamps, xs, ys = reference.get_arrays()
+    candidate_speeds = np.asarray(candidate_speeds, dtype=np.float64)
+    alive = np.flatnonzero(early_abandon(timestamps, xs, ys, *_pack(candidates), p_lambda, reference_speed,
+                                         candidate_speeds, sp_type, meters_per_unit, upper_bound))
+    # Exact distances of the survivors, as computed by distances_to_many
+    distances[alive] = distances_to_many(reference, [candidates[i] for i in alive], p_lambda, reference_speed,
+                                         candidate_speeds[alive], sp_type, meters_per_unit)
+
+    return distances
+
+
+def _pack(candidates) -> tuple:
+    # Timestamps, x and y coordinates of the candidates, one after another, and their lengths
+    arrays = [t.get_arrays() for t in candidates]
+    lengths = np.fromiter((len(a[0]) for a in arrays), dtype=np.intp, count=len(arrays))
+
+    return (np.concatenate([a[0] for a in arrays]), np.concatenate([a[1] for a in arrays]),
+            np.concatenate([a[2] for a in arrays]), lengths)
+
+
+def packed_distances_to_many(timestamps, xs, ys, candidate_timestamps, candidate_xs, candidate_ys, lengths,
+                             p_lambda: float, reference_speed: float, candidate_speeds, sp_type='Haversine',
+                             meters_per_unit=1000) -> np.ndarray:
+    '''
+    As distances_to_many, with the locations of the candidates packed one after another in the candidate arrays
+    '''
+    spatial, temporal, hs, offsets = _resampled_pairs(timestamps, xs, ys, candidate_timestamps, candidate_xs,
+                                                      candidate_ys, lengths, sp_type)
+    avg_speeds = (reference_speed + np.asarray(candidate_speeds, dtype=np.float64)) / 2
+    avg_speeds /= 3.6  # m/s
+
+    spatial *= meters_per_unit  # meters
+    spatial += p_lambda * temporal * np.repeat(avg_speeds, hs)  # meters
+    spatial *= spatial
+
+    return np.sqrt(np.add.reduceat(spatial, offsets) / hs)
+
+
+def packed_components_to_many(timestamps, xs, ys, candidate_timestamps, candidate_xs, candidate_ys, lengths,
+                              sp_type='Haversine') -> tuple:
+    '''
+    Spatial (in the units of the spatial distance) and temporal (s) components of the distances from the reference
+    trajectory to every candidate packed in the candidate arrays, each one as the root mean square of its resampled
+    pairs of locations
+    '''
+    spatial, temporal, hs, offsets = _resampled_pairs(timestamps, xs, ys, candidate_timestamps, candidate_xs,
+                                                      candidate_ys, lengths, sp_type)
+    spatial *= spatial
+    temporal *= temporal
+
+    return np.sqrt(np.add.reduceat(spatial, offsets) / hs), np.sqrt(np.add.reduceat(temporal, offsets) / hs)
+
+
+def early_abandon(timestamps, xs, ys, candidate_timestamps, candidate_xs, candidate_ys, lengths, p_lambda: float,
+                  reference_speed: float, candidate_speeds, sp_type='Haversine', meters_per_unit=1000,
+                  upper_bound=math.inf) -> np.ndarray:
+    '''
+    Mask of the candidates (packed as in packed_distances_to_many) whose distance to the reference may be the smallest
+    one and not exceed the upper bound. The squared terms of the distances are accumulated in blocks of ABANDON_BLOCK
+    resampled pairs of every candidate, and a candidate is abandoned as soon as its partial sum exceeds the upper bound
+    or the smallest distance found so far
+    '''
+    i, j, hs, offsets = _resampled_index_pairs(len(timestamps), lengths)
+    avg_speeds = (reference_speed + np.asarray(candidate_speeds, dtype=np.float64)) / 2
+    avg_speeds /= 3.6  # m/s
+
+    n = len(hs)
+    alive = np.ones(n, dtype=bool)
+    sums = np.zeros(n)
+    best = upper_bound * upper_bound  # Smallest mean of the squared terms
+    steps = np.arange(ABANDON_BLOCK)
+    for start in range(0, int(hs.max(initial=0)), ABANDON_BLOCK):
+        block = np.flatnonzero(alive & (hs > start))
+        if len(block) == 0:
+            break
+
+        # Pairs [start, start + ABANDON_BLOCK) of every candidate of the block
+        mask = start + steps < hs[block, np.newaxis]
+        owners = np.broadcast_to(block[:, np.newaxis], mask.shape)[mask]
+        pairs = (offsets[block, np.newaxis] + start + steps)[mask]
+        spatial, temporal = _pair_distances(i[pairs], j[pairs], timestamps, xs, ys, candidate_timestamps,
+                                            candidate_xs, candidate_ys, sp_type)
+        spatial *= meters_per_unit  # meters
+        spatial += p_lambda * temporal * avg_speeds[owners]  # meters
+        sums += np.bincount(owners, weights=spatial * spatial, minlength=n)
+
+        finished = block[hs[block] <= start + ABANDON_BLOCK]
+        if len(finished) > 0:
+            best = min(best, float(np.min(sums[finished] / hs[finished])))
+        # Partial sums never decrease, so these candidates are farther than the best one
+        alive &= sums <= best * hs * (1 + BOUND_TOLERANCE)
+
+    return alive
+
+
+def _resampled_pairs(timestamps, xs, ys, candidate_timestamps, candidate_xs, candidate_ys, lengths,
+                     sp_type='Haversine') -> tuple:
+    # Spatial and temporal distances of the resampled pairs of locations of every candidate
+    i, j, hs, offsets = _resampled_index_pairs(len(timestamps), lengths)
+    spatial, temporal = _pair_distances(i, j, timestamps, xs, ys, candidate_timestamps, candidate_xs, candidate_ys,
+                                        sp_type)
+
+    return spatial, temporal, hs, offsets
+
+
+def _resampled_index_pairs(reference_length: int, lengths) -> tuple:
+    # Indices of the resampled pairs of locations of the reference (i) and the packed candidates (j). Every candidate
+    # takes h consecutive positions of the batch, starting at its offset
+    lengths = np.asarray(lengths, dtype=np.intp)
+    hs = np.round((reference_length + lengths) / 2).astype(np.intp)
+
+    starts = np.zeros(len(lengths), dtype=np.intp)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    offsets = np.zeros(len(lengths), dtype=np.intp)
+    np.cumsum(hs[:-1], out=offsets[1:])
+    i = np.concatenate([resampled_indices(reference_length, h) for h in hs.tolist()])
+    j = np.concatenate([resampled_indices(length, h) for length, h in zip(lengths.tolist(), hs.tolist())])
+    j += np.repeat(starts, hs)
+
+    return i, j, hs, offsets
+
+
+def _pair_distances(i, j, timestamps, xs, ys, candidate_timestamps, candidate_xs, candidate_ys,
+                    sp_type='Haversine') -> tuple:
+    if sp_type == 'Haversine':
+        spatial = geodesic.haversine_pairwise(ys[i], xs[i], candidate_ys[j], candidate_xs[j])
+    else:
+        spatial = geodesic.euclidean_pairwise(xs[i], ys[i], candidate_xs[j], candidate_ys[j])
+    temporal = np.abs(candidate_timestamps[j] - timestamps[i]).astype(np.float64)
+
+    return spatial, temporal
+
+
+def _candidate_blocks(i: int, offsets):
+    # Blocks [j, k) of the trajectories after the i-th one, with PRECOMPUTE_BLOCK locations at most (but one
+    # trajectory at least)
+    n = len(offsets) - 1
+    j = i + 1
+    while j < n:
+        k = int(np.searchsorted(offsets, offsets[j] + PRECOMPUTE_BLOCK, side='right')) - 1
+        k = min(max(k, j + 1), n)
+        yield j, k
+        j = k
+
+
+def _row_tiles(n: int, n_tiles: int) -> list:
+    # Tiles of consecutive rows of the upper triangle with a similar number of pairs. Row i has n - i - 1 pairs
+    pairs = np.cumsum(np.arange(n - 1, -1, -1))
+    bounds = np.searchsorted(pairs, np.linspace(0, pairs[-1], n_tiles + 1)[1:-1])
+    bounds = np.unique(np.concatenate(([0], bounds, [n])))
+
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def fill_condensed_rows(start: int, end: int, timestamps, xs, ys, offsets, speeds, condensed, p_lambda: float,
+                        sp_type='Haversine', meters_per_unit=1000, max_dist=None):
+    '''
+    Compute the rows [start, end) of the condensed distance matrix of the trajectories packed in the arrays (the
+    locations of the i-th trajectory are in [offsets[i], offsets[i+1])). Candidates are batched in blocks of
+    PRECOMPUTE_BLOCK locations at most
+    '''
+    n = len(offsets) - 1
+    for i in range(start, end):
+        a, b = offsets[i], offsets[i + 1]
+        row = i * n - i * (i + 1) // 2 - i - 1  # Position of the pair (i, j) is row + j
+        for j, k in _candidate_blocks(i, offsets):
+            d = packed_distances_to_many(timestamps[a:b], xs[a:b], ys[a:b],
+                                         timestamps[offsets[j]:offsets[k]], xs[offsets[j]:offsets[k]],
+                                         ys[offsets[j]:offsets[k]], np.diff(offsets[j:k + 1]),
+                                         p_lambda, speeds[i], speeds[j:k], sp_type, meters_per_unit)
+            if max_dist is not None:
+                d /= max_dist  # normalization [0,1]
+            condensed[row + j:row + k] = d
+
+
+def sum_component_rows(start: int, end: int, timestamps, xs, ys, offsets, speeds, sp_type='Haversine',
+                       meters_per_unit=1000) -> tuple:
+    '''
+    Spatial (m) and temporal (s times the average speed of both trajectories, in km/h) components of the distances
+    between the trajectories of the rows [start, end) and those after them, packed as in fill_condensed_rows.
+    Return the sum of the components of every trajectory with all the others (both are symmetric) and their maximums.
+    Only these sums are kept, in a scratch buffer of two values per trajectory
+    '''
+    n = len(offsets) - 1
+    sums = np.zeros((2, n))
+    max_spatial = 0.0
+    max_temporal = 0.0
+    for i in range(start, end):
+        a, b = offsets[i], offsets[i + 1]
+        for j, k in _candidate_blocks(i, offsets):
+            spatial, temporal = packed_components_to_many(timestamps[a:b], xs[a:b], ys[a:b],
+                                                          timestamps[offsets[j]:offsets[k]], xs[offsets[j]:offsets[k]],
+                                                          ys[offsets[j]:offsets[k]], np.diff(offsets[j:k + 1]),
+                                                          sp_type)
+            spatial *= meters_per_unit  # meters
+            temporal *= (speeds[i] + speeds[j:k]) / 2  # s * km/h
+            max_spatial = max(max_spatial, float(spatial.max()))
+            max_temporal = max(max_temporal, float(temporal.max()))
+            sums[0, i] += spatial.sum()
+            sums[1, i] += temporal.sum()
+            sums[0, j:k] += spatial
+            sums[1, j:k] += temporal
+
+    return sums, max_spatial, max_temporal
+
+
+# Shared memory blocks attached by every worker process of the precomputation
+_shared = {}
+
+
+def _init_precompute_worker(blocks: dict, params: dict):
+    for key, (name, dtype, shape) in blocks.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        _shared[key + "_shm"] = shm
+    _shared['params'] = params
+
+
+def _precompute_rows(rows: tuple) -> int:
+    start, end = rows
+    fill_condensed_rows(start, end, _shared['timestamps'], _shared['xs'], _shared['ys'], _shared['offsets'],
+                        _shared['speeds'], _shared['condensed'], **_shared['params'])
+
+    return end - start
+
+
+def _init_estimation_worker(packed: dict, params: dict):
+    _shared['packed'] = packed
+    _shared['params'] = params
+
+
+def _sum_component_rows(rows: tuple) -> tuple:
+    start, end = rows
+    return sum_component_rows(start, end, **_shared['packed'], **_shared['params'])
 
 
 class Distance(DistanceInterface):
-    def __init__(self, dataset: Dataset, sp_type='Haversine', p_lambda=None, max_dist=None, normalized=False, checking=False):
+    def __init__(self, dataset: Dataset, sp_type='Haversine', p_lambda=None, max_dist=None, normalized=False,
+                 cache_budget_mb=None, precompute=False, n_jobs=None, cache_folder=None, sample_size=None, seed=0,
+                 checking=False):
+        '''
+        cache_budget_mb : float, optional
+                    Memory (MB) to store the computed distances (Default is half of the available memory)
+        precompute : bool, optional
+                    Compute the distances between all the pairs of trajectories in advance (Default is False)
+        n_jobs : int, optional
+                    Number of processes to precompute the distances (Default is the number of CPUs) and to estimate
+                    lambda (Default is 1)
+        cache_folder : str, optional
+                    Folder to store the computed distances and the estimated lambda in, to be reused by later runs on
+                    the same dataset with the same parameters (Default is None, not stored)
+        sample_size : int, optional
+                    Number of trajectories sampled to estimate lambda (Default is the whole dataset up to 10000
+                    trajectories, a sample of the size given by calculate_sample_size otherwise)
+        seed : int, optional
+                    Seed of the sample to estimate lambda (Default is 0)
+        '''
         self.dataset = dataset
+        self.cache_budget = None if cache_budget_mb is None else cache_budget_mb * 1024 * 1024
         self.spatial_distance = sp_type
-        self.distance_matrix = {}
-        self.temporal_matrix = {}
+        self.distance_matrix = None
+        self.sample_size = sample_size
+        self.seed = seed
+        self.n_jobs = n_jobs
+        self.lambda_confidence_interval = None
         self.mean_spatial_distance = 0
         self.mean_temporal_distance = 0
         self.normalized = normalized
 
+        # Meters per unit of the spatial distance. Projected datasets are in meters, so Euclidean distance is enough
+        self.meters_per_unit = 1000  # km
+        self.projected = not checking and dataset.is_projected()
+        if self.projected:
+            self.spatial_distance = 'Euclidean'
+            self.meters_per_unit = 1
+
         # Don't compute anything If we are just checking if an object can be instantiated
         if checking:
             return
@@ -30,20 +357,11 @@ class Distance(DistanceInterface):
         self.average_speed = self.__compute_average_speed()
         self.max_dist = 0  # for normalization [0,1]
         self.reference_trajectory = None
-        available_mem = memory()
-        needed_mem = (pow(len(self.dataset.trajectories), 2) * 12) / (1024 * 1024)
-        if available_mem > needed_mem:
-            self.compute = self.compute_no_memory_control
-            logging.info(f"Computing distances without memory control. ")
-                         # f"Available: {available_mem}, Needed: {needed_mem}")
-        else:
-            self.compute = self.compute_with_memory_control
-            logging.info(f"Computing distances with memory control. ")
-                         # f"Available: {available_mem}, Needed: {needed_mem}")
         if p_lambda is None:
             logging.info("Computing weight parameter and max distance")
-            self.p_lambda, self.max_dist = self.__set_weight_parameter()   # max_dist for normalization [0,1]
-            logging.info(f"\tlambda = {self.p_lambda}")
+            # max_dist for normalization [0,1]
+            self.p_lambda, self.max_dist = self.__stored_weight_parameter(cache_folder)
+            logging.info(f"\tlambda = {self.p_lambda} (95% confidence interval {self.lambda_confidence_interval})")
             logging.info(f"\tmax dist = {self.max_dist}")
             logging.info("Done!")
         else:
@@ -56,59 +374,108 @@ class Distance(DistanceInterface):
             else:
                 self.max_dist = max_dist
                 logging.info(f"\tTaking max distance = {self.max_dist}")
-        self.distance_matrix = {}
-        self.temporal_matrix = {}
+
+        filename = None if cache_folder is None else self.__matrix_filename(cache_folder)
+        self.distance_matrix = DistanceMatrix(self.dataset.trajectories, self.cache_budget, filename=filename)
+        self.compute = self.compute_no_memory_control
+        if self.distance_matrix.dense:
+            logging.info(f"Storing distances in a condensed matrix")
+        else:
+            logging.info(f"Storing distances in a bounded cache ({self.distance_matrix.cache.capacity} distances)")
+
+        if precompute:
+            self.precompute(n_jobs)
 
     def compute(self, trajectory1: Trajectory, trajectory2: Trajectory) -> float:
         pass
 
+    def __stored_weight_parameter(self, cache_folder: str = None):
+        '''
+        Lambda and max distance estimated by __set_weight_parameter, taken from the cache folder if a previous run
+        stored them there (and stored there otherwise)
+        '''
+        if cache_folder is None:
+            return self.__set_weight_parameter()
+
+        filename = self.__lambda_filename(cache_folder)
+        if os.path.isfile(filename):
+            try:
+                with open(filename) as f:
+                    stored = json.load(f)
+                self.lambda_confidence_interval = tuple(stored['lambda_confidence_interval'])
+                logging.info(f"Reusing lambda stored in {filename}")
+                return stored['p_lambda'], stored['max_dist']
+            except (ValueError, KeyError, TypeError):
+                logging.warning(f"Lambda stored in {filename} can not be read. Computing it again")
+
+        p_lambda, max_dist = self.__set_weight_parameter()
+
+        # Write to a temporary file and rename it, so a partial file is never read
+        os.makedirs(cache_folder, exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(dir=cache_folder, suffix=".json")
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'p_lambda': float(p_lambda),
+                'max_dist': float(max_dist),
+                'lambda_confidence_interval': [float(v) for v in self.lambda_confidence_interval]
+            }, f)
+        os.replace(tmp_filename, filename)
+
+        return p_lambda, max_dist
+
     def __set_weight_parameter(self):
-        if len(self.dataset.trajectories) > 10000:
+        '''
+        Lambda is the ratio of the mean spatial distance to the mean temporal distance (s times the average speed)
+        between the trajectories of a sample. The distances are computed in batches and only their sums are kept, so
+        the distance cache is not used. The 95% confidence interval of lambda is left in lambda_confidence_interval
+        '''
+        size = len(self.dataset.trajectories)
+        if self.sample_size is not None:
+            num_sample = min(self.sample_size, size)
+        elif size > 10000:
             num_sample = self.calculate_sample_size()
-            sample = random.sample(self.dataset.trajectories, num_sample)
         else:
-            num_sample = len(self.dataset.trajectories)
+            num_sample = size
+        if num_sample < size:
+            sample = random.Random(self.seed).sample(self.dataset.trajectories, num_sample)
+        else:
             sample = self.dataset.trajectories
         logging.info(f"\tTaking sample for lambda = {num_sample})")
 
-        # num_sample = len(self.dataset.trajectories)
-        # percen_sample = 100
-        # if len(self.dataset.trajectories) > 10000:
-        #     percen_sample = 10
-        # if len(self.dataset.trajectories) > 100000:
-        #     percen_sample = 1
-        # if len(self.dataset.trajectories) > 1000000:
-        #     percen_sample = 0.1
-        # if percen_sample < 100:
-        #     num_sample = int((len(self.dataset.trajectories) * percen_sample) / 100)
-        #     sample = random.sample(self.dataset.trajectories, num_sample)
-        # logging.info(f"\tTaking sample for lambda = {num_sample} ({percen_sample}%)")
-        # sample = self.dataset.trajectories
-        self.distance_matrix = {}
-        self.temporal_matrix = {}
-        max_dist = 0
-        max_temp = 0
-        mean_dist = 0
-        mean_temp = 0
-        for t1 in tqdm(sample):
-            dist = 0
-            temp = 0
-            for t2 in sample:
-                d1 = self.__compute_spatial_distance(t1, t2) * 1000 # meters
-                d2 = self.__compute_temporal_distance(t1, t2)   # meters
-                if d1 > max_dist:
-                    max_dist = d1
-                if d2 > max_temp:
-                    max_temp = d2
-                dist += d1
-                temp += d2
-            mean_dist += dist / len(sample)
-            mean_temp += temp / len(sample)
-        mean_dist /= len(sample)
-        mean_temp /= len(sample)
+        packed = self.__pack(sample)
+        params = {
+            'sp_type': self.spatial_distance,
+            'meters_per_unit': self.meters_per_unit
+        }
+        n_jobs = self.n_jobs or 1
+        if n_jobs == 1 or num_sample < 2:
+            results = [sum_component_rows(start, end, **packed, **params)
+                       for start, end in tqdm(_row_tiles(num_sample, 100))]
+        else:
+            with Pool(n_jobs, initializer=_init_estimation_worker, initargs=(packed, params)) as pool:
+                tiles = _row_tiles(num_sample, n_jobs * 4)
+                results = list(tqdm(pool.imap(_sum_component_rows, tiles), total=len(tiles)))
+
+        sums = np.sum([r[0] for r in results], axis=0)
+        max_dist = max(r[1] for r in results)
+        max_temp = max(r[2] for r in results)
+
+        # Mean distances of every trajectory of the sample to all of them (itself included)
+        spatial_means = sums[0] / num_sample
+        temporal_means = sums[1] / num_sample
+        mean_dist = spatial_means.sum() / num_sample
+        mean_temp = temporal_means.sum() / num_sample
 
         landa = mean_dist / mean_temp
         max_dist = max_dist + (max_temp * landa)
+
+        # Ratio estimator: standard error of lambda by the delta method
+        if num_sample > 1:
+            error = 1.96 * np.std(spatial_means - landa * temporal_means, ddof=1) / sqrt(num_sample) / mean_temp
+        else:
+            error = 0.0
+        self.lambda_confidence_interval = (landa - error, landa + error)
+
         logging.info(f"mean_dist = {mean_dist}")
         logging.info(f"mean_temp = {mean_temp}")
         logging.info(f"lambda = {landa}")
@@ -116,6 +483,23 @@ class Distance(DistanceInterface):
 
         return landa, max_dist
 
+    def __pack(self, trajectories: list) -> dict:
+        '''
+        Locations of the trajectories, one after another (those of the i-th trajectory are in
+        [offsets[i], offsets[i+1])), and their average speeds (km/h)
+        '''
+        arrays = [t.get_arrays() for t in trajectories]
+        offsets = np.zeros(len(trajectories) + 1, dtype=np.intp)
+        np.cumsum([len(a[0]) for a in arrays], out=offsets[1:])
+
+        return {
+            'timestamps': np.concatenate([a[0] for a in arrays]),
+            'xs': np.concatenate([a[1] for a in arrays]),
+            'ys': np.concatenate([a[2] for a in arrays]),
+            'offsets': offsets,
+            'speeds': np.array([self.__get_avg_speed(t) for t in trajectories], dtype=np.float64)
+        }
+
     def calculate_sample_size2(self):
         size = len(self.dataset.trajectories)
         magnitude = math.floor(math.log10(size))
@@ -144,13 +528,22 @@ class Distance(DistanceInterface):
         logging.info("Computing average speed")
         average_speed = 0
         for traj in tqdm(self.dataset.trajectories):
-            average_speed += traj.get_avg_speed()  # km/h
+            average_speed += self.__get_avg_speed(traj, 'Haversine')  # km/h
         average_speed /= len(self.dataset.trajectories)
         average_speed /= 3.6  # m/s
         logging.info(f"Average speed: {average_speed} m/s")
 
         return average_speed
 
+    def __get_avg_speed(self, trajectory: Trajectory, sp_type=None):
+        '''
+        Average speed of the trajectory in km/h
+        '''
+        if self.projected:
+            return trajectory.get_avg_speed(sp_type='Euclidean') / 1000
+
+        return trajectory.get_avg_speed(sp_type=sp_type or self.spatial_distance)
+
     def __set_weight_parameter_fast(self):
         self.__compute_max_spatial_distance_max_temporal_distance()
         p_lambda = self.mean_spatial_distance / (self.mean_temporal_distance * self.average_speed)
@@ -171,57 +564,35 @@ class Distance(DistanceInterface):
 
         return max_dist
 
+    def __extent(self) -> tuple:
+        '''
+        Bounding box (min_x, min_y, max_x, max_y) and time span of the locations of the whole dataset, from the cached
+        features of the trajectories (their locations are not accessed)
+        '''
+        features = [t.get_features(self.spatial_distance) for t in self.dataset.trajectories]
+        bboxes = np.array([f['bbox'] for f in features if f['bbox'] is not None], dtype=np.float64).reshape(-1, 4)
+        time_spans = np.array([f['time_span'] for f in features if f['time_span'] is not None],
+                              dtype=np.int64).reshape(-1, 2)
+
+        bbox = (float(bboxes[:, 0].min()), float(bboxes[:, 1].min()), float(bboxes[:, 2].max()),
+                float(bboxes[:, 3].max()))
+
+        return bbox, (int(time_spans[:, 0].min()), int(time_spans[:, 1].max()))
+
     def __compute_max_spatial_distance_max_temporal_distance(self):
-        x_max = float("-inf")
-        x_min = float("inf")
-        y_max = float("-inf")
-        y_min = float("inf")
-        t_max = float("-inf")
-        t_min = float("inf")
-        for traj in tqdm(self.dataset.trajectories):
-            for loc in traj.locations:
-                if loc.x > x_max:
-                    x_max = loc.x
-                if loc.x < x_min:
-                    x_min = loc.x
-                if loc.y > y_max:
-                    y_max = loc.y
-                if loc.y < y_min:
-                    y_min = loc.y
-                if loc.timestamp > t_max:
-                    t_max = loc.timestamp
-                if loc.timestamp < t_min:
-                    t_min = loc.timestamp
+        (x_min, y_min, x_max, y_max), (t_min, t_max) = self.__extent()
+        sp_type = 'Euclidean' if self.projected else 'Haversine'
         l11 = TimestampedLocation(0, x_min, y_min)
         l21 = TimestampedLocation(0, x_max, y_max)
-        d1 = l11.spatial_distance(l21) * 1000  # m
+        d1 = l11.spatial_distance(l21, sp_type) * self.meters_per_unit  # m
         l12 = TimestampedLocation(0, x_max, y_min)
         l22 = TimestampedLocation(0, x_min, y_max)
-        d2 = l12.spatial_distance(l22) * 1000  # m
+        d2 = l12.spatial_distance(l22, sp_type) * self.meters_per_unit  # m
         self.mean_spatial_distance = max(d1, d2) / 2
         self.mean_temporal_distance = (t_max - t_min) / 2
 
     def compute_reference_trajectory(self):
-        x_max = float("-inf")
-        x_min = float("inf")
-        y_max = float("-inf")
-        y_min = float("inf")
-        t_max = float("-inf")
-        t_min = float("inf")
-        for traj in tqdm(self.dataset.trajectories):
-            for loc in traj.locations:
-                if loc.x > x_max:
-                    x_max = loc.x
-                if loc.x < x_min:
-                    x_min = loc.x
-                if loc.y > y_max:
-                    y_max = loc.y
-                if loc.y < y_min:
-                    y_min = loc.y
-                if loc.timestamp > t_max:
-                    t_max = loc.timestamp
-                if loc.timestamp < t_min:
-                    t_min = loc.timestamp
+        (x_min, y_min, _, _), (t_min, _) = self.__extent()
         l = TimestampedLocation(t_min, x_min, y_min)
         self.reference_trajectory = Trajectory(0)
         self.reference_trajectory.add_location(l)
@@ -229,271 +600,246 @@ class Distance(DistanceInterface):
     def compute_distance_to_reference_trajectory(self, trajectory):
         return self.compute_without_map(trajectory, self.reference_trajectory)
 
-    def compute_no_memory_control(self, trajectory1: Trajectory, trajectory2: Trajectory) -> float:
-        key = trajectory1.str_id + "-" + trajectory2.str_id
-        d = self.distance_matrix.get(key)
-        if d is not None:
-            return d
-        key = trajectory2.str_id + "-" + trajectory1.str_id
-        d = self.distance_matrix.get(key)
-        if d is not None:
-            return d
-        # Distance not computed
-        avg_speed_1 = trajectory1.get_avg_speed(sp_type=self.spatial_distance)
-        avg_speed_2 = trajectory2.get_avg_speed(sp_type=self.spatial_distance)
-        avg_speed = (avg_speed_1 + avg_speed_2) / 2
-        avg_speed /= 3.6 # m/s
+    def __matrix_filename(self, cache_folder: str) -> str:
+        '''
+        File of the distance matrix: hash of the trajectories and of every parameter the distances depend on
+        '''
+        key = json.dumps({
+            'version': MATRIX_FILE_VERSION,
+            'dataset': fingerprint(self.dataset.trajectories),
+            'p_lambda': float(self.p_lambda),
+            'sp_type': self.spatial_distance,
+            'normalized': self.normalized,
+            'max_dist': float(self.max_dist) if self.normalized else None
+        }, sort_keys=True)
+
+        return os.path.join(cache_folder, f"Martinez2021_{hashlib.sha256(key.encode()).hexdigest()}.npy")
+
+    def __lambda_filename(self, cache_folder: str) -> str:
+        '''
+        File of the estimated lambda: hash of the trajectories and of every parameter the estimation depends on
+        '''
+        key = json.dumps({
+            'version': MATRIX_FILE_VERSION,
+            'dataset': fingerprint(self.dataset.trajectories),
+            'sp_type': self.spatial_distance,
+            'sample_size': self.sample_size,
+            'seed': self.seed
+        }, sort_keys=True)
 
-        h = round((len(trajectory1) + len(trajectory2)) / 2)
-        gap_1 = len(trajectory1) / h
-        gap_2 = len(trajectory2) / h
+        return os.path.join(cache_folder, f"Martinez2021_lambda_{hashlib.sha256(key.encode()).hexdigest()}.json")
 
-        index_1 = index_2 = 0
-        i = j = 0
+    def precompute(self, n_jobs: int = None):
+        '''
+        Compute the distances between all the pairs of trajectories of the dataset with a pool of n_jobs processes
+        (default is the number of CPUs). The trajectories, packed in arrays, and the condensed distance matrix are kept
+        in shared memory, so the processes neither copy nor return them
+        '''
+        matrix = self.distance_matrix
+        if not matrix.dense:
+            logging.warning("The distance matrix does not fit in the cache budget. Distances will be computed on demand")
+            return
 
-        d = 0
+        if not np.isnan(matrix.condensed).any():
+            logging.info("Distances already computed")
+            return
 
-        for k in range(h):
+        n_jobs = n_jobs or os.cpu_count()
+        n = matrix.n
+        packed = self.__pack(matrix.trajectories)
+        params = {
+            'p_lambda': self.p_lambda,
+            'sp_type': self.spatial_distance,
+            'meters_per_unit': self.meters_per_unit,
+            'max_dist': self.max_dist if self.normalized else None
+        }
+        logging.info(f"Precomputing {len(matrix.condensed)} distances ({n_jobs} processes)")
+
+        if n_jobs == 1 or n < 2:
+            fill_condensed_rows(0, n, condensed=matrix.condensed, **packed, **params)
+            matrix.flush()
+            return
 
-            if i == len(trajectory1):
-                i = len(trajectory1) - 1
+        tiles = _row_tiles(n, n_jobs * 4)
+
+        blocks = {}
+        memory_blocks = []
+        try:
+            packed['condensed'] = matrix.condensed
+            for key, array in packed.items():
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                memory_blocks.append(shm)
+                if key != 'condensed':
+                    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+                blocks[key] = (shm.name, array.dtype.str, array.shape)
+
+            with Pool(n_jobs, initializer=_init_precompute_worker, initargs=(blocks, params)) as pool:
+                for _ in tqdm(pool.imap_unordered(_precompute_rows, tiles), total=len(tiles)):
+                    pass
+
+            name, dtype, shape = blocks['condensed']
+            matrix.condensed[:] = np.ndarray(shape, dtype=dtype, buffer=memory_blocks[-1].buf)
+            matrix.flush()
+        finally:
+            for shm in memory_blocks:
+                shm.close()
+                shm.unlink()
 
-            if j == len(trajectory2):
-                j = len(trajectory2) - 1
+    def compute_no_memory_control(self, trajectory1: Trajectory, trajectory2: Trajectory) -> float:
+        d = self.distance_matrix.get(trajectory1, trajectory2)
+        if d is not None:
+            return d
+        # Distance not computed (rounded as the stored ones)
+        d = self.distance_matrix.round(self.compute_without_map(trajectory1, trajectory2))
 
-            loc_1 = trajectory1.locations[i]
-            loc_2 = trajectory2.locations[j]
+        # Store the distance for later use
+        self.distance_matrix.put(trajectory1, trajectory2, d)
+
+        return d
 
-            d1 = loc_1.spatial_distance(loc_2, type=self.spatial_distance) * 1000   # meters
-            d2 = self.p_lambda * (loc_1.temporal_distance(loc_2)) * avg_speed  # meters
-            d += pow(d1 + d2, 2)
+    def compute_many(self, reference: Trajectory, candidates) -> np.ndarray:
+        distances = self.distance_matrix.get_many(reference, candidates)
+        missing = np.flatnonzero(np.isnan(distances))
+        if len(missing) == 0:
+            return distances
 
-            index_1 += gap_1
-            index_2 += gap_2
+        # Distances not computed (rounded as the stored ones)
+        missing_candidates = [candidates[idx] for idx in missing]
+        computed = self.distance_matrix.round(self.compute_many_without_map(reference, missing_candidates))
+        distances[missing] = computed
 
-            i = round(index_1)
-            j = round(index_2)
+        # Store the distances for later use
+        self.distance_matrix.put_many(reference, missing_candidates, computed)
 
-        d /= h
+        return distances
 
-        d = sqrt(d)
+    def compute_many_without_map(self, reference: Trajectory, candidates) -> np.ndarray:
+        candidate_speeds = [self.__get_avg_speed(t) for t in candidates]
+        d = distances_to_many(reference, candidates, self.p_lambda, self.__get_avg_speed(reference), candidate_speeds,
+                              self.spatial_distance, self.meters_per_unit)
 
         if self.normalized:
             d /= self.max_dist  # normalization [0,1]
 
-        # Store the distance for later use
-        self.distance_matrix[key] = d
-
         return d
 
-    def compute_with_memory_control(self, trajectory1: Trajectory, trajectory2: Trajectory) -> float:
-        key = trajectory1.str_id + "-" + trajectory2.str_id
-        d = self.distance_matrix.get(key)
-        if d is not None:
-            return d
-        key = trajectory2.str_id + "-" + trajectory1.str_id
-        d = self.distance_matrix.get(key)
-        if d is not None:
-            return d
-        # Distance not computed
-        avg_speed_1 = trajectory1.get_avg_speed(sp_type=self.spatial_distance)
-        avg_speed_2 = trajectory2.get_avg_speed(sp_type=self.spatial_distance)
-        avg_speed = (avg_speed_1 + avg_speed_2) / 2
-        avg_speed /= 3.6 # m/s
-
-        h = round((len(trajectory1) + len(trajectory2)) / 2)
-        gap_1 = len(trajectory1) / h
-        gap_2 = len(trajectory2) / h
-
-        index_1 = index_2 = 0
-        i = j = 0
-
-        d = 0
-
-        for k in range(h):
-
-            if i == len(trajectory1):
-                i = len(trajectory1) - 1
+    def bounds_many(self, reference: Trajectory, candidates):
+        '''
+        Every resampled pair of locations is as far as the bounding boxes and time spans of both trajectories allow, so
+        the distance is between the closest and the farthest pairs they allow
+        '''
+        features = reference.get_features(self.spatial_distance)
+        candidate_features = [t.get_features(self.spatial_distance) for t in candidates]
+        if features['bbox'] is None or any(f['bbox'] is None for f in candidate_features):
+            return None
 
-            if j == len(trajectory2):
-                j = len(trajectory2) - 1
+        bboxes = np.array([f['bbox'] for f in candidate_features], dtype=np.float64).reshape(-1, 4)
+        time_spans = np.array([f['time_span'] for f in candidate_features], dtype=np.float64).reshape(-1, 2)
 
-            loc_1 = trajectory1.locations[i]
-            loc_2 = trajectory2.locations[j]
+        if self.spatial_distance == 'Haversine':
+            spatial_lower, spatial_upper = geodesic.haversine_bbox_bounds(features['bbox'], bboxes)
+        else:
+            spatial_lower, spatial_upper = geodesic.euclidean_bbox_bounds(features['bbox'], bboxes)
+        first, last = features['time_span']
+        temporal_lower = np.maximum(0, np.maximum(time_spans[:, 0] - last, first - time_spans[:, 1]))
+        temporal_upper = np.maximum(time_spans[:, 1] - first, last - time_spans[:, 0])
 
-            d1 = loc_1.spatial_distance(loc_2, type=self.spatial_distance) * 1000   # meters
-            d2 = self.p_lambda * (loc_1.temporal_distance(loc_2)) * avg_speed  # meters
-            d += pow(d1 + d2, 2)
+        candidate_speeds = np.array([self.__get_avg_speed(t) for t in candidates], dtype=np.float64)
+        avg_speeds = (self.__get_avg_speed(reference) + candidate_speeds) / 2
+        avg_speeds /= 3.6  # m/s
 
-            index_1 += gap_1
-            index_2 += gap_2
+        lower = spatial_lower * self.meters_per_unit + self.p_lambda * temporal_lower * avg_speeds  # meters
+        upper = spatial_upper * self.meters_per_unit + self.p_lambda * temporal_upper * avg_speeds  # meters
+        lower *= 1 - BOUND_TOLERANCE
+        upper *= 1 + BOUND_TOLERANCE
 
-            i = round(index_1)
-            j = round(index_2)
+        if self.normalized:
+            lower /= self.max_dist  # normalization [0,1]
+            upper /= self.max_dist
 
-        d /= h
+        return lower, upper
 
-        d = sqrt(d)
+    def compute_bounded(self, trajectory1: Trajectory, trajectory2: Trajectory, upper_bound: float) -> float:
+        '''
+        Distance between both trajectories if it does not exceed the upper bound, inf otherwise. The computation stops
+        as soon as the distance exceeds the upper bound
+        '''
+        return float(self.compute_many_bounded(trajectory1, [trajectory2], upper_bound)[0])
 
+    def compute_many_bounded(self, reference: Trajectory, candidates, upper_bound=math.inf) -> np.ndarray:
+        '''
+        Distances from the reference trajectory to the candidates that may be the nearest one, inf for the rest (see
+        bounded_distances_to_many). Nearest neighbour searches keep the argmin of compute_many_without_map, if the
+        nearest distance does not exceed the upper bound.
+        The candidates with the lowest bounds are computed first, to discard the rest as soon as possible
+        '''
+        distances = np.full(len(candidates), np.inf)
+        pending = np.arange(len(candidates))
+        bounds = self.bounds_many(reference, candidates) if len(candidates) > ABANDON_SEED else None
+        if bounds is not None:
+            lower_bounds, _ = bounds
+            seeds = np.argsort(lower_bounds, kind='stable')[:ABANDON_SEED]
+            distances[seeds] = self.compute_many_without_map(reference, [candidates[i] for i in seeds])
+            upper_bound = min(upper_bound, float(distances[seeds].min()))
+            pending = np.setdiff1d(pending, seeds)
+            pending = pending[lower_bounds[pending] <= upper_bound]
+
+        scale = self.max_dist if self.normalized else 1
+        d = bounded_distances_to_many(reference, [candidates[i] for i in pending], self.p_lambda,
+                                      self.__get_avg_speed(reference),
+                                      [self.__get_avg_speed(candidates[i]) for i in pending],
+                                      self.spatial_distance, self.meters_per_unit, upper_bound * scale)
         if self.normalized:
             d /= self.max_dist  # normalization [0,1]
+        distances[pending] = d
 
-        # Store the distance for later use
-        if memory() < 1000:  #MB
-            print("Memory low, cleaning memory")
-            self.distance_matrix = {}
-        self.distance_matrix[key] = d
-
-        return d
+        return distances
 
     def compute_without_map(self, trajectory1: Trajectory, trajectory2: Trajectory) -> float:
-        avg_speed_1 = trajectory1.get_avg_speed(sp_type=self.spatial_distance)
-        avg_speed_2 = trajectory2.get_avg_speed(sp_type=self.spatial_distance)
+        avg_speed_1 = self.__get_avg_speed(trajectory1)
+        avg_speed_2 = self.__get_avg_speed(trajectory2)
         avg_speed = (avg_speed_1 + avg_speed_2) / 2
         avg_speed /= 3.6  # m/s
 
-        h = round((len(trajectory1) + len(trajectory2)) / 2)
-        gap_1 = len(trajectory1) / h
-        gap_2 = len(trajectory2) / h
-
-        index_1 = index_2 = 0
-        i = j = 0
-
-        d = 0
-
-        for k in range(h):
-
-            if i == len(trajectory1):
-                i = len(trajectory1) - 1
-
-            if j == len(trajectory2):
-                j = len(trajectory2) - 1
+        spatial, temporal = self.__resampled_distances(trajectory1, trajectory2)
+        spatial *= self.meters_per_unit  # meters
+        spatial += self.p_lambda * temporal * avg_speed  # meters
 
-            loc_1 = trajectory1.locations[i]
-            loc_2 = trajectory2.locations[j]
-
-            d1 = loc_1.spatial_distance(loc_2, type=self.spatial_distance) * 1000  # meters
-            d2 = self.p_lambda * (loc_1.temporal_distance(loc_2)) * avg_speed  # meters
-            d += pow(d1 + d2, 2)
-
-            index_1 += gap_1
-            index_2 += gap_2
-
-            i = round(index_1)
-            j = round(index_2)
-
-        d /= h
-
-        d = sqrt(d)
+        d = sqrt(np.dot(spatial, spatial) / len(spatial))
 
         if self.normalized:
             d /= self.max_dist  # normalization [0,1]
 
         return d
 
-    def __compute_spatial_distance(self, trajectory1: Trajectory, trajectory2: Trajectory) -> float:
-        key = trajectory1.str_id + "-" + trajectory2.str_id
-        d = self.distance_matrix.get(key)
-        if d is not None:
-            return d
-        key = trajectory2.str_id + "-" + trajectory1.str_id
-        d = self.distance_matrix.get(key)
-        if d is not None:
-            return d
-
-        # Distance not computed
-        h = round((len(trajectory1) + len(trajectory2)) / 2)
-        gap_1 = len(trajectory1) / h
-        gap_2 = len(trajectory2) / h
-
-        index_1 = index_2 = 0
-        i = j = 0
-
-        d = 0
-
-        for k in range(h):
-
-            if i == len(trajectory1):
-                i = len(trajectory1) - 1
-
-            if j == len(trajectory2):
-                j = len(trajectory2) - 1
-
-            loc_1 = trajectory1.locations[i]
-            loc_2 = trajectory2.locations[j]
-
-            d += pow(loc_1.spatial_distance(loc_2, type=self.spatial_distance), 2)
-
-            index_1 += gap_1
-            index_2 += gap_2
-
-            i = round(index_1)
-            j = round(index_2)
-
-        d /= h
-
-        d = sqrt(d)
-
-        # Store the distance for later use
-        self.distance_matrix[key] = d
-
-        return d
-
-    def __compute_temporal_distance(self, trajectory1: Trajectory, trajectory2: Trajectory) -> float:
-        key = trajectory1.str_id + "-" + trajectory2.str_id
-        d = self.temporal_matrix.get(key)
-        if d is not None:
-            return d
-        key = trajectory2.str_id + "-" + trajectory1.str_id
-        d = self.temporal_matrix.get(key)
-        if d is not None:
-            return d
-
-        # Distance not computed
-        avg_speed_1 = trajectory1.get_avg_speed(sp_type=self.spatial_distance)
-        avg_speed_2 = trajectory2.get_avg_speed(sp_type=self.spatial_distance)
-        avg_speed = (avg_speed_1 + avg_speed_2) / 2
-
+    def __resampled_distances(self, trajectory1: Trajectory, trajectory2: Trajectory) -> tuple:
+        '''
+        Spatial (in the units of the spatial distance) and temporal (s) distances between the h pairs of locations
+        compared by the distance, being h the average length of both trajectories
+        '''
         h = round((len(trajectory1) + len(trajectory2)) / 2)
-        gap_1 = len(trajectory1) / h
-        gap_2 = len(trajectory2) / h
-
-        index_1 = index_2 = 0
-        i = j = 0
-
-        d = 0
-
-        for k in range(h):
-
-            if i == len(trajectory1):
-                i = len(trajectory1) - 1
-
-            if j == len(trajectory2):
-                j = len(trajectory2) - 1
-
-            loc_1 = trajectory1.locations[i]
-            loc_2 = trajectory2.locations[j]
-
-            d += pow(loc_1.temporal_distance(loc_2) * avg_speed, 2)
-
-            index_1 += gap_1
-            index_2 += gap_2
+        timestamps_1, xs_1, ys_1 = trajectory1.get_arrays()
+        timestamps_2, xs_2, ys_2 = trajectory2.get_arrays()
+        i = resampled_indices(len(trajectory1), h)
+        j = resampled_indices(len(trajectory2), h)
 
-            i = round(index_1)
-            j = round(index_2)
-
-        d /= h
-
-        d = sqrt(d)
-
-        # Store the distance for later use
-        self.temporal_matrix[key] = d
+        if self.spatial_distance == 'Haversine':
+            spatial = geodesic.haversine_pairwise(ys_1[i], xs_1[i], ys_2[j], xs_2[j])
+        else:
+            spatial = geodesic.euclidean_pairwise(xs_1[i], ys_1[i], xs_2[j], ys_2[j])
+        temporal = np.abs(timestamps_2[j] - timestamps_1[i]).astype(np.float64)
 
-        return d
+        return spatial, temporal
 
     def filter_dataset(self):
         return self.dataset
 
+    def cache_stats(self) -> dict:
+        if self.distance_matrix is None:
+            return {}
+
+        return self.distance_matrix.stats()
+
     def clear_memory(self):
-        self.distance_matrix = {}
-        self.temporal_matrix = {}
\ No newline at end of file
+        if self.distance_matrix is not None:
+            self.distance_matrix.clear()
\ No newline at end of file
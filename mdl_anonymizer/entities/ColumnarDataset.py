@@ -0,0 +1,237 @@
+import logging
+import sys
+
+import numpy as np
+from geopandas import GeoDataFrame
+from shapely import geometry
+from skmob.utils.constants import DEFAULT_CRS
+
+from mdl_anonymizer.entities.Dataset import Dataset
+from mdl_anonymizer.entities.TrajectoryView import TrajectoryView
+from mdl_anonymizer.utils import geodesic
+
+
+class ColumnarDataset(Dataset):
+    '''
+    Dataset backed by contiguous NumPy arrays instead of one TimestampedLocation object per point.
+
+    Locations are stored in the lon, lat and timestamps arrays, sorted by trajectory and timestamp. The locations of
+    the i-th trajectory are those in [offsets[i], offsets[i+1]). Trajectories are TrajectoryView objects, i.e.
+    lightweight views into these arrays, so the whole Dataset API keeps working on top of them.
+
+    Trajectories added later (e.g. by an anonymization method) can be regular Trajectory objects. Use pack() to move
+    all the current trajectories to the arrays again.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.lon = None
+        self.lat = None
+        self.timestamps = None
+        self.offsets = None
+        self.trajectory_ids = None
+        self.user_ids = None
+        self._views = []
+
+    def from_columns(self, lon: np.ndarray, lat: np.ndarray, timestamps: np.ndarray, offsets: np.ndarray,
+                     trajectory_ids: np.ndarray, user_ids: np.ndarray):
+        '''
+        Load the dataset from its columns.
+        Locations must be sorted by trajectory and timestamp. The locations of the i-th trajectory are those in
+        [offsets[i], offsets[i+1]).
+
+        CAUTION: It removes all the current trajectories from the dataset.
+        '''
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64)
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.trajectory_ids = np.asarray(trajectory_ids)
+        self.user_ids = np.asarray(user_ids)
+
+        self._views = []
+        bounds = zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())
+        for traj_id, user_id, (start, end) in zip(self.trajectory_ids.tolist(), self.user_ids.tolist(), bounds):
+            self._views.append(TrajectoryView(traj_id, user_id,
+                                              self.timestamps[start:end], self.lon[start:end], self.lat[start:end]))
+
+        self.trajectories = list(self._views)
+
+    def pack(self):
+        '''
+        Move the locations of the current trajectories to contiguous arrays and replace the trajectories by views
+        '''
+        lon, lat, timestamps, lengths = self._columns()
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        trajectory_ids = np.array([t.id for t in self.trajectories])
+        user_ids = np.array([t.user_id for t in self.trajectories])
+
+        self.from_columns(lon, lat, timestamps, offsets, trajectory_ids, user_ids)
+
+    def is_packed(self) -> bool:
+        '''
+        Return True if the current trajectories are exactly the views of the arrays
+        '''
+        if len(self.trajectories) != len(self._views):
+            return False
+
+        return all(t is v and v.is_attached() for t, v in zip(self.trajectories, self._views))
+
+    def _columns(self) -> tuple:
+        '''
+        Return the lon, lat and timestamps of all the locations and the length of every trajectory, as arrays
+        '''
+        if self.is_packed():
+            return self.lon, self.lat, self.timestamps, np.diff(self.offsets)
+
+        return super()._columns()
+
+    @staticmethod
+    def _per_trajectory_sum(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        '''
+        Sum 'values' (one per location) within every trajectory
+        '''
+        cumsum = np.zeros(len(values) + 1)
+        np.cumsum(values, out=cumsum[1:])
+        ends = np.cumsum(lengths)
+
+        return cumsum[ends] - cumsum[ends - lengths]
+
+    @staticmethod
+    def _segments(lon, lat, timestamps, lengths) -> tuple:
+        '''
+        Return the haversine distance (km) and the time difference (s) between every location and the next one.
+        The last position of every trajectory is flagged as not valid in the returned mask
+        '''
+        distances = np.append(geodesic.haversine_segments(lat, lon), 0.0)
+        times = np.append(np.abs(np.diff(timestamps)), 0)
+
+        valid = np.ones(len(lon), dtype=bool)
+        ends = np.cumsum(lengths)
+        valid[ends[lengths > 0] - 1] = False
+
+        return distances, times, valid
+
+    def _keep(self, mask: np.ndarray):
+        self.trajectories = [t for t, keep in zip(self.trajectories, mask.tolist()) if keep]
+
+    def from_tdf(self, tdf):
+        super().from_tdf(tdf)
+        self.pack()
+
+    def from_numpy(self, np_dataset: np.array):
+        """Loads the dataset from a NumPy array like the generated by
+        the self.to_numpy method.
+        CAUTION: It removes all the current trajectories from the dataset."""
+        order = np.lexsort((np_dataset[:, 2], np_dataset[:, 3]))
+        np_dataset = np_dataset[order]
+
+        starts = np.flatnonzero(np.diff(np_dataset[:, 3], prepend=np.nan) != 0)
+        offsets = np.append(starts, len(np_dataset))
+
+        self.from_columns(np_dataset[:, 0], np_dataset[:, 1], np_dataset[:, 2], offsets,
+                          np_dataset[starts, 3].astype(np.int64), np_dataset[starts, 4].astype(np.int64))
+
+    def to_numpy(self, sort_by_timestamp=False):
+        lon, lat, timestamps, lengths = self._columns()
+
+        np_dataset = np.empty((len(lon), 5))
+        np_dataset[:, 0] = lon
+        np_dataset[:, 1] = lat
+        np_dataset[:, 2] = timestamps
+        np_dataset[:, 3] = np.repeat(np.array([t.id for t in self.trajectories], dtype=np.float64), lengths)
+        np_dataset[:, 4] = np.repeat(np.array([t.user_id for t in self.trajectories], dtype=np.float64), lengths)
+
+        if sort_by_timestamp:
+            np_dataset = np_dataset[np_dataset[:, 2].argsort()]
+
+        return np_dataset
+
+    def get_max_timestamp(self):
+        _, _, timestamps, _ = self._columns()
+        if len(timestamps) == 0:
+            return None
+
+        return int(timestamps.max())
+
+    def get_min_timestamp(self):
+        _, _, timestamps, _ = self._columns()
+        if len(timestamps) == 0:
+            return None
+
+        return int(timestamps.min())
+
+    def sort_trajectories(self):
+        for t in self.trajectories:
+            if isinstance(t, TrajectoryView) and t.is_attached():
+                timestamps, xs, ys = t.get_arrays()
+                if np.any(timestamps[1:] < timestamps[:-1]):
+                    order = np.argsort(timestamps, kind='stable')
+                    timestamps[:] = timestamps[order]
+                    xs[:] = xs[order]
+                    ys[:] = ys[order]
+                    t.invalidate_features()
+            else:
+                t.locations.sort(key=lambda x: x.timestamp)
+
+    def get_bounding_box(self) -> GeoDataFrame:
+        lon, lat, _, _ = self._columns()
+
+        max_lng = round(float(lon.max()), 5)
+        max_lat = round(float(lat.max()), 5)
+        min_lng = round(float(lon.min()), 5)
+        min_lat = round(float(lat.min()), 5)
+
+        point_list = [[max_lng, max_lat], [max_lng, min_lat], [min_lng, min_lat], [min_lng, max_lat]]
+
+        poly = geometry.Polygon(point_list)
+
+        polygon = GeoDataFrame(index=[0], crs=DEFAULT_CRS, geometry=[poly])
+
+        return polygon
+
+    def filter_by_speed(self, max_speed_kmh=300):
+        logging.info(f"Filtering dataset by max velocity")
+
+        lon, lat, timestamps, lengths = self._columns()
+        distances, times, valid = self._segments(lon, lat, timestamps, lengths)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speeds = distances / times * 3600
+        wrong = valid & ((times == 0) | (speeds > max_speed_kmh))
+
+        self._keep(self._per_trajectory_sum(wrong, lengths) == 0)
+
+        count_locations = self.get_number_of_locations()
+
+        logging.info(f"Dataset filtered. Removed trajectories with some one-time speed above {max_speed_kmh}. "
+                     f"Now it has {len(self)} trajectories and {count_locations} locations.")
+
+    def filter_by_length(self, min_length: float = 0, max_length: float = sys.maxsize):
+        logging.info(f"Filtering dataset by trajectory length")
+
+        lon, lat, timestamps, lengths = self._columns()
+        distances, _, valid = self._segments(lon, lat, timestamps, lengths)
+        trajectory_lengths = self._per_trajectory_sum(np.where(valid, distances, 0.0), lengths)
+
+        self._keep((min_length <= trajectory_lengths) & (trajectory_lengths <= max_length))
+
+        count_locations = self.get_number_of_locations()
+        logging.info(f"Dataset filtered."
+                     f"Now it has {len(self)} trajectories and {count_locations} locations.")
+
+    def filter_by_bounding_box(self, bbox: tuple):
+        logging.info(f"Filtering dataset by bounding box")
+
+        min_lng, min_lat, max_lng, max_lat = bbox
+        lon, lat, _, lengths = self._columns()
+        outside = (lon < min_lng) | (lon > max_lng) | (lat < min_lat) | (lat > max_lat)
+
+        self._keep(self._per_trajectory_sum(outside, lengths) == 0)
+
+        count_locations = self.get_number_of_locations()
+
+        logging.info(f"Dataset filtered. Removed trajectories with some location outside the bbox ({bbox}). "
+                     f"Now it has {len(self)} trajectories and {count_locations} locations.")
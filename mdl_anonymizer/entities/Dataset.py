@@ -1,11 +1,16 @@
 import csv
 import datetime
+import itertools
 import logging
 import sys
 from functools import reduce
 import random
+import re
 import pandas
 import numpy as np
+import pyarrow
+import pyarrow.compute as pc
+import pyarrow.dataset
 import pyarrow.parquet as pq
 
 from abc import ABC
@@ -16,10 +21,10 @@ from shapely import geometry
 from skmob import TrajDataFrame
 from skmob.utils import constants
 from skmob.utils.constants import DEFAULT_CRS
-from tqdm import tqdm
 
 from mdl_anonymizer.entities.Trajectory import Trajectory
 from mdl_anonymizer.entities.TimestampedLocation import TimestampedLocation
+from mdl_anonymizer.utils import dataset_cache, projection
 
 
 class Dataset(ABC):
@@ -35,114 +40,405 @@ class Dataset(ABC):
         self.crs = crs
 
     def _ensure_values(self, lat, lon):
-        if lat < -90 or lat > 90:
-            return False
-        if lon < -180 or lon > 180:
-            return False
+        """
+        Return a boolean mask with the locations whose latitude and longitude are in range
+        """
+        return (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+
+    @staticmethod
+    def _seconds(datetimes: np.ndarray, units_per_second: int = 10 ** 9) -> np.ndarray:
+        """
+        Integer timestamps (seconds) of datetimes given in units since the epoch, as int(pandas.Timestamp.timestamp()):
+        rounded to the microsecond and truncated towards zero
+        """
+        datetimes = np.asarray(datetimes, dtype=np.int64)
+        if units_per_second > 10 ** 6:
+            units_per_microsecond = units_per_second // 10 ** 6
+            datetimes = (datetimes + units_per_microsecond // 2) // units_per_microsecond
+            units_per_second = 10 ** 6
+
+        return np.sign(datetimes) * (np.abs(datetimes) // units_per_second)
+
+    def _parse_timestamps(self, datetimes, datetime_format):
+        """
+        Convert a column of datetimes to integer timestamps (seconds)
+        """
+        if not pandas.api.types.is_datetime64_any_dtype(datetimes):
+            datetimes = pandas.to_datetime(datetimes, format=datetime_format)
+
+        datetimes = pandas.Series(datetimes)
+        if datetimes.dt.tz is None:
+            datetimes = datetimes.dt.tz_localize(self.timezone)
+        datetimes = datetimes.dt.tz_convert("UTC").dt.tz_localize(None)
 
-        return True
+        return self._seconds(datetimes.to_numpy(dtype="datetime64[ns]").view(np.int64))
 
     #    @abstractmethod
     #    def load(self):
     #        raise NotImplementedError
 
-    def from_file(self, filename, filetype=None, n_trajectories=None, min_locations=0,
-                  latitude_key="lat", longitude_key="lon", datetime_key="timestamp", user_key="user_id",
-                  trajectory_key="trajectory_id",
-                  datetime_format="%Y/%m/%d %H:%M:%S",
-                  sample=None):
-
+    def _read_file(self, filename, filetype=None, chunk_size=None, keys: dict = None, filters: dict = None):
         """
-        Load a dataset from a CSV or parquet file
+        Read a CSV or parquet file as DataFrames. The whole file is returned as a single DataFrame if chunk_size is
+        None. Otherwise, DataFrames of (at most) chunk_size rows are read from disk as they are requested.
 
-        Note: datetimes are always considered in UTC timezone
+        For parquet files, the filters (see from_file) are pushed down to pyarrow, so row groups that can not
+        match them are never decoded.
         """
-
-        self.sample = sample
-
         if type(filename) is str:
             logging.info("Loading dataset...")
             if filename[-4:] == '.csv':
-                df = pandas.read_csv(filename)
+                file_format = 'csv'
             elif filename[-8:] == '.parquet':
-                # df = pandas.read_parquet(filename)
-                df = pq.read_table(filename).to_pandas()
+                file_format = 'parquet'
             else:
                 raise TypeError("File format not supported")
         else:  # file object from api
             logging.info("Loading dataset from file object...")
             if filetype[-8:] == '.parquet':
-                df = pq.read_table(filename).to_pandas()
+                file_format = 'parquet'
             else:
+                file_format = 'csv'
                 with open("temp.csv", 'wb') as out_file:
                     content = filename.read()  # async read
                     out_file.write(content)  # async write
-                df = pandas.read_csv("temp.csv")
+                filename = "temp.csv"
+
+        if file_format == 'csv':
+            if chunk_size is None:
+                yield pandas.read_csv(filename)
+            else:
+                with pandas.read_csv(filename, chunksize=chunk_size) as reader:
+                    yield from reader
+        else:
+            expression = self._filter_expression(filename, keys, filters)
+            if chunk_size is None:
+                # df = pandas.read_parquet(filename)
+                yield pq.read_table(filename, filters=expression).to_pandas()
+            elif expression is not None and type(filename) is str:
+                dataset = pyarrow.dataset.dataset(filename, format='parquet')
+                for batch in dataset.to_batches(filter=expression, batch_size=chunk_size):
+                    yield batch.to_pandas()
+            else:
+                for batch in pq.ParquetFile(filename).iter_batches(batch_size=chunk_size):
+                    if expression is not None:
+                        batch = pyarrow.Table.from_batches([batch]).filter(expression)
+                    yield batch.to_pandas()
+
+    def _filter_expression(self, filename, keys: dict, filters: dict):
+        """
+        Build the pyarrow expression of the filters (see from_file) to be pushed down when reading a parquet file.
 
-        # Order by traj_id
-        df.sort_values(trajectory_key, inplace=True)
+        Locations out of the time range or not belonging to the requested trajectories or users are filtered out.
+        For the bounding box, the trajectories with some (filtered) location outside it are computed in a first
+        pass, that just reads the trajectory and coordinates columns. Then, they are filtered out.
+        """
+        if not filters or all(value is None for value in filters.values()):
+            return None
+
+        def rewind():
+            if type(filename) is not str:
+                filename.seek(0)
+
+        schema = pq.read_schema(filename)
+        rewind()
+
+        expression = pyarrow.dataset.scalar(True)
+
+        if filters.get('time_range') is not None:
+            expression &= self._time_expression(schema, keys, filters['time_range'])
 
-        # Get the first trajectory and user id
-        traj_id = df.loc[0, trajectory_key]
-        user_id = df.loc[0, user_key]
+        if filters.get('trajectory_ids') is not None:
+            expression &= pc.field(keys['trajectory']).isin(list(filters['trajectory_ids']))
 
-        users = set([])
+        if filters.get('user_ids') is not None:
+            expression &= pc.field(keys['user']).isin(list(filters['user_ids']))
 
-        pbar = tqdm(total=len(df))
+        if filters.get('bbox') is not None:
+            min_lng, min_lat, max_lng, max_lat = filters['bbox']
+            lng = pc.field(keys['longitude'])
+            lat = pc.field(keys['latitude'])
+            inside = (lng >= min_lng) & (lng <= max_lng) & (lat >= min_lat) & (lat <= max_lat)
 
-        wrong_values = False
-        T = Trajectory(traj_id, user_id)
-        for index, row in df.iterrows():
-            if traj_id == row[trajectory_key]:
+            outside_table = pq.read_table(filename, columns=[keys['trajectory']], filters=expression & ~inside)
+            rewind()
+            outside_ids = pc.unique(outside_table[keys['trajectory']])
 
-                # Check values
-                if not self._ensure_values(row[latitude_key], row[longitude_key]):
-                    wrong_values = True
-                else:
-                    # Add location to current trajectory
+            expression &= inside & ~pc.field(keys['trajectory']).isin(outside_ids)
 
-                    # Convert datetime to timestamp
-                    element = datetime.datetime.strptime(row[datetime_key], datetime_format)
-                    element = self.timezone.localize(element)
-                    timestamp = datetime.datetime.timestamp(element)
+        return expression
 
-                    location = TimestampedLocation(timestamp, row[longitude_key], row[latitude_key])
-                    T.add_location(location, sort=False)
+    def _time_expression(self, schema, keys: dict, time_range: tuple):
+        """
+        Build the pyarrow expression to keep the locations within time_range, if the datetimes column can be
+        compared in the file. Otherwise, the time range is applied after reading (see _dataframe_to_columns)
+        """
+        start, end = time_range
+        field = schema.field(keys['datetime'])
+        column = pc.field(keys['datetime'])
+
+        if pyarrow.types.is_timestamp(field.type):
+            factor = {'s': 1, 'ms': 10 ** 3, 'us': 10 ** 6, 'ns': 10 ** 9}[field.type.unit]
+            start = pyarrow.scalar(int(start) * factor, type=pyarrow.int64()).cast(field.type)
+            end = pyarrow.scalar(int(end) * factor, type=pyarrow.int64()).cast(field.type)
+            return (column >= start) & (column <= end)
+
+        # Strings can be compared if the format goes from years to seconds with fixed width fields
+        if pyarrow.types.is_string(field.type) and \
+                re.fullmatch(r"%Y(\W%m(\W%d(\W%H(\W%M(\W%S)?)?)?)?)?", keys['datetime_format']):
+            start = datetime.datetime.fromtimestamp(start, self.timezone).strftime(keys['datetime_format'])
+            end = datetime.datetime.fromtimestamp(end, self.timezone).strftime(keys['datetime_format'])
+            return (column >= start) & (column <= end)
+
+        return pyarrow.dataset.scalar(True)
+
+    def _dataframe_to_columns(self, df, min_locations, keys: dict, filters: dict = None,
+                              sort_trajectories=True) -> tuple:
+        """
+        Build the columns of the trajectories in a DataFrame (see from_columns). Locations are sorted by timestamp
+        and trajectories by id (or by order of appearance if sort_trajectories is False). Trajectories with wrong
+        values or less than min_locations locations are discarded, as well as those not passing the filters
+        (see from_file).
+        """
+        filters = filters or {}
+
+        timestamps = self._parse_timestamps(df[keys['datetime']], keys['datetime_format'])
+
+        rows = np.ones(len(df), dtype=bool)
+        if filters.get('time_range') is not None:
+            rows &= (timestamps >= filters['time_range'][0]) & (timestamps <= filters['time_range'][1])
+        if filters.get('trajectory_ids') is not None:
+            rows &= df[keys['trajectory']].isin(list(filters['trajectory_ids'])).to_numpy()
+        if filters.get('user_ids') is not None:
+            rows &= df[keys['user']].isin(list(filters['user_ids'])).to_numpy()
+        if not rows.all():
+            df = df[rows]
+            timestamps = timestamps[rows]
+
+        lon = df[keys['longitude']].to_numpy(dtype=np.float64)
+        lat = df[keys['latitude']].to_numpy(dtype=np.float64)
+
+        return self._arrays_to_columns(lon, lat, timestamps, df[keys['trajectory']].to_numpy(),
+                                       df[keys['user']].to_numpy(), min_locations, filters.get('bbox'),
+                                       sort_trajectories)
+
+    def _arrays_to_columns(self, lon, lat, timestamps, trajectories, user_ids, min_locations, bbox=None,
+                           sort_trajectories=True) -> tuple:
+        """
+        Build the columns of the trajectories (see from_columns) from the values of every location.
+        If locations are already sorted and all the trajectories are kept, the given arrays are returned (no copy).
+        """
+        trajectory_codes, trajectory_ids = pandas.factorize(trajectories, sort=sort_trajectories)
+
+        # Order by trajectory and timestamp
+        order = np.lexsort((timestamps, trajectory_codes))
+        if np.any(order[1:] < order[:-1]):
+            lon, lat, timestamps, trajectory_codes, user_ids = \
+                lon[order], lat[order], timestamps[order], trajectory_codes[order], user_ids[order]
+
+        # Cut trajectories
+        starts = np.flatnonzero(np.diff(trajectory_codes, prepend=-1) != 0)
+        lengths = np.diff(np.append(starts, len(trajectory_codes)))
+
+        # Discard trajectories with wrong values or not enough locations
+        wrong = ~self._ensure_values(lat, lon)
+        if bbox is not None:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            wrong |= (lon < min_lng) | (lon > max_lng) | (lat < min_lat) | (lat > max_lat)
+        wrong_values = np.zeros(len(starts), dtype=np.int64)
+        if len(starts):
+            wrong_values = np.add.reduceat(wrong.astype(np.int64), starts)
+        keep = (wrong_values == 0) & (lengths >= min_locations)
+
+        offsets = np.zeros(np.count_nonzero(keep) + 1, dtype=np.int64)
+        np.cumsum(lengths[keep], out=offsets[1:])
+        if not keep.all():
+            rows = np.repeat(keep, lengths)
+            lon, lat, timestamps = lon[rows], lat[rows], timestamps[rows]
+
+        return (lon, lat, timestamps, offsets,
+                np.asarray(trajectory_ids)[trajectory_codes[starts[keep]]], user_ids[starts[keep]])
+
+    @staticmethod
+    def _head_columns(columns: tuple, n_trajectories: int) -> tuple:
+        """
+        Keep just the first n_trajectories trajectories of some columns
+        """
+        lon, lat, timestamps, offsets, trajectory_ids, user_ids = columns
+        n_locations = offsets[n_trajectories]
+
+        return (lon[:n_locations], lat[:n_locations], timestamps[:n_locations], offsets[:n_trajectories + 1],
+                trajectory_ids[:n_trajectories], user_ids[:n_trajectories])
+
+    @staticmethod
+    def _concat_columns(chunks: list) -> tuple:
+        """
+        Concatenate the columns of several chunks of trajectories
+        """
+        if len(chunks) == 1:
+            return chunks[0]
+
+        if not chunks:
+            return (np.empty(0), np.empty(0), np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64),
+                    np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+        offsets = [np.zeros(1, dtype=np.int64)]
+        n_locations = 0
+        for chunk in chunks:
+            offsets.append(chunk[3][1:] + n_locations)
+            n_locations += chunk[3][-1]
+
+        return (np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks]),
+                np.concatenate([c[2] for c in chunks]), np.concatenate(offsets),
+                np.concatenate([c[4] for c in chunks]), np.concatenate([c[5] for c in chunks]))
+
+    def _iter_columns(self, filename, filetype=None, chunk_size=None, n_trajectories=None, min_locations=0,
+                      keys: dict = None, filters: dict = None, validate=False):
+        """
+        Yield the columns of the trajectories of a file, chunk by chunk (see _read_file).
+
+        When reading by chunks, the rows of every trajectory must be contiguous in the file. The last trajectory of
+        a chunk is kept until the next chunk is read, so just complete trajectories are yielded. No more chunks are
+        read once n_trajectories trajectories have been yielded.
+        Rows of a trajectory split within a chunk are always detected. Rows split across chunks are only detected if
+        validate is True, as the ids of all the trajectories read have to be kept.
+        """
+        if chunk_size is None:
+            df = next(self._read_file(filename, filetype, keys=keys, filters=filters))
+            columns = self._dataframe_to_columns(df, min_locations, keys, filters)
+            if n_trajectories and len(columns[3]) - 1 > n_trajectories:
+                columns = self._head_columns(columns, n_trajectories)
+            yield columns
+            return
+
+        seen = set()
+        remaining = n_trajectories
+        pending = None
+        chunks = self._read_file(filename, filetype, chunk_size, keys, filters)
+        for df in itertools.chain(chunks, [None]):
+            if df is None:
+                # End of file, the pending trajectory is complete
+                complete, pending = pending, None
+                if complete is None:
+                    break
             else:
-                # Sort locations and add trajectory
-                if len(T.locations) >= min_locations and not wrong_values:
-                    T.locations.sort(key=lambda x: x.timestamp)
-                    self.add_trajectory(T)
-
-                    if n_trajectories and len(self.trajectories) >= n_trajectories:
-                        break
-
-                # Create another trajectory
-                wrong_values = False
-                traj_id = row[trajectory_key]
-                user_id = row[user_key]
-                users.add(user_id)
-
-                T = Trajectory(traj_id, user_id)
-
-                if not self._ensure_values(row[latitude_key], row[longitude_key]):
-                    wrong_values = True
-                else:
-                    # Convert datetime to timestamp
-                    element = datetime.datetime.strptime(row[datetime_key], datetime_format)
-                    element = self.timezone.localize(element)
-                    timestamp = datetime.datetime.timestamp(element)
-                    location = TimestampedLocation(timestamp, row[longitude_key], row[latitude_key])
-                    T.add_location(location, sort=False)
-
-            pbar.update(1)
-        else:
-            # Sort and add last trajectory
-            if len(T.locations) >= min_locations:
-                T.locations.sort(key=lambda x: x.timestamp)
-                self.add_trajectory(T)
+                if pending is not None:
+                    df = pandas.concat([pending, df], ignore_index=True)
+
+                # The last trajectory of the chunk may continue in the next one
+                trajectory_values = df[keys['trajectory']].to_numpy()
+                changes = np.flatnonzero(trajectory_values[1:] != trajectory_values[:-1])
+                tail = changes[-1] + 1 if len(changes) else 0
+                complete, pending = df.iloc[:tail], df.iloc[tail:]
+                if complete.empty:
+                    continue
+
+            trajectory_values = complete[keys['trajectory']].to_numpy()
+            starts = np.flatnonzero(np.diff(pandas.factorize(trajectory_values)[0], prepend=-1) != 0)
+            chunk_ids = trajectory_values[starts].tolist()
+            if len(set(chunk_ids)) != len(chunk_ids) or (validate and not seen.isdisjoint(chunk_ids)):
+                raise ValueError(f"Rows of every trajectory ('{keys['trajectory']}') must be contiguous "
+                                 f"to read the file by chunks")
+            if validate:
+                seen.update(chunk_ids)
+
+            columns = self._dataframe_to_columns(complete, min_locations, keys, filters, sort_trajectories=False)
+            n_chunk = len(columns[3]) - 1
+            if remaining is not None and n_chunk >= remaining:
+                yield self._head_columns(columns, remaining)
+                chunks.close()
+                return
+            if remaining is not None:
+                remaining -= n_chunk
+
+            yield columns
+
+    def iter_file(self, filename, filetype=None, chunk_size=100000, n_trajectories=None, min_locations=0,
+                  latitude_key="lat", longitude_key="lon", datetime_key="timestamp", user_key="user_id",
+                  trajectory_key="trajectory_id",
+                  datetime_format="%Y/%m/%d %H:%M:%S",
+                  bbox=None, time_range=None, trajectory_ids=None, user_ids=None, validate=False):
+        """
+        Read a CSV or parquet file chunk by chunk (chunk_size rows) and yield its trajectories as soon as they are
+        complete. Peak memory is proportional to the chunk size, not to the file size.
 
-        count_locations = sum([len(t) for t in self.trajectories])
+        The rows of every trajectory must be contiguous in the file (as in the files written by to_csv). A ValueError
+        is raised if the rows of a trajectory are split within a chunk. If validate is True, rows split across
+        chunks are detected too, keeping the id of every trajectory read (memory proportional to their number).
+        Trajectories are yielded in order of appearance. Trajectories with some location out of the valid latitude
+        and longitude ranges or with less than min_locations locations are discarded. See from_file for the filters.
+
+        Note: datetimes are always considered in UTC timezone
+        """
+        keys = {'latitude': latitude_key, 'longitude': longitude_key, 'datetime': datetime_key,
+                'user': user_key, 'trajectory': trajectory_key, 'datetime_format': datetime_format}
+        filters = {'bbox': bbox, 'time_range': time_range, 'trajectory_ids': trajectory_ids, 'user_ids': user_ids}
+
+        for columns in self._iter_columns(filename, filetype, chunk_size, n_trajectories, min_locations, keys,
+                                          filters, validate):
+            chunk = self.__class__()
+            chunk.from_columns(*columns)
+            yield from chunk.trajectories
+
+    def from_file(self, filename, filetype=None, n_trajectories=None, min_locations=0,
+                  latitude_key="lat", longitude_key="lon", datetime_key="timestamp", user_key="user_id",
+                  trajectory_key="trajectory_id",
+                  datetime_format="%Y/%m/%d %H:%M:%S",
+                  sample=None, chunk_size=None,
+                  bbox=None, time_range=None, trajectory_ids=None, user_ids=None,
+                  cache_folder=None):
+
+        """
+        Load a dataset from a CSV or parquet file
+
+        Trajectories with some location out of the valid latitude and longitude ranges are discarded.
+        If chunk_size is provided, the file is read by chunks of chunk_size rows (see iter_file), so the whole file
+        is never loaded in memory and reading stops once n_trajectories trajectories have been loaded. In that case,
+        trajectories keep their order of appearance in the file.
+
+        Filters (applied before min_locations and n_trajectories):
+            bbox (min_lng, min_lat, max_lng, max_lat): The whole trajectory should be inside the bounding box
+                (as in filter_by_bounding_box)
+            time_range (min_timestamp, max_timestamp): Just the locations within the time range are loaded
+            trajectory_ids, user_ids: Just the locations of these trajectories/users are loaded
+        For parquet files, filters are pushed down to pyarrow, so row groups out of the filters are never decoded.
+
+        If cache_folder is provided, the loaded dataset is stored there in a binary format (see utils.dataset_cache),
+        keyed by the content of the file and the load parameters. Later loads with the same file and parameters
+        memory-map it instead of parsing the file again.
+
+        Note: datetimes are always considered in UTC timezone
+        """
+
+        self.sample = sample
+
+        keys = {'latitude': latitude_key, 'longitude': longitude_key, 'datetime': datetime_key,
+                'user': user_key, 'trajectory': trajectory_key, 'datetime_format': datetime_format}
+        filters = {'bbox': bbox, 'time_range': time_range, 'trajectory_ids': trajectory_ids, 'user_ids': user_ids}
+
+        columns = None
+        if cache_folder is not None:
+            key = dataset_cache.cache_key(filename, {'filetype': filetype, 'n_trajectories': n_trajectories,
+                                                     'min_locations': min_locations, 'keys': keys,
+                                                     'filters': filters, 'chunked': chunk_size is not None,
+                                                     'timezone': self.timezone.zone})
+            columns = dataset_cache.load_columns(cache_folder, key)
+            if columns is not None:
+                logging.info(f"Dataset found in cache ({cache_folder})")
+
+        if columns is None:
+            # The whole dataset is kept anyway, so keeping the ids read to validate the file is not a concern
+            chunks = list(self._iter_columns(filename, filetype, chunk_size, n_trajectories, min_locations, keys,
+                                             filters, validate=True))
+            columns = self._concat_columns(chunks)
+            if cache_folder is not None:
+                source = filename if type(filename) is str else filetype
+                dataset_cache.save_columns(cache_folder, key, columns, {'source': source})
+
+        self.from_columns(*columns)
+
+        count_locations = int(columns[3][-1])
+        users = set(columns[5].tolist())
 
         logging.info(
             f"Dataset loaded: {len(self)} trajectories, {count_locations} locations, from {len(users)} users. "
@@ -155,6 +451,29 @@ class Dataset(ABC):
                 f"Dataset sampled. "
                 f"Now it has {len(self)} trajectories and {count_locations} locations.")
 
+    def from_columns(self, lon: np.ndarray, lat: np.ndarray, timestamps: np.ndarray, offsets: np.ndarray,
+                     trajectory_ids: np.ndarray, user_ids: np.ndarray):
+        """
+        Load the dataset from its columns.
+        Locations must be sorted by trajectory and timestamp. The locations of the i-th trajectory are those in
+        [offsets[i], offsets[i+1]).
+
+        CAUTION: It removes all the current trajectories from the dataset.
+        """
+        self.trajectories = []
+
+        lon = np.asarray(lon).tolist()
+        lat = np.asarray(lat).tolist()
+        timestamps = np.asarray(timestamps).tolist()
+        bounds = zip(np.asarray(offsets)[:-1].tolist(), np.asarray(offsets)[1:].tolist())
+
+        for traj_id, user_id, (start, end) in zip(np.asarray(trajectory_ids).tolist(),
+                                                  np.asarray(user_ids).tolist(), bounds):
+            T = Trajectory(traj_id, user_id)
+            T.locations = [TimestampedLocation(ts, x, y) for ts, x, y in
+                           zip(timestamps[start:end], lon[start:end], lat[start:end])]
+            self.add_trajectory(T)
+
     def to_csv(self, filename="output_dataset.csv"):
         """
         Export a loaded dataset to a csv
@@ -166,53 +485,223 @@ class Dataset(ABC):
 
         logging.info("Writing dataset...")
 
+        lon, lat, timestamps, lengths = self._export_columns()
+        datetimes = pandas.to_datetime(timestamps, unit='s', utc=True).tz_convert(self.timezone)
+        trajectory_ids = itertools.chain.from_iterable(itertools.repeat(t.id, n) for t, n in
+                                                       zip(self.trajectories, lengths.tolist()))
+        user_ids = itertools.chain.from_iterable(itertools.repeat(t.user_id, n) for t, n in
+                                                 zip(self.trajectories, lengths.tolist()))
+
         with open(filename, mode='w', newline='') as new_file:
             writer = csv.writer(new_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
             writer.writerow(["lon", "lat", "timestamp", "trajectory_id", "user_id"])
-            for t in self.trajectories:
-                for l in t.locations:
-                    date_time = datetime.datetime.fromtimestamp(l.timestamp, self.timezone)
-                    writer.writerow([l.x, l.y, date_time.strftime("%Y/%m/%d %H:%M:%S"), t.id, t.user_id])
+            writer.writerows(zip(lon.tolist(), lat.tolist(), datetimes.strftime("%Y/%m/%d %H:%M:%S"),
+                                 trajectory_ids, user_ids))
 
-    def from_tdf(self, tdf: TrajDataFrame):
+    def is_projected(self) -> bool:
+        """
+        Return True if the locations are in a projected (metric) CRS (see project)
+        """
+        return projection.is_projected(self.crs)
+
+    def project(self, crs=None):
+        """
+        Project the locations (x is longitude and y latitude) to a metric CRS, so spatial distances can be computed
+        as plain Euclidean distances in meters. If crs is None, the UTM zone of the dataset is taken.
+        Locations are projected back to longitude and latitude when the dataset is exported (to_csv, to_parquet...).
+        Filters (filter_by_speed, filter_by_bounding_box...) keep their units (km, km/h, longitude and latitude).
+        Some methods (e.g. ProtectedGeneralization) do not support projected datasets.
+        """
+        if self.is_projected():
+            return
 
-        # Sort by uid
-        tdf.sort_values(constants.TID)
+        lon, lat, timestamps, lengths = self._columns()
+        if crs is None:
+            crs = projection.utm_crs((lon.min(), lat.min(), lon.max(), lat.max()))
+        xs, ys = projection.project(lon, lat, crs)
 
-        user_id = tdf[constants.UID].iloc[0]
-        traj_id = tdf[constants.TID].iloc[0]
+        self.__set_coordinates(xs, ys, timestamps, lengths)
+        self.crs = crs
+        logging.info(f"Dataset projected to {crs}")
 
-        T = Trajectory(traj_id, user_id)
+    def unproject(self):
+        """
+        Project the locations back to longitude and latitude (DEFAULT_CRS)
+        """
+        if not self.is_projected():
+            return
 
-        for index, row in tdf.iterrows():
-            # Change of trajectory
-            if traj_id != row[constants.TID]:
-                T.locations.sort(key=lambda x: x.timestamp)
-                self.add_trajectory(T)
+        xs, ys, timestamps, lengths = self._columns()
+        lon, lat = projection.unproject(xs, ys, self.crs)
 
-                traj_id = row[constants.TID]
-                user_id = row[constants.UID]
-                T = Trajectory(traj_id, user_id)
+        self.__set_coordinates(lon, lat, timestamps, lengths)
+        self.crs = DEFAULT_CRS
 
-            # Add new location
-            timestamp = row[constants.DATETIME].timestamp()
-            location = TimestampedLocation(timestamp, row[constants.LONGITUDE], row[constants.LATITUDE])
-            T.add_location(location, sort=False)
+    def __set_coordinates(self, xs, ys, timestamps, lengths):
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        trajectory_ids = np.array([t.id for t in self.trajectories])
+        user_ids = np.array([t.user_id for t in self.trajectories])
 
-        # Add the last trajectory
-        T.locations.sort(key=lambda x: x.timestamp)
-        self.add_trajectory(T)
+        self.from_columns(xs, ys, timestamps, offsets, trajectory_ids, user_ids)
 
-    def to_tdf(self):
+    def _export_columns(self) -> tuple:
+        """
+        Return the columns (see _columns) with the locations in longitude and latitude
+        """
+        lon, lat, timestamps, lengths = self._columns()
+        if self.is_projected():
+            lon, lat = projection.unproject(lon, lat, self.crs)
+
+        return lon, lat, timestamps, lengths
+
+    def _columns(self) -> tuple:
+        """
+        Return the lon, lat and timestamps of all the locations and the length of every trajectory, as arrays
+        """
+        if not self.trajectories:
+            return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        arrays = [t.get_arrays() for t in self.trajectories]
+        timestamps = np.concatenate([a[0] for a in arrays]).astype(np.int64, copy=False)
+        lon = np.concatenate([a[1] for a in arrays]).astype(np.float64, copy=False)
+        lat = np.concatenate([a[2] for a in arrays]).astype(np.float64, copy=False)
+        lengths = np.fromiter((len(a[0]) for a in arrays), dtype=np.int64, count=len(arrays))
+
+        return lon, lat, timestamps, lengths
+
+    def to_arrow(self) -> pyarrow.Table:
+        """
+        Export the dataset to an Arrow table with the same columns as to_csv.
+        Timestamps are stored as UTC timestamps (seconds).
 
-        rows = [[loc.x, loc.y, loc.timestamp, traj.user_id, traj.id] for traj in self.trajectories
-                for loc in traj.locations]
-        df = pandas.DataFrame(rows, columns=[constants.LONGITUDE, constants.LATITUDE, constants.DATETIME,
-                                             constants.UID, constants.TID])
+        The lon, lat and timestamp columns share their buffers with the arrays of a packed ColumnarDataset
+        (unless the dataset is projected).
+        """
+        lon, lat, timestamps, lengths = self._export_columns()
+        trajectory_ids = pyarrow.array([t.id for t in self.trajectories])
+        user_ids = pyarrow.array([t.user_id for t in self.trajectories])
+        # Index of the trajectory of every location
+        indices = pyarrow.array(np.repeat(np.arange(len(lengths)), lengths))
+
+        return pyarrow.table({
+            "lon": lon,
+            "lat": lat,
+            "timestamp": pyarrow.array(timestamps).view(pyarrow.timestamp('s', tz=self.timezone.zone)),
+            "trajectory_id": trajectory_ids.take(indices),
+            "user_id": user_ids.take(indices)
+        })
+
+    @staticmethod
+    def _arrow_array(table: pyarrow.Table, key: str) -> pyarrow.Array:
+        column = table[key]
+        if column.num_chunks == 1:
+            return column.chunk(0)
+
+        return column.combine_chunks()
+
+    def from_arrow(self, table: pyarrow.Table, min_locations=0,
+                   latitude_key="lat",
+                   longitude_key="lon",
+                   datetime_key="timestamp",
+                   user_key="user_id",
+                   trajectory_key="trajectory_id",
+                   datetime_format="%Y/%m/%d %H:%M:%S"):
+        """
+        Load the dataset from an Arrow table (e.g. the one generated by to_arrow), without serializing it.
+
+        Trajectories keep their order of appearance in the table. Trajectories with some location out of the
+        valid latitude and longitude ranges or with less than min_locations locations are discarded.
+        If the rows of the table are already grouped by trajectory and sorted by timestamp, its timestamps are
+        in seconds and no trajectory is discarded, a ColumnarDataset shares the buffers of the table (its arrays
+        are read-only).
+
+        CAUTION: It removes all the current trajectories from the dataset.
+        """
+        lon = self._arrow_array(table, longitude_key).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+        lat = self._arrow_array(table, latitude_key).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+
+        datetimes = self._arrow_array(table, datetime_key)
+        if pyarrow.types.is_timestamp(datetimes.type) and datetimes.null_count == 0:
+            factor = {'s': 1, 'ms': 10 ** 3, 'us': 10 ** 6, 'ns': 10 ** 9}[datetimes.type.unit]
+            timestamps = datetimes.view(pyarrow.int64()).to_numpy()
+            if factor != 1:
+                timestamps = self._seconds(timestamps, factor)
+        else:
+            timestamps = self._parse_timestamps(datetimes.to_pandas(), datetime_format)
+
+        trajectories = self._arrow_array(table, trajectory_key).to_numpy(zero_copy_only=False)
+        user_ids = self._arrow_array(table, user_key).to_numpy(zero_copy_only=False)
+
+        columns = self._arrays_to_columns(lon, lat, timestamps, trajectories, user_ids, min_locations,
+                                          sort_trajectories=False)
+        self.from_columns(*columns)
+
+        logging.info(f"{len(self)} trajectories loaded from Arrow table")
+
+    def to_parquet(self, filename="output_dataset.parquet", row_group_size=None, compression="snappy"):
+        """
+        Export a loaded dataset to a parquet file
+
+        Note: Datetimes are written in UTC timezone
+        """
+        if not self.is_loaded():
+            raise RuntimeError("Dataset is not loaded")
+
+        logging.info("Writing dataset...")
+
+        pq.write_table(self.to_arrow(), filename, row_group_size=row_group_size, compression=compression)
+
+    def to_file(self, filename, **kwargs):
+        """
+        Export a loaded dataset to a parquet file (if filename ends with .parquet) or to a CSV file (otherwise).
+        kwargs are passed to to_parquet (row_group_size, compression)
+        """
+        if str(filename).endswith(".parquet"):
+            self.to_parquet(filename, **kwargs)
+        else:
+            self.to_csv(filename)
+
+    def from_tdf(self, tdf: TrajDataFrame):
+        """
+        Add the trajectories of a TrajDataFrame to the dataset.
+        Trajectories keep their order of appearance and their locations are sorted by timestamp.
+        """
+        datetimes = tdf[constants.DATETIME]
+        if datetimes.dt.tz is not None:
+            datetimes = datetimes.dt.tz_convert("UTC").dt.tz_localize(None)
+        timestamps = self._seconds(datetimes.to_numpy(dtype="datetime64[ns]").view(np.int64))
+        lon = tdf[constants.LONGITUDE].to_numpy()
+        lat = tdf[constants.LATITUDE].to_numpy()
+        user_ids = tdf[constants.UID].to_numpy()
+        trajectory_codes, trajectory_ids = pandas.factorize(tdf[constants.TID], sort=False)
+
+        # Order by trajectory and timestamp
+        order = np.lexsort((timestamps, trajectory_codes))
+        trajectory_codes = trajectory_codes[order]
+        starts = np.flatnonzero(np.diff(trajectory_codes, prepend=-1) != 0)
+        offsets = np.append(starts, len(order))
+
+        trajectories = self.trajectories
+        self.from_columns(lon[order], lat[order], timestamps[order], offsets,
+                          np.asarray(trajectory_ids)[trajectory_codes[starts]], user_ids[order][starts])
+        self.trajectories = trajectories + self.trajectories
+
+    def to_tdf(self):
+        lon, lat, timestamps, lengths = self._columns()
+        df = pandas.DataFrame({
+            constants.LONGITUDE: lon,
+            constants.LATITUDE: lat,
+            constants.DATETIME: timestamps,
+            constants.UID: np.repeat(np.array([t.user_id for t in self.trajectories]), lengths),
+            constants.TID: np.repeat(np.array([t.id for t in self.trajectories]), lengths)
+        })
         tdf = TrajDataFrame(df, timestamp=True)
 
-        tdf[constants.LONGITUDE] = tdf[constants.LONGITUDE].astype(np.float32)
-        tdf[constants.LATITUDE] = tdf[constants.LATITUDE].astype(np.float32)
+        # Projected coordinates (meters) would lose precision as float32
+        if not self.is_projected():
+            tdf[constants.LONGITUDE] = tdf[constants.LONGITUDE].astype(np.float32)
+            tdf[constants.LATITUDE] = tdf[constants.LATITUDE].astype(np.float32)
         tdf[constants.UID] = tdf[constants.UID].astype(np.int32)
         tdf[constants.TID] = tdf[constants.TID].astype(np.int32)
 
@@ -304,22 +793,14 @@ class Dataset(ABC):
         return None
 
     def get_max_timestamp(self):
-        timestamp = None
-        for t in self.trajectories:
-            for l in t.locations:
-                if timestamp is None or l.timestamp > timestamp:
-                    timestamp = l.timestamp
+        timestamps = [t.get_features()['time_span'][1] for t in self.trajectories if len(t) > 0]
 
-        return timestamp
+        return max(timestamps) if timestamps else None
 
     def get_min_timestamp(self):
-        timestamp = None
-        for t in self.trajectories:
-            for l in t.locations:
-                if timestamp is None or l.timestamp < timestamp:
-                    timestamp = l.timestamp
+        timestamps = [t.get_features()['time_span'][0] for t in self.trajectories if len(t) > 0]
 
-        return timestamp
+        return min(timestamps) if timestamps else None
 
     def sort_trajectories(self):
         """
@@ -371,7 +852,12 @@ class Dataset(ABC):
         """
         logging.info(f"Filtering dataset by max velocity")
 
-        self.trajectories = [t for t in self.trajectories if not t.some_speed_over(max_speed_kmh)]
+        if self.is_projected():
+            # Speeds in meters per second
+            self.trajectories = [t for t in self.trajectories
+                                 if not t.get_features('Euclidean')['max_speed'] * 3.6 > max_speed_kmh]
+        else:
+            self.trajectories = [t for t in self.trajectories if not t.some_speed_over(max_speed_kmh)]
 
         count_locations = sum([len(t) for t in self.trajectories])
 
@@ -386,7 +872,12 @@ class Dataset(ABC):
         """
 
         logging.info(f"Filtering dataset by trajectory length")
-        self.trajectories = [t for t in self.trajectories if min_length <= t.get_length() <= max_length]
+        if self.is_projected():
+            # Lengths in meters
+            self.trajectories = [t for t in self.trajectories
+                                 if min_length <= t.get_features('Euclidean')['length'] / 1000 <= max_length]
+        else:
+            self.trajectories = [t for t in self.trajectories if min_length <= t.get_length() <= max_length]
         count_locations = sum([len(t) for t in self.trajectories])
         logging.info(f"Dataset filtered."
                      f"Now it has {len(self)} trajectories and {count_locations} locations.")
@@ -399,7 +890,19 @@ class Dataset(ABC):
         '''
         logging.info(f"Filtering dataset by bounding box")
 
-        self.trajectories = [t for t in self.trajectories if not t.some_location_outside(bbox)]
+        if self.is_projected():
+            # The bounding box is in longitude and latitude, so are the locations compared
+            min_lng, min_lat, max_lng, max_lat = bbox
+            lon, lat, _, lengths = self._export_columns()
+            outside = (lon < min_lng) | (lon > max_lng) | (lat < min_lat) | (lat > max_lat)
+            n_outside = np.zeros(len(lengths), dtype=np.int64)
+            non_empty = lengths > 0
+            if non_empty.any():
+                starts = (np.cumsum(lengths) - lengths)[non_empty]
+                n_outside[non_empty] = np.add.reduceat(outside.astype(np.int64), starts)
+            self.trajectories = [t for t, n in zip(self.trajectories, n_outside.tolist()) if n == 0]
+        else:
+            self.trajectories = [t for t in self.trajectories if not t.some_location_outside(bbox)]
 
         count_locations = sum([len(t) for t in self.trajectories])
 
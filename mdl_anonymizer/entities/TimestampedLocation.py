@@ -2,6 +2,8 @@ from math import sqrt
 
 from haversine import haversine, Unit
 
+from mdl_anonymizer.utils import geodesic
+
 
 class TimestampedLocation:
     def __init__(self, timestamp, x, y):
@@ -41,6 +43,8 @@ class TimestampedLocation:
 
         if type == 'Haversine':
             # Haversine distance. Return km
+            if unit == Unit.KILOMETERS:
+                return geodesic.haversine(self.y, self.x, another_location.y, another_location.x)
             return haversine(self.get_coordinates(), another_location.get_coordinates(), unit=unit)
 
         if type == 'Euclidean':
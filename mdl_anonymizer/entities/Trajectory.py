@@ -1,7 +1,43 @@
-from more_itertools import pairwise
 from math import sqrt
 
+import numpy as np
+
 from mdl_anonymizer.entities.TimestampedLocation import TimestampedLocation
+from mdl_anonymizer.utils import geodesic
+
+
+class LocationList(list):
+    '''
+    List of the locations of a trajectory. Any change of the list invalidates the features cached by the trajectory.
+    Locations themselves are not expected to change
+    '''
+
+    def __init__(self, owner, locations=()):
+        super().__init__(locations)
+        self._owner = owner
+
+    def _invalidate(self):
+        # The owner is not set yet while unpickling
+        owner = getattr(self, '_owner', None)
+        if owner is not None:
+            owner.invalidate_features()
+
+
+def _mutator(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._invalidate()
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ['append', 'extend', 'insert', 'pop', 'remove', 'reverse', 'sort', 'clear', '__setitem__',
+              '__delitem__', '__iadd__', '__imul__']:
+    setattr(LocationList, _name, _mutator(_name))
 
 
 class Trajectory:
@@ -10,9 +46,20 @@ class Trajectory:
         self.str_id = str(self.id)
         self.user_id = user_id
         self.index = 0
+        self._features = {}
+        self._arrays = None
         self.locations = []
         self.distance_to_reference_trajectory = 0
 
+    @property
+    def locations(self):
+        return self._locations
+
+    @locations.setter
+    def locations(self, locations: list):
+        self._locations = LocationList(self, locations)
+        self.invalidate_features()
+
     def add_location(self, location: TimestampedLocation, sort=True):
         self.locations.append(location)
         if sort:
@@ -31,6 +78,22 @@ class Trajectory:
     def get_timestamps(self):
         return [l.timestamp for l in self.locations]
 
+    def get_arrays(self) -> tuple:
+        '''
+        Return the timestamps, x and y coordinates of the locations as NumPy arrays. They are cached (read-only) until
+        the locations change
+        '''
+        if self._arrays is None:
+            n = len(self.locations)
+            timestamps = np.fromiter((l.timestamp for l in self.locations), dtype=np.int64, count=n)
+            xs = np.fromiter((l.x for l in self.locations), dtype=np.float64, count=n)
+            ys = np.fromiter((l.y for l in self.locations), dtype=np.float64, count=n)
+            for array in (timestamps, xs, ys):
+                array.flags.writeable = False
+            self._arrays = (timestamps, xs, ys)
+
+        return self._arrays
+
     def get_interval_timestamps(self, interval: tuple):
         return [l.timestamp for l in self.locations if interval[0] <= l.timestamp <= interval[1]]
 
@@ -59,30 +122,66 @@ class Trajectory:
 
         return None
 
-    def get_length(self, unit='km'):
-        def distance(pair):
-            return pair[0].spatial_distance(pair[1])
+    @staticmethod
+    def _segments(timestamps, xs, ys, sp_type='Haversine') -> tuple:
+        '''
+        Return the spatial distance (km for Haversine) and the time difference (s) between every location and the next
+        '''
+        if sp_type == 'Haversine':
+            distances = geodesic.haversine_segments(ys, xs)
+        else:
+            distances = np.sqrt(np.diff(xs) ** 2 + np.diff(ys) ** 2)
 
-        pairs = pairwise(self.locations)
+        return distances, np.abs(np.diff(timestamps))
 
-        length = sum(map(distance, pairs))
+    def get_features(self, sp_type='Haversine') -> dict:
+        '''
+        Features of the trajectory, computed at once from its locations and cached until they change:
+            length: sum of the distances between consecutive locations (km for Haversine)
+            avg_speed: average speed between consecutive locations, per second (0 for segments without elapsed time)
+            max_speed: maximum speed between consecutive locations, per second (inf if some segment has no elapsed
+                time)
+            bbox: (min_x, min_y, max_x, max_y), None if the trajectory is empty
+            time_span: (min_timestamp, max_timestamp), None if the trajectory is empty
+        '''
+        features = self._features.get(sp_type)
+        if features is None:
+            features = self.__compute_features(sp_type)
+            self._features[sp_type] = features
+
+        return features
+
+    def __compute_features(self, sp_type: str) -> dict:
+        timestamps, xs, ys = self.get_arrays()
+        distances, times = self._segments(timestamps, xs, ys, sp_type)
+        # Segments without elapsed time count as speed 0 on average and as infinite speed for the maximum
+        speeds = np.divide(distances, times, out=np.zeros(len(distances)), where=times != 0)
+
+        features = {
+            'length': float(distances.sum()),
+            'avg_speed': float(speeds.sum()) / len(speeds) if len(speeds) > 0 else 0.0,
+            'max_speed': float(np.max(np.where(times == 0, np.inf, speeds))) if len(speeds) > 0 else 0.0,
+            'bbox': None,
+            'time_span': None
+        }
+        if len(timestamps) > 0:
+            features['bbox'] = (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+            features['time_span'] = (int(timestamps.min()), int(timestamps.max()))
+
+        return features
+
+    def invalidate_features(self):
+        '''
+        Forget the cached features and arrays. Called whenever the locations change
+        '''
+        self._features = {}
+        self._arrays = None
 
-        return length
+    def get_length(self, unit='km'):
+        return self.get_features()['length']
 
     def get_avg_speed(self, unit='kmh', sp_type='Haversine') -> float:
-
-        avg_speed = 0.0
-        for i, l1 in enumerate(self.locations):
-            try:
-                l2 = self.locations[i + 1]
-                avg_speed += (l1.spatial_distance(l2, sp_type) / l1.temporal_distance(l2))
-            except IndexError:
-                if len(self.locations) == 1:
-                    avg_speed += 0
-                else:
-                    avg_speed /= (len(self.locations) - 1)
-            except ZeroDivisionError:
-                avg_speed += 0
+        avg_speed = self.get_features(sp_type)['avg_speed']
 
         # Return km/h
         if unit == 'kmh':
@@ -96,31 +195,20 @@ class Trajectory:
         :param max_speed: kmh
         :return: bool
         '''
-        for i, l1 in enumerate(self.locations):
-            try:
-                l2 = self.locations[i + 1]
-                if l1.temporal_distance(l2) == 0:
-                    return True
-                speed = (l1.spatial_distance(l2) / l1.temporal_distance(l2)) * 3600
-                if speed > max_speed_kmh:
-                    return True
-            except IndexError:
-                return False
+        return self.get_features()['max_speed'] * 3600 > max_speed_kmh
 
     def some_location_outside(self, bbox: tuple) -> bool:
         '''
         bbox (min_lng, min_lat, max_lng, max_lat)
         '''
-
         min_lng, min_lat, max_lng, max_lat = bbox
+        features = self.get_features()
+        if features['bbox'] is None:
+            return False
 
-        for l in self.locations:
-            if not min_lng <= l.x <= max_lng:
-                return True
-            if not min_lat <= l.y <= max_lat:
-                return True
+        min_x, min_y, max_x, max_y = features['bbox']
 
-        return False
+        return not (min_lng <= min_x and max_x <= max_lng and min_lat <= min_y and max_y <= max_lat)
 
     def default_distance(self, trajectory, p_lambda) -> float:
         avg_speed_1 = self.get_avg_speed(sp_type="Haversine")
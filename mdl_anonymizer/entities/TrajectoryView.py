@@ -0,0 +1,95 @@
+import numpy as np
+
+from mdl_anonymizer.entities.TimestampedLocation import TimestampedLocation
+from mdl_anonymizer.entities.Trajectory import Trajectory, LocationList
+
+
+class TrajectoryView(Trajectory):
+    '''
+    Trajectory whose locations are slices of the contiguous arrays of a ColumnarDataset.
+
+    The TimestampedLocation objects are only built when the 'locations' attribute is accessed. From then on, the
+    trajectory is detached from the arrays and behaves as a regular Trajectory.
+    '''
+
+    def __init__(self, id, user_id, timestamps: np.ndarray, xs: np.ndarray, ys: np.ndarray):
+        super().__init__(id, user_id)
+        self._locations = None
+        self._timestamps = timestamps
+        self._xs = xs
+        self._ys = ys
+
+    @property
+    def locations(self):
+        if self._locations is None:
+            self._locations = LocationList(self, [TimestampedLocation(ts, x, y) for ts, x, y in
+                                                  zip(self._timestamps.tolist(), self._xs.tolist(),
+                                                      self._ys.tolist())])
+            self._timestamps = self._xs = self._ys = None
+
+        return self._locations
+
+    @locations.setter
+    def locations(self, locations: list):
+        self._locations = LocationList(self, locations)
+        self._timestamps = self._xs = self._ys = None
+        self.invalidate_features()
+
+    def is_attached(self) -> bool:
+        '''
+        Return True if the locations are still read from the arrays of the dataset
+        '''
+        return self._locations is None
+
+    def get_arrays(self) -> tuple:
+        if self.is_attached():
+            return self._timestamps, self._xs, self._ys
+
+        return super().get_arrays()
+
+    def get_first_timestamp(self):
+        if self.is_attached():
+            return int(self._timestamps[0])
+
+        return super().get_first_timestamp()
+
+    def get_last_timestamp(self):
+        if self.is_attached():
+            return int(self._timestamps[-1])
+
+        return super().get_last_timestamp()
+
+    def get_timestamps(self):
+        if self.is_attached():
+            return self._timestamps.tolist()
+
+        return super().get_timestamps()
+
+    def __len__(self):
+        if self.is_attached():
+            return len(self._timestamps)
+
+        return super().__len__()
+
+    def __str__(self):
+        if not self.is_attached():
+            return super().__str__()
+
+        string = f"T {self.id} ({len(self)} locations): "
+        for ts, x, y in zip(self._timestamps[:5].tolist(), self._xs[:5].tolist(), self._ys[:5].tolist()):
+            string += f'[{ts}: {x}, {y}] '
+
+        if len(self) > 5:
+            string += "..."
+
+        return string
+
+    def __hash__(self):
+        if not self.is_attached():
+            return super().__hash__()
+
+        string = ""
+        for ts, x, y in zip(self._timestamps.tolist(), self._xs.tolist(), self._ys.tolist()):
+            string += f'[{ts}: {x}, {y}] '
+
+        return hash(string)
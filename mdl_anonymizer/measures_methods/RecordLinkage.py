@@ -7,6 +7,8 @@ import math
 import random
 from datetime import datetime
 
+import numpy as np
+
 DEFAULT_VALUES = {
 
 }
@@ -45,11 +47,12 @@ class RecordLinkage(MeasuresMethodInterface):
         logging.info("Calculating fast record linkage (disclosure risk), window size = " + str(window_size))
         distance.compute_reference_trajectory()
 
+        reference_distances = distance.compute_many_without_map(distance.reference_trajectory,
+                                                                self.original_dataset.trajectories)
         control = {}
         ids = {}
-        for trajectory in self.original_dataset.trajectories:
-            trajectory.distance_to_reference_trajectory = \
-                distance.compute_distance_to_reference_trajectory(trajectory)
+        for trajectory, d in zip(self.original_dataset.trajectories, reference_distances.tolist()):
+            trajectory.distance_to_reference_trajectory = d
             count = control.get(trajectory)
             if count is not None:
                 count += 1
@@ -61,7 +64,6 @@ class RecordLinkage(MeasuresMethodInterface):
 
         self.original_dataset.trajectories.sort(key=lambda x: x.distance_to_reference_trajectory)
         distances = [trajectory.distance_to_reference_trajectory for trajectory in self.original_dataset.trajectories]
-        min_traj = None
         total_prob = 0
         for trajectory_anom in tqdm(self.anom_dataset.trajectories):
             trajectory_anom.distance_to_reference_trajectory = \
@@ -69,13 +71,9 @@ class RecordLinkage(MeasuresMethodInterface):
             closest_trajectories = RecordLinkage.__take_closest_window(distances,
                                                                        trajectory_anom.distance_to_reference_trajectory,
                                                                        window_size)
-            min_dist = float('inf')
-            for pos in closest_trajectories:
-                trajectory = self.original_dataset.trajectories[pos]
-                dist = distance.compute_without_map(trajectory, trajectory_anom)
-                if dist < min_dist:
-                    min_dist = dist
-                    min_traj = trajectory
+            window = [self.original_dataset.trajectories[pos] for pos in closest_trajectories]
+            dists = distance.compute_many_bounded(trajectory_anom, window)
+            min_traj = window[int(np.argmin(dists))]
             ids_group = ids[min_traj]
             if trajectory_anom.id in ids_group:
                 count = control[min_traj]
@@ -188,14 +186,9 @@ class RecordLinkage(MeasuresMethodInterface):
             ids[trajectory].append(trajectory.id)
 
         total_prob = 0
-        min_traj = None
         for traj_anom in tqdm(sample_anom):
-            min_dist = float('inf')
-            for traj_ori in sample_original:
-                dist = distance.compute_without_map(traj_ori, traj_anom)
-                if dist < min_dist:
-                    min_dist = dist
-                    min_traj = traj_ori
+            dists = distance.compute_many_bounded(traj_anom, sample_original)
+            min_traj = sample_original[int(np.argmin(dists))]
             ids_group = ids[min_traj]
             if traj_anom.id in ids_group:
                 count = control[min_traj]
@@ -238,14 +231,9 @@ class RecordLinkage(MeasuresMethodInterface):
             ids[trajectory].append(trajectory.id)
 
         total_prob = 0
-        min_traj = None
         for traj_anom in tqdm(self.anom_dataset.trajectories):
-            min_dist = float('inf')
-            for traj_ori in self.original_dataset.trajectories:
-                dist = distance.compute_without_map(traj_ori, traj_anom)
-                if dist < min_dist:
-                    min_dist = dist
-                    min_traj = traj_ori
+            dists = distance.compute_many_bounded(traj_anom, self.original_dataset.trajectories)
+            min_traj = self.original_dataset.trajectories[int(np.argmin(dists))]
             ids_group = ids[min_traj]
             if traj_anom.id in ids_group:
                 count = control[min_traj]
@@ -1,6 +1,5 @@
 from mdl_anonymizer.measures_methods.MeasuresMethodInterface import MeasuresMethodInterface
 from mdl_anonymizer.entities.Dataset import Dataset
-from collections import defaultdict
 from math import sqrt
 import logging
 
@@ -25,7 +24,7 @@ class Rsme(MeasuresMethodInterface):
 
     def get_rsme(self, distance):
         # TODO: Y como se mide la diferencia cuando una trayectoría ha sido eliminada?
-        distance.distance_matrix = defaultdict(dict)
+        distance.clear_memory()
         anom_trajectories = {}
         for t in self.anom_dataset.trajectories:
             anom_trajectories[t.id] = t
@@ -3,7 +3,7 @@ import logging
 import typer
 import json
 from mdl_anonymizer.entities.Dataset import Dataset
-from mdl_anonymizer import CONFIG_DB_FILE
+from mdl_anonymizer import CONFIG_DB_FILE, DEFAULT_ANONYMIZE_OUTPUT_FILE
 from mdl_anonymizer.factories.anonymization_method_factory import AnonymizationMethodFactory
 from mdl_anonymizer.factories.analysis_method_factory import AnalysisMethodFactory
 from mdl_anonymizer.factories.measures_method_factory import MeasuresMethodFactory
@@ -14,6 +14,15 @@ logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s', level=logg
 warnings.filterwarnings('ignore')
 
 ERROR_TASK_NOT_COMPLETED = "Your task could not be completed..."
+DATASET_EXTENSIONS = [".csv", ".parquet"]
+
+
+def get_dataset_extension(params, key='main_output_file'):
+    """
+    Extension of the output dataset, taken from the output file parameter (CSV by default)
+    """
+    extension = Path(params.get(key, DEFAULT_ANONYMIZE_OUTPUT_FILE)).suffix
+    return extension if extension in DATASET_EXTENSIONS else ".csv"
 
 def anonymize(file, filename, params, task_id):
     print("Anonymization method: ", params['method'])
@@ -51,9 +60,9 @@ def anonymize(file, filename, params, task_id):
     # Save output file
     with open(CONFIG_DB_FILE) as param_file:
         data = json.load(param_file)
-    output_file = data["db_folder"] + "/" + task_id + ".csv"
+    output_file = data["db_folder"] + "/" + task_id + get_dataset_extension(params)
     output = method.get_anonymized_dataset()
-    output.to_csv(f"{output_file}")
+    output.to_file(f"{output_file}")
 
     logging.info("Done!")
 
@@ -193,8 +202,8 @@ def filter_dataset(file, filename, params, task_id):
     # Save filtered file
     with open(CONFIG_DB_FILE) as param_file:
         data = json.load(param_file)
-    output_file = data["db_folder"] + "/" + task_id + ".csv"
-    dataset.to_csv(f"{output_file}")
+    output_file = data["db_folder"] + "/" + task_id + get_dataset_extension(params, 'output_filename')
+    dataset.to_file(f"{output_file}")
 
     logging.info("Done!")
 
@@ -206,9 +215,10 @@ def return_task(task_id):
     path = Path(filename)
     if path.is_file():
         return filename
-    filename = data['db_folder'] + task_id + ".csv"
-    path = Path(filename)
-    if path.is_file():
-        return filename
+    for extension in DATASET_EXTENSIONS:
+        filename = data['db_folder'] + task_id + extension
+        path = Path(filename)
+        if path.is_file():
+            return filename
 
     return None
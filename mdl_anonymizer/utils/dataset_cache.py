@@ -0,0 +1,91 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+CACHE_VERSION = 1
+HEADER_FILE = "header.json"
+COLUMNS = ["lon", "lat", "timestamps", "offsets", "trajectory_ids", "user_ids"]
+
+
+def file_hash(filename) -> str:
+    '''
+    SHA-256 of the content of a file (path or file object)
+    '''
+    sha = hashlib.sha256()
+    if type(filename) is str:
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+    else:
+        filename.seek(0)
+        for block in iter(lambda: filename.read(1 << 20), b''):
+            sha.update(block if type(block) is bytes else block.encode())
+        filename.seek(0)
+
+    return sha.hexdigest()
+
+
+def cache_key(filename, params: dict) -> str:
+    '''
+    Key of a loaded dataset: hash of the source file and of the load parameters
+    '''
+    source = file_hash(filename)
+    params = json.dumps(params, sort_keys=True, default=str)
+
+    return hashlib.sha256(f"{CACHE_VERSION}:{source}:{params}".encode()).hexdigest()
+
+
+def load_columns(cache_folder: str, key: str):
+    '''
+    Return the columns (see Dataset.from_columns) stored in the cache as read-only memory-mapped arrays,
+    or None if they are not in the cache
+    '''
+    folder = os.path.join(cache_folder, key)
+    if not os.path.isfile(os.path.join(folder, HEADER_FILE)):
+        return None
+
+    with open(os.path.join(folder, HEADER_FILE)) as f:
+        header = json.load(f)
+    if header.get('version') != CACHE_VERSION:
+        return None
+
+    return tuple(np.load(os.path.join(folder, f"{c}.npy"), mmap_mode='r') for c in COLUMNS)
+
+
+def save_columns(cache_folder: str, key: str, columns: tuple, header: dict = None):
+    '''
+    Store the columns (see Dataset.from_columns) in the cache: one .npy file per column and a JSON header.
+    Columns of Python objects (e.g. mixed types ids) can not be memory-mapped, so they are not cached.
+    '''
+    arrays = [np.asarray(c) for c in columns]
+    if any(a.dtype.hasobject for a in arrays):
+        arrays[4:] = [np.asarray(a.tolist()) for a in arrays[4:]]
+        if any(a.dtype.hasobject for a in arrays):
+            logging.info("Dataset not cached: ids can not be stored as binary arrays")
+            return
+
+    os.makedirs(cache_folder, exist_ok=True)
+    folder = os.path.join(cache_folder, key)
+
+    # Write to a temporary folder and rename it, so a partial cache entry is never read
+    tmp_folder = tempfile.mkdtemp(dir=cache_folder)
+    try:
+        for c, a in zip(COLUMNS, arrays):
+            np.save(os.path.join(tmp_folder, f"{c}.npy"), a, allow_pickle=False)
+
+        header = dict(header or {})
+        header.update({'version': CACHE_VERSION, 'n_trajectories': len(arrays[3]) - 1,
+                       'n_locations': int(arrays[3][-1]),
+                       'dtypes': {c: a.dtype.str for c, a in zip(COLUMNS, arrays)}})
+        with open(os.path.join(tmp_folder, HEADER_FILE), 'w') as f:
+            json.dump(header, f, indent=4, default=str)
+
+        os.replace(tmp_folder, folder)
+    except OSError:
+        # Another process stored the same entry meanwhile
+        shutil.rmtree(tmp_folder, ignore_errors=True)
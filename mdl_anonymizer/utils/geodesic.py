@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+
+# Mean earth radius, as in the haversine package
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    '''
+    Haversine distance (km) between two points given in decimal degrees. Scalar version (no NumPy overhead)
+    '''
+    lat1 = math.radians(lat1)
+    lon1 = math.radians(lon1)
+    lat2 = math.radians(lat2)
+    lon2 = math.radians(lon2)
+    d = math.sin((lat2 - lat1) * 0.5) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) * 0.5) ** 2
+
+    return EARTH_RADIUS_KM * (2 * math.asin(math.sqrt(d)))
+
+
+def _kernel(lat1, lon1, lat2, lon2, dtype):
+    lat1 = np.radians(np.asarray(lat1, dtype=dtype))
+    lon1 = np.radians(np.asarray(lon1, dtype=dtype))
+    lat2 = np.radians(np.asarray(lat2, dtype=dtype))
+    lon2 = np.radians(np.asarray(lon2, dtype=dtype))
+    d = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+
+    return dtype(EARTH_RADIUS_KM) * (2 * np.arcsin(np.sqrt(d)))
+
+
+def haversine_pairwise(lat1, lon1, lat2, lon2, dtype=np.float64) -> np.ndarray:
+    '''
+    Haversine distances (km) between the i-th point of the first array and the i-th point of the second one
+    '''
+    return _kernel(lat1, lon1, lat2, lon2, dtype)
+
+
+def haversine_one_to_many(lat: float, lon: float, lats, lons, dtype=np.float64) -> np.ndarray:
+    '''
+    Haversine distances (km) from one point to every point of the arrays
+    '''
+    return _kernel(lat, lon, lats, lons, dtype)
+
+
+def haversine_segments(lats, lons, dtype=np.float64) -> np.ndarray:
+    '''
+    Haversine distances (km) between every point and the next one (n-1 values for n points)
+    '''
+    lats = np.radians(np.asarray(lats, dtype=dtype))
+    lons = np.radians(np.asarray(lons, dtype=dtype))
+    # Every cosine is shared by two consecutive segments
+    cos_lats = np.cos(lats)
+
+    d = np.square(np.sin(np.diff(lats) * 0.5))
+    d += cos_lats[:-1] * cos_lats[1:] * np.square(np.sin(np.diff(lons) * 0.5))
+    np.sqrt(d, out=d)
+    np.arcsin(d, out=d)
+
+    return dtype(EARTH_RADIUS_KM) * (2 * d)
+
+
+def haversine_matrix(lats1, lons1, lats2, lons2, dtype=np.float64) -> np.ndarray:
+    '''
+    Haversine distances (km) between every point of the first arrays (rows) and every point of the second ones
+    (columns)
+    '''
+    lats1 = np.asarray(lats1, dtype=dtype)[:, np.newaxis]
+    lons1 = np.asarray(lons1, dtype=dtype)[:, np.newaxis]
+
+    return _kernel(lats1, lons1, lats2, lons2, dtype)
+
+
+# Planar counterparts, for projected coordinates (see utils.projection). Distances are in the units of the CRS
+
+
+def euclidean_pairwise(xs1, ys1, xs2, ys2, dtype=np.float64) -> np.ndarray:
+    '''
+    Euclidean distances between the i-th point of the first arrays and the i-th point of the second ones
+    '''
+    return np.hypot(np.asarray(xs2, dtype=dtype) - np.asarray(xs1, dtype=dtype),
+                    np.asarray(ys2, dtype=dtype) - np.asarray(ys1, dtype=dtype))
+
+
+def euclidean_matrix(xs1, ys1, xs2, ys2, dtype=np.float64) -> np.ndarray:
+    '''
+    Euclidean distances between every point of the first arrays (rows) and every point of the second ones (columns)
+    '''
+    xs1 = np.asarray(xs1, dtype=dtype)[:, np.newaxis]
+    ys1 = np.asarray(ys1, dtype=dtype)[:, np.newaxis]
+
+    return euclidean_pairwise(xs1, ys1, xs2, ys2, dtype)
+
+
+# Bounds of the distances between the points of two bounding boxes (min_x, min_y, max_x, max_y)
+
+
+def haversine_bbox_bounds(bbox: tuple, bboxes) -> tuple:
+    '''
+    Lower and upper bounds of the haversine distance (km) between any point of a bounding box and any point of every
+    one of the bounding boxes (one per row). Boxes are in decimal degrees (x is longitude)
+    '''
+    min_lon, min_lat, max_lon, max_lat = bbox
+    bboxes = np.asarray(bboxes, dtype=np.float64)
+
+    # Latitude and longitude differences, the latter accounting for the antimeridian
+    lat_gap = np.maximum(0, np.maximum(bboxes[:, 1] - max_lat, min_lat - bboxes[:, 3]))
+    lat_max = np.maximum(bboxes[:, 3] - min_lat, max_lat - bboxes[:, 1])
+    lon_gap = np.maximum(0, np.maximum(bboxes[:, 0] - max_lon, min_lon - bboxes[:, 2]))
+    lon_gap = np.minimum(lon_gap, np.maximum(0, 360 - (np.maximum(bboxes[:, 2], max_lon) -
+                                                       np.minimum(bboxes[:, 0], min_lon))))
+    lon_max = np.minimum(np.maximum(bboxes[:, 2] - min_lon, max_lon - bboxes[:, 0]), 180)
+
+    # Extreme cosines of the latitudes of every box
+    cos_min = np.cos(np.radians(np.maximum(np.abs(bboxes[:, 1]), np.abs(bboxes[:, 3]))))
+    cos_max = np.where(bboxes[:, 1] * bboxes[:, 3] <= 0, 1.0,
+                       np.cos(np.radians(np.minimum(np.abs(bboxes[:, 1]), np.abs(bboxes[:, 3])))))
+    ref_cos_min = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    ref_cos_max = 1.0 if min_lat * max_lat <= 0 else math.cos(math.radians(min(abs(min_lat), abs(max_lat))))
+
+    def hav(degrees):
+        return np.sin(np.radians(degrees) * 0.5) ** 2
+
+    lower = hav(lat_gap) + ref_cos_min * cos_min * hav(lon_gap)
+    upper = hav(lat_max) + ref_cos_max * cos_max * hav(lon_max)
+
+    return (EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.minimum(lower, 1))),
+            EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.minimum(upper, 1))))
+
+
+def euclidean_bbox_bounds(bbox: tuple, bboxes) -> tuple:
+    '''
+    Lower and upper bounds of the Euclidean distance between any point of a bounding box and any point of every one of
+    the bounding boxes (one per row)
+    '''
+    min_x, min_y, max_x, max_y = bbox
+    bboxes = np.asarray(bboxes, dtype=np.float64)
+
+    x_gap = np.maximum(0, np.maximum(bboxes[:, 0] - max_x, min_x - bboxes[:, 2]))
+    y_gap = np.maximum(0, np.maximum(bboxes[:, 1] - max_y, min_y - bboxes[:, 3]))
+    x_max = np.maximum(bboxes[:, 2] - min_x, max_x - bboxes[:, 0])
+    y_max = np.maximum(bboxes[:, 3] - min_y, max_y - bboxes[:, 1])
+
+    return np.hypot(x_gap, y_gap), np.hypot(x_max, y_max)
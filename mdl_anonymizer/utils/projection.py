@@ -0,0 +1,50 @@
+import numpy as np
+import pyproj
+from skmob.utils.constants import DEFAULT_CRS
+
+
+def is_projected(crs) -> bool:
+    '''
+    Return True if the CRS is projected, i.e. its coordinates are meters (or any other length unit)
+    '''
+    if crs is None:
+        return False
+
+    return pyproj.CRS.from_user_input(crs).is_projected
+
+
+def utm_crs(bbox: tuple) -> str:
+    '''
+    Return the UTM zone CRS (e.g. 'EPSG:32631') of the center of a bounding box (min_lng, min_lat, max_lng, max_lat)
+    '''
+    min_lng, min_lat, max_lng, max_lat = bbox
+    lng = (min_lng + max_lng) / 2
+    lat = (min_lat + max_lat) / 2
+
+    zone = min(int((lng + 180) // 6) + 1, 60)
+
+    return f"EPSG:{32600 + zone if lat >= 0 else 32700 + zone}"
+
+
+def transform(xs: np.ndarray, ys: np.ndarray, crs_from, crs_to) -> tuple:
+    '''
+    Transform the coordinates (x is longitude in geographic CRSs) from one CRS to another
+    '''
+    transformer = pyproj.Transformer.from_crs(crs_from, crs_to, always_xy=True)
+    xs, ys = transformer.transform(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+
+    return np.asarray(xs), np.asarray(ys)
+
+
+def project(lon: np.ndarray, lat: np.ndarray, crs) -> tuple:
+    '''
+    Project geographic coordinates (DEFAULT_CRS) to a projected CRS
+    '''
+    return transform(lon, lat, DEFAULT_CRS, crs)
+
+
+def unproject(xs: np.ndarray, ys: np.ndarray, crs) -> tuple:
+    '''
+    Return the geographic coordinates (DEFAULT_CRS) of projected coordinates
+    '''
+    return transform(xs, ys, crs, DEFAULT_CRS)
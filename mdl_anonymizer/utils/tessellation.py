@@ -1,6 +1,9 @@
+import math
 import warnings
 
+import numpy as np
 import pandas as pd
+import shapely
 from shapely import geometry
 import geopandas as gpd
 import skmob
@@ -10,6 +13,8 @@ from skmob.tessellation import tilers
 from skmob.utils import constants
 from skmob.utils.constants import DEFAULT_CRS
 
+from mdl_anonymizer.utils import projection
+
 
 def _get_bounding_box(tdf):
     # Build bounding box for tesselation
@@ -29,21 +34,24 @@ def _get_bounding_box(tdf):
     return polygon
 
 
-def _tdf_to_geodataframe(tdf: TrajDataFrame):
+def _tdf_to_geodataframe(tdf: TrajDataFrame, crs=None):
     return gpd.GeoDataFrame(tdf.copy(), geometry=gpd.points_from_xy(tdf[constants.LONGITUDE],
-                                                                    tdf[constants.LATITUDE]), crs=tdf._crs)
+                                                                    tdf[constants.LATITUDE]),
+                            crs=tdf._crs if crs is None else crs)
 
 
-def _mapping(tdf: TrajDataFrame, tiles: gpd.GeoDataFrame, remove_na=True):
+def _mapping(tdf: TrajDataFrame, tiles: gpd.GeoDataFrame, remove_na=True, crs=None):
     # Check CSR
-    if tiles.crs != tdf.crs:
-        warnings.warn(f"CRS are different! Mapping may not be correct. \nData: {tdf.crs}\nTiles: {tiles.crs}")
+    if crs is None:
+        crs = tdf.crs
+    if tiles.crs != crs:
+        warnings.warn(f"CRS are different! Mapping may not be correct. \nData: {crs}\nTiles: {tiles.crs}")
 
     # Check all geometries are Polygon or MultiPolygon
     if any(not (isinstance(x, Polygon) or isinstance(x, MultiPolygon)) for x in tiles.geometry):
         warnings.warn(f"All geometries in 'tiles' should be Polygon or MultiPolygon")
 
-    gdf = _tdf_to_geodataframe(tdf)
+    gdf = _tdf_to_geodataframe(tdf, crs)
 
     if remove_na:
         how = 'inner'
@@ -86,8 +94,44 @@ def compute_centroids(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     return tiles
 
 
+def _projected_squared_tessellation(tdf: TrajDataFrame, crs, meters: int, bounding_box=None) -> tuple:
+    """
+    Squared tessellation of a tdf in a projected CRS (coordinates in meters). Tiles are computed directly in that
+    CRS and locations are mapped to them arithmetically. Tile ids follow the order of the scikit-mobility tiler.
+    """
+    xs = tdf[constants.LONGITUDE].to_numpy(dtype=np.float64)
+    ys = tdf[constants.LATITUDE].to_numpy(dtype=np.float64)
+
+    if bounding_box is None:
+        min_x, min_y, max_x, max_y = xs.min(), ys.min(), xs.max(), ys.max()
+    else:
+        min_x, min_y, max_x, max_y = bounding_box.to_crs(crs).total_bounds
+
+    n_x = max(int(math.ceil((max_x - min_x) / meters)), 1)
+    n_y = max(int(math.ceil((max_y - min_y) / meters)), 1)
+
+    # Tiles
+    i, j = np.meshgrid(np.arange(n_x), np.arange(n_y), indexing='ij')
+    i = i.ravel()
+    j = j.ravel()
+    tiles = gpd.GeoDataFrame({constants.TILE_ID: (i * n_y + j).astype(str)},
+                             geometry=shapely.box(min_x + i * meters, min_y + j * meters,
+                                                  min_x + (i + 1) * meters, min_y + (j + 1) * meters),
+                             crs=crs)
+
+    # Map locations to tiles
+    inside = (xs >= min_x) & (xs <= max_x) & (ys >= min_y) & (ys <= max_y)
+    i = np.minimum(((xs[inside] - min_x) // meters).astype(np.int64), n_x - 1)
+    j = np.minimum(((ys[inside] - min_y) // meters).astype(np.int64), n_y - 1)
+
+    mtdf = tdf[inside].copy()
+    mtdf[constants.TILE_ID] = (i * n_y + j).astype(str)
+
+    return mtdf, tiles
+
+
 def spatial_tessellation(tdf: TrajDataFrame, tiles: gpd.GeoDataFrame = None,
-                         bounding_box=None, tiles_shape: str = "squared", meters: int = 250) \
+                         bounding_box=None, tiles_shape: str = "squared", meters: int = 250, crs=None) \
         -> tuple:
     """
 
@@ -96,9 +140,20 @@ def spatial_tessellation(tdf: TrajDataFrame, tiles: gpd.GeoDataFrame = None,
     :param meters: size of the tiles
     :param tiles: If a tiles GeoDataFrame is provided is used, if not tiles are generated
     :param bounding_box: If a bounding_box is not provided, it is computed for generating tiles
+    :param crs: CRS of the locations (the one of the tdf by default). If it is projected, squared tiles are
+        computed in it
 
     :return: tuple of tdf mapped to tiles and tiles used
     """
+    if crs is None:
+        crs = tdf.crs if isinstance(tdf, TrajDataFrame) else DEFAULT_CRS
+
+    if tiles is None and tiles_shape == "squared" and projection.is_projected(crs):
+        return _projected_squared_tessellation(tdf, crs, meters, bounding_box)
+
+    # Tiles (e.g. from a file) in longitude and latitude for projected locations
+    if tiles is not None and tiles.crs is not None and projection.is_projected(crs) and tiles.crs != crs:
+        tiles = tiles.to_crs(crs)
 
     # Build tiles
     if tiles is None:
@@ -112,6 +167,6 @@ def spatial_tessellation(tdf: TrajDataFrame, tiles: gpd.GeoDataFrame = None,
     # We can not use tdf.mapping from scikit-mobility because it does not accept Multipolygons
 
     # mtdf = tdf.mapping(tiles, remove_na=True)
-    mtdf = _mapping(tdf, tiles, remove_na=True)
+    mtdf = _mapping(tdf, tiles, remove_na=True, crs=crs)
 
     return mtdf, tiles
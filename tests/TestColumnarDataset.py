@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+
+from entities.ColumnarDataset import ColumnarDataset
+from entities.Dataset import Dataset
+from entities.TimestampedLocation import TimestampedLocation
+from entities.Trajectory import Trajectory
+from tests import TEST_ROOT_DIR
+from tests.TestBase import TestBase
+
+
+class TestColumnarDataset(TestBase):
+    def setUp(self):
+        super().setUp()
+
+        path = f"{TEST_ROOT_DIR}/../examples/data/mock_dataset.csv"
+        self.dataset = ColumnarDataset()
+        self.dataset.from_file(path)
+
+        self.object_dataset = Dataset()
+        self.object_dataset.from_file(path)
+
+    def test_load_dataset(self):
+        self.assertTrue(self.dataset.is_packed())
+        self.assertEqual(len(self.dataset), 46)
+        self.assertEqual(self.dataset.get_number_of_locations(), 383)
+        self.assertEqual(self.dataset.get_min_timestamp(), 1669043011)
+        self.assertEqual(self.dataset.get_max_timestamp(), 1669058195)
+        self.assertEqual(self.dataset.get_n_locations_longest_trajectory(), 28)
+        self.assertTrue(np.array_equal(self.dataset.to_numpy(), self.object_dataset.to_numpy()))
+
+        # Trajectories are views, not copies
+        t = self.dataset.trajectories[0]
+        self.assertTrue(np.shares_memory(t.get_arrays()[0], self.dataset.timestamps))
+
+    def test_filter(self):
+        for dataset in [self.dataset, self.object_dataset]:
+            dataset.filter_by_speed(10)
+            dataset.filter_by_n_locations(10)
+            dataset.filter_by_length(min_length=3, max_length=10)
+            dataset.filter_by_bounding_box((1.23, 41.11, 1.26, 41.14))
+
+        self.assertEqual(len(self.dataset), 2)
+        self.assertEqual([t.id for t in self.dataset.trajectories],
+                         [t.id for t in self.object_dataset.trajectories])
+        self.assertEqual(self.dataset.get_number_of_locations(), self.object_dataset.get_number_of_locations())
+
+    def test_detach(self):
+        t = self.dataset.trajectories[0]
+        n_locations = len(t)
+        t.add_location(TimestampedLocation(1669060000, 1.25, 41.12))
+
+        self.assertFalse(t.is_attached())
+        self.assertFalse(self.dataset.is_packed())
+        self.assertEqual(len(t), n_locations + 1)
+        self.assertEqual(self.dataset.get_max_timestamp(), 1669060000)
+
+        new_trajectory = Trajectory(1000, 1000)
+        new_trajectory.add_location(TimestampedLocation(1669040000, 1.25, 41.12))
+        self.dataset.add_trajectory(new_trajectory)
+        self.assertEqual(self.dataset.get_min_timestamp(), 1669040000)
+
+        self.dataset.pack()
+        self.assertTrue(self.dataset.is_packed())
+        self.assertEqual(len(self.dataset), 47)
+        self.assertEqual(self.dataset.get_number_of_locations(), 385)
+
+    def test_numpy(self):
+        dataset = ColumnarDataset()
+        dataset.from_numpy(self.object_dataset.to_numpy(sort_by_timestamp=True))
+
+        self.assertTrue(np.array_equal(dataset.to_numpy(), self.object_dataset.to_numpy()))
+
+    def test_arrow(self):
+        table = self.dataset.to_arrow()
+        self.assertTrue(np.shares_memory(table["lon"].chunk(0).to_numpy(), self.dataset.lon))
+
+        dataset = ColumnarDataset()
+        dataset.from_arrow(table)
+        self.assertTrue(np.shares_memory(dataset.lon, self.dataset.lon))
+        self.assertTrue(np.shares_memory(dataset.timestamps, self.dataset.timestamps))
+        self.assertTrue(np.array_equal(dataset.to_numpy(), self.object_dataset.to_numpy()))
+
+        object_dataset = Dataset()
+        object_dataset.from_arrow(table, min_locations=10)
+        self.assertEqual(len(object_dataset), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
+import os
+import tempfile
 import unittest
 
 import geopandas.testing
+import pandas
+import pyarrow.parquet as pq
 import shapely
 from geopandas import GeoDataFrame
+from skmob import TrajDataFrame
 from skmob.utils.constants import DEFAULT_CRS
 
 from entities.Dataset import Dataset
@@ -34,6 +39,214 @@ class TestDataset(TestBase):
         geodf = GeoDataFrame(index=[0], crs=DEFAULT_CRS, geometry=[poly])
         geopandas.testing.assert_geodataframe_equal(dataset.get_bounding_box(), geodf)
 
+    def test_load_parameters(self):
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv", min_locations=10)
+
+        self.assertEqual(len(dataset), 10)
+        self.assertTrue(all(len(t) >= 10 for t in dataset.trajectories))
+
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv", n_trajectories=5)
+
+        self.assertEqual([t.id for t in dataset.trajectories], [1, 2, 3, 4, 5])
+        for t in dataset.trajectories:
+            self.assertEqual(t.get_timestamps(), sorted(t.get_timestamps()))
+
+    def test_load_by_chunks(self):
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv")
+
+        chunked_dataset = Dataset()
+        chunked_dataset.from_file("../examples/data/mock_dataset.csv", chunk_size=50)
+
+        self.assertEqual(len(chunked_dataset), 46)
+        self.assertEqual(chunked_dataset.get_number_of_locations(), 383)
+        self.assertEqual(sorted(map(str, chunked_dataset.trajectories)), sorted(map(str, dataset.trajectories)))
+
+        trajectories = list(Dataset().iter_file("../examples/data/mock_dataset.csv", chunk_size=50,
+                                                n_trajectories=3, min_locations=10))
+        self.assertEqual(len(trajectories), 3)
+        self.assertTrue(all(len(t) >= 10 for t in trajectories))
+
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, "not_grouped.csv")
+            df = pandas.read_csv("../examples/data/mock_dataset.csv")
+            df.sample(frac=1, random_state=0).to_csv(filename, index=False)
+
+            with self.assertRaises(ValueError):
+                Dataset().from_file(filename, chunk_size=50)
+
+            # Rows of a trajectory split across chunks are only detected when validating
+            filename = os.path.join(folder, "split.csv")
+            df = pandas.read_csv("../examples/data/mock_dataset.csv")
+            first = df["trajectory_id"] == df["trajectory_id"].iloc[0]
+            half = df[first].iloc[len(df[first]) // 2:]
+            pandas.concat([df.drop(half.index), half]).to_csv(filename, index=False)
+
+            self.assertEqual(len(list(Dataset().iter_file(filename, chunk_size=50))), 47)
+            with self.assertRaises(ValueError):
+                list(Dataset().iter_file(filename, chunk_size=50, validate=True))
+            with self.assertRaises(ValueError):
+                Dataset().from_file(filename, chunk_size=50)
+
+    def test_load_with_filters(self):
+        bbox = (1.23, 41.11, 1.26, 41.14)
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv")
+        dataset.filter_by_bounding_box(bbox)
+
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, "mock_dataset.parquet")
+            pandas.read_csv("../examples/data/mock_dataset.csv").to_parquet(filename, row_group_size=50)
+
+            for chunk_size in [None, 50]:
+                filtered_dataset = Dataset()
+                filtered_dataset.from_file(filename, bbox=bbox, chunk_size=chunk_size)
+                self.assertEqual(len(filtered_dataset), 34)
+                self.assertEqual(sorted(map(str, filtered_dataset.trajectories)),
+                                 sorted(map(str, dataset.trajectories)))
+
+                filtered_dataset = Dataset()
+                filtered_dataset.from_file(filename, time_range=(1669045000, 1669050000), chunk_size=chunk_size)
+                self.assertEqual(filtered_dataset.get_min_timestamp(), 1669045038)
+                self.assertEqual(filtered_dataset.get_max_timestamp(), 1669049945)
+
+                filtered_dataset = Dataset()
+                filtered_dataset.from_file(filename, trajectory_ids=[3, 5, 7], user_ids=[3, 5], chunk_size=chunk_size)
+                self.assertEqual([t.id for t in filtered_dataset.trajectories], [3, 5])
+
+        # Same semantics when filters can not be pushed down
+        filtered_dataset = Dataset()
+        filtered_dataset.from_file("../examples/data/mock_dataset.csv", bbox=bbox)
+        self.assertEqual(sorted(map(str, filtered_dataset.trajectories)), sorted(map(str, dataset.trajectories)))
+
+    def test_export(self):
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv")
+
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ["output.csv", "output.parquet"]:
+                filename = os.path.join(folder, name)
+                dataset.to_file(filename)
+
+                exported_dataset = Dataset()
+                exported_dataset.from_file(filename)
+                self.assertEqual(list(map(str, exported_dataset.trajectories)), list(map(str, dataset.trajectories)))
+
+            filename = os.path.join(folder, "output.parquet")
+            dataset.to_parquet(filename, row_group_size=100, compression="zstd")
+            self.assertEqual(pq.ParquetFile(filename).metadata.num_row_groups, 4)
+
+    def test_cache(self):
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv")
+
+        with tempfile.TemporaryDirectory() as folder:
+            for _ in range(2):
+                cached_dataset = Dataset()
+                cached_dataset.from_file("../examples/data/mock_dataset.csv", cache_folder=folder)
+                self.assertEqual(list(map(str, cached_dataset.trajectories)), list(map(str, dataset.trajectories)))
+                self.assertEqual(len(os.listdir(folder)), 1)
+
+            # Other load parameters, other entry
+            cached_dataset = Dataset()
+            cached_dataset.from_file("../examples/data/mock_dataset.csv", min_locations=10, cache_folder=folder)
+            self.assertEqual(len(cached_dataset), 10)
+            self.assertEqual(len(os.listdir(folder)), 2)
+
+    def test_tdf(self):
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv")
+
+        tdf = dataset.to_tdf()
+        self.assertEqual(len(tdf), 383)
+
+        tdf_dataset = Dataset()
+        tdf_dataset.from_tdf(tdf.sample(frac=1, random_state=0).sort_values("tid", kind="stable"))
+        self.assertEqual(len(tdf_dataset), 46)
+        for t1, t2 in zip(tdf_dataset.trajectories, dataset.trajectories):
+            self.assertEqual(t1.id, t2.id)
+            self.assertEqual(t1.get_timestamps(), t2.get_timestamps())
+
+    def test_tdf_subsecond(self):
+        datetimes = pandas.to_datetime(["2022-11-21 15:23:30.999999744", "2022-11-21 15:23:31.4",
+                                        "2022-11-21 15:23:32.9999994", "2022-11-21 15:23:33.9999996",
+                                        "1969-12-31 23:59:58.5"])
+        tdf = TrajDataFrame(pandas.DataFrame({
+            'lng': [1.0, 1.1, 1.2, 1.3, 1.4],
+            'lat': [41.0, 41.1, 41.2, 41.3, 41.4],
+            'datetime': datetimes,
+            'uid': 1,
+            'tid': 1
+        }))
+
+        # Timestamps of the datetimes rounded to the microsecond, as pandas.Timestamp.timestamp()
+        dataset = Dataset()
+        dataset.from_tdf(tdf)
+        expected = sorted(int(d.timestamp()) for d in datetimes)
+        self.assertEqual(expected, [-1, 1669044211, 1669044211, 1669044212, 1669044214])
+        self.assertEqual(dataset.trajectories[0].get_timestamps(), expected)
+
+        # Round trip
+        tdf_dataset = Dataset()
+        tdf_dataset.from_tdf(dataset.to_tdf())
+        self.assertEqual(tdf_dataset.trajectories[0].get_timestamps(), expected)
+
+    def test_projection(self):
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv")
+        self.assertFalse(dataset.is_projected())
+
+        projected_dataset = Dataset()
+        projected_dataset.from_file("../examples/data/mock_dataset.csv")
+        projected_dataset.project()
+        self.assertTrue(projected_dataset.is_projected())
+        self.assertEqual(projected_dataset.crs, "EPSG:32631")
+
+        # Same speeds, now computed in meters
+        for t1, t2 in zip(projected_dataset.trajectories, dataset.trajectories):
+            self.assertAlmostEqual(t1.get_avg_speed(sp_type='Euclidean') / 1000, t2.get_avg_speed(), delta=0.1)
+
+        # Exported with geographic coordinates
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, "output.csv")
+            projected_dataset.to_file(filename)
+
+            exported_dataset = Dataset()
+            exported_dataset.from_file(filename)
+            for t1, t2 in zip(exported_dataset.trajectories, dataset.trajectories):
+                self.assertEqual(t1.get_timestamps(), t2.get_timestamps())
+                self.assertAlmostEqual(t1.locations[-1].x, t2.locations[-1].x, places=9)
+                self.assertAlmostEqual(t1.locations[-1].y, t2.locations[-1].y, places=9)
+
+        projected_dataset.unproject()
+        self.assertFalse(projected_dataset.is_projected())
+        for t1, t2 in zip(projected_dataset.trajectories, dataset.trajectories):
+            self.assertAlmostEqual(t1.locations[0].x, t2.locations[0].x, places=9)
+            self.assertAlmostEqual(t1.locations[0].y, t2.locations[0].y, places=9)
+
+    def test_trajectory_features(self):
+        dataset = Dataset()
+        dataset.from_file("../examples/data/mock_dataset.csv")
+
+        t = dataset.get_trajectory(1)
+        timestamps, xs, ys = t.get_arrays()
+        features = t.get_features()
+        self.assertIs(t.get_features(), features)
+        self.assertEqual(features['bbox'], (xs.min(), ys.min(), xs.max(), ys.max()))
+        self.assertEqual(features['time_span'], (timestamps.min(), timestamps.max()))
+        self.assertEqual(t.get_length(), features['length'])
+
+        # Any change of the locations invalidates the features
+        location = t.locations.pop()
+        self.assertIsNot(t.get_features(), features)
+        self.assertLess(t.get_length(), features['length'])
+        self.assertEqual(len(t.get_arrays()[0]), len(timestamps) - 1)
+
+        t.add_location(location)
+        self.assertEqual(t.get_features(), features)
+
     def test_filter(self):
         dataset = Dataset()
         dataset.from_file("../examples/data/mock_dataset.csv")
@@ -62,6 +275,25 @@ class TestDataset(TestBase):
         self.assertEqual(dataset.get_max_timestamp(), 1669053074)
         self.assertEqual(dataset.get_n_locations_longest_trajectory(), 20)
 
+    def test_filter_projected(self):
+        for projected in [False, True]:
+            dataset = Dataset()
+            dataset.from_file("../examples/data/mock_dataset.csv")
+            if projected:
+                dataset.project()
+
+            # Thresholds are in km/h, km and degrees whatever the CRS
+            dataset.filter_by_speed(10)
+            self.assertEqual(len(dataset), 41)
+            self.assertEqual(dataset.get_number_of_locations(), 331)
+
+            dataset.filter_by_length(min_length=3, max_length=10)
+            self.assertEqual(len(dataset), 3)
+
+            dataset.filter_by_bounding_box((1.23, 41.10, 1.26, 41.13))
+            self.assertEqual(len(dataset), 1)
+            self.assertEqual(dataset.is_projected(), projected)
+
 
 if __name__ == '__main__':
     unittest.main()
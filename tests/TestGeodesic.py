@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+from haversine import haversine, haversine_vector
+
+from mdl_anonymizer.utils import geodesic
+from tests.TestBase import TestBase
+
+
+class TestGeodesic(TestBase):
+    def setUp(self):
+        super().setUp()
+
+        rng = np.random.default_rng(0)
+        self.lats = rng.uniform(41.0, 41.5, 50)
+        self.lons = rng.uniform(1.9, 2.3, 50)
+
+    def test_haversine(self):
+        self.assertEqual(geodesic.haversine(41.3825, 2.1769, 37.3828, -5.9731),
+                         haversine((41.3825, 2.1769), (37.3828, -5.9731)))
+
+        expected = [haversine((lat1, lon1), (lat2, lon2)) for lat1, lon1, lat2, lon2 in
+                    zip(self.lats[:-1], self.lons[:-1], self.lats[1:], self.lons[1:])]
+        self.assertTrue(np.allclose(geodesic.haversine_segments(self.lats, self.lons), expected, rtol=0, atol=1e-9))
+        self.assertTrue(np.allclose(geodesic.haversine_pairwise(self.lats[:-1], self.lons[:-1],
+                                                                self.lats[1:], self.lons[1:]),
+                                    expected, rtol=0, atol=1e-9))
+        self.assertTrue(np.allclose(geodesic.haversine_segments(self.lats, self.lons, dtype=np.float32), expected,
+                                    rtol=1e-4))
+
+    def test_matrix(self):
+        points = np.column_stack((self.lats, self.lons))
+        expected = haversine_vector(points, points, comb=True)
+
+        matrix = geodesic.haversine_matrix(self.lats, self.lons, self.lats, self.lons)
+        self.assertEqual(matrix.shape, (50, 50))
+        self.assertTrue(np.allclose(matrix, expected.T, rtol=0, atol=1e-9))
+        self.assertTrue(np.allclose(geodesic.haversine_one_to_many(self.lats[0], self.lons[0], self.lats, self.lons),
+                                    matrix[0], rtol=0, atol=1e-12))
+
+    def test_bbox_bounds(self):
+        boxes = []
+        for i in range(10):
+            lats, lons = self.lats[i * 5:(i + 1) * 5], self.lons[i * 5:(i + 1) * 5]
+            boxes.append((lons.min(), lats.min(), lons.max(), lats.max()))
+
+        for i, box in enumerate(boxes):
+            lats, lons = self.lats[i * 5:(i + 1) * 5], self.lons[i * 5:(i + 1) * 5]
+            lower, upper = geodesic.haversine_bbox_bounds(box, boxes)
+            euclidean_lower, euclidean_upper = geodesic.euclidean_bbox_bounds(box, boxes)
+            for j in range(10):
+                other_lats, other_lons = self.lats[j * 5:(j + 1) * 5], self.lons[j * 5:(j + 1) * 5]
+                matrix = geodesic.haversine_matrix(lats, lons, other_lats, other_lons)
+                self.assertTrue(lower[j] <= matrix.min() + 1e-9 and matrix.max() <= upper[j] + 1e-9)
+                matrix = geodesic.euclidean_matrix(lons, lats, other_lons, other_lats)
+                self.assertTrue(euclidean_lower[j] <= matrix.min() + 1e-9 and matrix.max() <= euclidean_upper[j] + 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -62,5 +62,21 @@ class TestQuadTreeHeatMap(TestBase):
 
         geopandas.testing.assert_geodataframe_equal(computed_geodf, right_geodf)
 
+    def test_projected(self):
+
+        self.dataset.project()
+        method = AnalysisMethodFactory.get('QuadTreeHeatMap', self.dataset, {})
+        method.run()
+        result = method.get_result()
+
+        # The sectors are still given in longitude and latitude
+        right_P = shapely.wkt.loads('POLYGON((1.2534032695145003 41.12490951149509, 1.2534032695145003 41.132811329826694, '
+                              '1.27464798381945 41.132811329826694, 1.27464798381945 41.12490951149509, '
+                              '1.2534032695145003 41.12490951149509))')
+
+        self.assertEqual(len(result), 46)
+        self.assertTrue(result['geometry'][0].equals_exact(right_P, 1e-9))
+
+
 if __name__ == '__main__':
     unittest.main()
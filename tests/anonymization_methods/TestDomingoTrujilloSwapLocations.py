@@ -0,0 +1,26 @@
+import unittest
+
+from entities.Dataset import Dataset
+from mdl_anonymizer.aggregation.Martinez2021.mean_trajectory import Mean_trajectory
+from mdl_anonymizer.anonymization_methods.DomingoTrujillo_2012.SwapLocations.SwapLocations import SwapLocations
+from tests import TEST_ROOT_DIR
+from tests.TestBase import TestBase
+
+
+class TestDomingoTrujilloSwapLocations(TestBase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.dataset = Dataset()
+        path = f"{TEST_ROOT_DIR}/../examples/data/mock_dataset.csv"
+        self.dataset.from_file(path)
+
+    def test_default_aggregation(self):
+        swap_locations = SwapLocations(self.dataset, 3, 60, 0.5)
+
+        self.assertIs(swap_locations.aggregation_method, Mean_trajectory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,65 @@
 import unittest
 
+import numpy as np
+
 from entities.Dataset import Dataset
 from factories.anonymization_method_factory import AnonymizationMethodFactory
+from mdl_anonymizer.clustering.MDAV.SimpleMDAV import SimpleMDAV
+from mdl_anonymizer.clustering.MDAV.SimpleMDAVDataset import SimpleMDAVDataset
+from mdl_anonymizer.distances.trajectory.Martinez2021.Distance import Distance
+from mdl_anonymizer.entities.TimestampedLocation import TimestampedLocation
+from mdl_anonymizer.entities.Trajectory import Trajectory
 from tests import TEST_ROOT_DIR
 from tests.TestBase import TestBase
 
 
+class UnboundedDistance(Distance):
+    def bounds_many(self, reference, candidates):
+        return None
+
+
+class ArrayMDAVDataset(SimpleMDAVDataset):
+    '''
+    Eligible trajectories deleted from an array and every distance evaluated, as SimpleMDAVDataset did before pruning
+    the queries and tracking the eligible trajectories with a mask
+    '''
+
+    def __init__(self, dataset, distance):
+        super().__init__(dataset, distance)
+        self.trajectories_elegible = np.array(dataset.trajectories)
+
+    def make_cluster(self, traj, k):
+        self.trajectories_elegible = self.trajectories_elegible[np.argpartition(self.distances, k-1)]
+        closest = [traj]
+        closest.extend(self.trajectories_elegible[:k-1])
+        self.trajectories_elegible = self.trajectories_elegible[k-1:]
+
+        for t in closest:
+            self.assigned_to[t.index] = self.cluster_id
+        self.cluster_id += 1
+
+    def make_cluster_unselected(self):
+        for t in self.trajectories_elegible:
+            self.assigned_to[t.index] = self.cluster_id
+        self.cluster_id += 1
+
+    def farthest_from(self, traj):
+        self.calculate_distances(traj)
+        index = np.argmax(self.distances)
+        farthest = self.trajectories_elegible[index]
+        self.trajectories_elegible = np.delete(self.trajectories_elegible, index)
+        # As SimpleMDAV.run did, so the distances from r are those of the trajectories left for its cluster
+        self.distances = np.delete(self.distances, index)
+
+        return farthest, index
+
+    def calculate_distances(self, traj):
+        self.distances = self.distance.compute_many(traj, self.trajectories_elegible)
+
+    def unselected_length(self):
+        return len(self.trajectories_elegible)
+
+
 class TestMicroAggregation(TestBase):
 
     def setUp(self):
@@ -55,6 +109,89 @@ class TestMicroAggregation(TestBase):
         self.assertEqual(anon_dataset.get_max_timestamp(), 1669051109)
         self.assertEqual(anon_dataset.get_n_locations_longest_trajectory(), 12)
 
+    def test_pruning(self):
+        for k in [3, 5]:
+            mdav = SimpleMDAV(self.dataset, Distance(self.dataset, p_lambda=0.16))
+            mdav.run(k)
+            stats = mdav.mdav_dataset.pruning_stats()
+            self.assertLess(stats['evaluated'], stats['candidates'])
+
+            # Same clusters as evaluating every distance
+            unbounded_mdav = SimpleMDAV(self.dataset, UnboundedDistance(self.dataset, p_lambda=0.16))
+            unbounded_mdav.run(k)
+            self.assertEqual(mdav.mdav_dataset.assigned_to, unbounded_mdav.mdav_dataset.assigned_to)
+            self.assertEqual(unbounded_mdav.mdav_dataset.pruning_stats()['pruning_rate'], 0.0)
+
+    def test_baseline_order(self):
+        # Every trajectory twice, so there are ties at every cluster
+        tied_dataset = Dataset()
+        for t in self.dataset.trajectories:
+            tied_dataset.add_trajectory(t)
+            duplicate = Trajectory(f"{t.id}_duplicate", t.user_id)
+            duplicate.add_locations([TimestampedLocation(l.timestamp, l.x, l.y) for l in t.locations])
+            tied_dataset.add_trajectory(duplicate)
+
+        for dataset in [self.dataset, tied_dataset]:
+            for k in [3, 5, 7]:
+                baseline_mdav = SimpleMDAV(dataset)
+                baseline_mdav.mdav_dataset = ArrayMDAVDataset(dataset, Distance(dataset, p_lambda=0.16))
+                baseline_mdav.run(k)
+                expected = list(baseline_mdav.mdav_dataset.assigned_to.items())
+
+                # Same clusters, assigned in the same order, whether the farthest queries are pruned or not
+                for distance_class in [Distance, UnboundedDistance]:
+                    mdav = SimpleMDAV(dataset, distance_class(dataset, p_lambda=0.16))
+                    mdav.run(k)
+                    self.assertEqual(list(mdav.mdav_dataset.assigned_to.items()), expected)
+
+    def test_eligibility(self):
+        mdav = SimpleMDAV(self.dataset, Distance(self.dataset, p_lambda=0.16))
+        mdav_dataset = mdav.mdav_dataset
+        trajectories = mdav_dataset.trajectories
+
+        farthest, _ = mdav_dataset.farthest_from(mdav_dataset.compute_centroid())
+        self.assertFalse(mdav_dataset.eligible[farthest.index])
+        mdav_dataset.calculate_distances(farthest)
+        mdav_dataset.make_cluster(farthest, 3)
+        self.assertEqual(mdav_dataset.unselected_length(), 43)
+        self.assertEqual(list(mdav_dataset.assigned_to.values()), [0, 0, 0])
+        self.assertFalse(mdav_dataset.eligible[list(mdav_dataset.assigned_to)].any())
+
+        # Every trajectory is assigned once, and the trajectories are never moved
+        mdav.run(3)
+        self.assertEqual(sorted(mdav_dataset.assigned_to), list(range(46)))
+        self.assertIs(mdav_dataset.trajectories, trajectories)
+        self.assertEqual([t.index for t in trajectories], list(range(46)))
+
+    def test_projected(self):
+        def params():
+            # The factory replaces the parameters by the built objects
+            return {
+                'aggregation_method': {
+                    'name': 'Closest_trajectory_to_mean_trajectory',
+                    'params': {'p_lambda': 0.16}
+                }
+            }
+
+        method = AnonymizationMethodFactory.get("Microaggregation", self.dataset, params())
+        method.run()
+
+        projected_dataset = Dataset()
+        projected_dataset.from_file(f"{TEST_ROOT_DIR}/../examples/data/mock_dataset.csv")
+        projected_dataset.project()
+        projected_method = AnonymizationMethodFactory.get("Microaggregation", projected_dataset, params())
+        projected_method.run()
+        anon_dataset = projected_method.get_anonymized_dataset()
+
+        # Same clusters and same representatives as with longitude and latitude
+        self.assertTrue(anon_dataset.is_projected())
+        self.assertEqual(projected_method.clustering_method.mdav_dataset.assigned_to,
+                         method.clustering_method.mdav_dataset.assigned_to)
+        self.assertEqual(len(anon_dataset), 46)
+        self.assertEqual(anon_dataset.get_number_of_locations(), 316)
+        self.assertEqual(anon_dataset.get_min_timestamp(), 1669043570)
+        self.assertEqual(anon_dataset.get_max_timestamp(), 1669050191)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -137,5 +137,11 @@ class TestProtectedGeneralization(TestBase):
         self.assertEqual(anon_dataset.trajectories[1].locations[0].y, 41.11511993408203)
         self.assertEqual(anon_dataset.trajectories[1].locations[0].timestamp, 1669044651)
 
+    def test_projected(self):
+        self.dataset.project()
+        with self.assertRaises(ValueError):
+            AnonymizationMethodFactory.get("ProtectedGeneralization", self.dataset)
+
+
 if __name__ == '__main__':
     unittest.main()
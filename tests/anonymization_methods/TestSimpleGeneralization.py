@@ -71,6 +71,19 @@ class TestSimpleGeneralization(TestBase):
         self.assertEqual(anon_dataset.trajectories[1].locations[0].y, 41.11441558826653)
         self.assertEqual(anon_dataset.trajectories[1].locations[0].timestamp, 1669044651)
 
+    def test_projected(self):
+        self.dataset.project()
+        simple_generalization = AnonymizationMethodFactory.get("SimpleGeneralization", self.dataset)
+        simple_generalization.run()
+        anon_dataset = simple_generalization.get_anonymized_dataset()
+
+        self.assertTrue(anon_dataset.is_projected())
+        self.assertEqual(len(anon_dataset), 46)
+        self.assertEqual(anon_dataset.get_number_of_locations(), 383)
+        self.assertEqual(anon_dataset.get_min_timestamp(), 1669043011)
+        self.assertEqual(anon_dataset.get_max_timestamp(), 1669058195)
+        self.assertEqual(anon_dataset.get_n_locations_longest_trajectory(), 28)
+
 
 if __name__ == '__main__':
     unittest.main()
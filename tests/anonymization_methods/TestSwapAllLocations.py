@@ -53,6 +53,23 @@ class TestSwapLocations(TestBase):
         self.assertEqual(anon_dataset.get_max_timestamp(), 1669048450)
         self.assertEqual(anon_dataset.get_n_locations_longest_trajectory(), 9)
 
+    def test_projected(self):
+        self.dataset.project()
+        swap_locations = AnonymizationMethodFactory.get("SwapAllLocations", self.dataset, {'seed': 42})
+        swap_locations.run()
+        anon_dataset = swap_locations.get_anonymized_dataset()
+
+        # The tiles are laid in meters, so the result is close to (but not the same as) the unprojected one
+        self.assertTrue(anon_dataset.is_projected())
+        self.assertEqual(len(anon_dataset), 35)
+        self.assertEqual(anon_dataset.get_number_of_locations(), 153)
+        self.assertEqual(anon_dataset.get_min_timestamp(), 1669044573)
+        self.assertEqual(anon_dataset.get_max_timestamp(), 1669048033)
+
+        anon_dataset.unproject()
+        self.assertAlmostEqual(anon_dataset.trajectories[1].locations[0].x, 1.23931, places=5)
+        self.assertAlmostEqual(anon_dataset.trajectories[1].locations[0].y, 41.117374, places=5)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,7 @@ import unittest
 
 from entities.Dataset import Dataset
 from factories.anonymization_method_factory import AnonymizationMethodFactory
+from mdl_anonymizer.anonymization_methods.SwapMob import SwapMob as swapmob_module
 from tests import TEST_ROOT_DIR
 from tests.TestBase import TestBase
 
@@ -48,6 +49,33 @@ class TestSwapMob(TestBase):
         self.assertEqual(anon_dataset.get_max_timestamp(), 1669048131)
         self.assertEqual(anon_dataset.get_n_locations_longest_trajectory(), 12)
 
+    def test_possible_swaps_blocks(self):
+        method = swapmob_module.SwapMob(self.dataset, spatial_thold=0.5)
+        locs = self.dataset.to_numpy(sort_by_timestamp=True)[:300]
+        possible_swaps = method.get_possible_swaps(locs)
+        self.assertGreater(len(possible_swaps), 0)
+
+        # Same swaps when the locations are compared by small blocks
+        block = swapmob_module.POSSIBLE_SWAPS_BLOCK
+        try:
+            swapmob_module.POSSIBLE_SWAPS_BLOCK = 7
+            self.assertEqual(method.get_possible_swaps(locs), possible_swaps)
+        finally:
+            swapmob_module.POSSIBLE_SWAPS_BLOCK = block
+
+    def test_projected(self):
+        self.dataset.project()
+        swap_locations = AnonymizationMethodFactory.get("SwapMob", self.dataset, {'seed': 23})
+        swap_locations.run()
+        anon_dataset = swap_locations.get_anonymized_dataset()
+
+        # Same swaps as with longitude and latitude
+        self.assertTrue(anon_dataset.is_projected())
+        self.assertEqual(len(anon_dataset), 28)
+        self.assertEqual(anon_dataset.get_number_of_locations(), 260)
+        self.assertEqual(anon_dataset.get_min_timestamp(), 1669043570)
+        self.assertEqual(anon_dataset.get_max_timestamp(), 1669056327)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -57,6 +57,19 @@ class TestTimePartitionMicroAggregation(TestBase):
         self.assertEqual(anon_dataset.get_max_timestamp(), 1669050490)
         self.assertEqual(anon_dataset.get_n_locations_longest_trajectory(), 15)
 
+    def test_projected(self):
+        self.dataset.project()
+        method = AnonymizationMethodFactory.get("TimePartMicroaggregation", self.dataset)
+        method.run()
+        anon_dataset = method.get_anonymized_dataset()
+
+        self.assertTrue(anon_dataset.is_projected())
+        self.assertEqual(len(anon_dataset), 46)
+        self.assertEqual(anon_dataset.get_number_of_locations(), 382)
+        self.assertEqual(anon_dataset.get_min_timestamp(), 1669043640)
+        self.assertEqual(anon_dataset.get_max_timestamp(), 1669052037)
+        self.assertEqual(anon_dataset.get_n_locations_longest_trajectory(), 14)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,130 @@
+import math
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from entities.Dataset import Dataset
+from mdl_anonymizer.distances.trajectory.DomingoTrujillo2012.DistanceGraph import DistanceGraph, \
+    synchronized_distance
+from mdl_anonymizer.distances.trajectory.DomingoTrujillo2012.TrajectoryUtils import get_contemporary_pairs, \
+    get_p_contemporary
+from tests import TEST_ROOT_DIR
+from tests.TestBase import TestBase
+
+
+class TestDistanceGraph(TestBase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.dataset = Dataset()
+        path = f"{TEST_ROOT_DIR}/../examples/data/mock_dataset.csv"
+        self.dataset.from_file(path)
+
+    def test_contemporary_pairs(self):
+        trajectories = self.dataset.trajectories
+        blocks = list(get_contemporary_pairs(trajectories))
+        pairs = np.concatenate(blocks).tolist()
+        for block in blocks:
+            self.assertEqual(block.tolist(), sorted(block.tolist()))
+
+        # Every p-contemporary pair is found
+        expected = [[i, j] for i in range(len(trajectories)) for j in range(i + 1, len(trajectories))
+                    if get_p_contemporary(trajectories[i], trajectories[j]) > 0]
+        self.assertTrue(set(map(tuple, expected)) <= set(map(tuple, pairs)))
+        self.assertLess(len(pairs), len(trajectories) * (len(trajectories) - 1) // 2)
+
+        # Same pairs by smaller blocks
+        blocks = list(get_contemporary_pairs(trajectories, block_size=5))
+        self.assertGreater(len(blocks), 1)
+        self.assertEqual(sorted(np.concatenate(blocks).tolist()), sorted(pairs))
+
+    def test_graph(self):
+        graph = DistanceGraph(self.dataset)
+        graph.compute()
+
+        self.assertEqual(len(graph.get_nodes()), 46)
+        for t1, t2, d in graph.graph.edges(data='weight'):
+            self.assertEqual(d, graph.get_distance(t1, t2))
+            self.assertEqual(d, graph.get_distance(t2, t1))
+
+        # Same weights computed by a pool of processes
+        parallel_graph = DistanceGraph(self.dataset, n_jobs=2)
+        parallel_graph.compute()
+        self.assertEqual(sorted(parallel_graph.graph.edges(data='weight')), sorted(graph.graph.edges(data='weight')))
+
+    def test_synchronized_distance(self):
+        timestamps_1 = np.array([0, 10, 20], dtype=np.int64)
+        xs_1 = np.array([0.0, 1.0, 2.0])
+        ys_1 = np.zeros(3)
+        d = synchronized_distance(timestamps_1, xs_1, ys_1, timestamps_1, xs_1 + 3, ys_1 + 4)
+        self.assertEqual(d, math.sqrt(3 * 25 / 400) / 100)
+
+        # The second trajectory lacks a timestamp of the overlap
+        with self.assertRaises(Exception):
+            synchronized_distance(timestamps_1, xs_1, ys_1, np.array([0, 15, 20], dtype=np.int64), xs_1, ys_1)
+
+    def test_add_node(self):
+        graph = DistanceGraph(self.dataset)
+        graph.compute()
+
+        # Adding a trajectory only inserts its new timestamps, as synchronizing the whole dataset again
+        new_t = self.dataset.trajectories.pop()
+        partial_graph = DistanceGraph(self.dataset)
+        partial_graph.compute()
+        partial_graph.add_node(new_t)
+
+        self.assertEqual(len(partial_graph.synchronyzed_trajectories), len(graph.synchronyzed_trajectories))
+        for t1, t2 in zip(partial_graph.synchronyzed_trajectories, graph.synchronyzed_trajectories):
+            self.assertEqual(t1.id, t2.id)
+            for array1, array2 in zip(t1.get_arrays(), t2.get_arrays()):
+                np.testing.assert_array_equal(array1, array2)
+        self.assertTrue(partial_graph.is_included(new_t.id))
+
+    def test_batched_shortest_paths(self):
+        graph = DistanceGraph(self.dataset)
+        graph.compute()
+        batched_graph = DistanceGraph(self.dataset, batch_size=8)
+        batched_graph.compute()
+
+        ids = [t.id for t in self.dataset.trajectories]
+        batched_graph.compute_shortest_paths(ids[:20])
+        self.assertEqual(len(batched_graph.shortest_paths), 20)
+
+        for id_1 in ids:
+            for id_2 in ids:
+                try:
+                    d = graph.get_graph_distance(id_1, id_2)
+                except nx.NetworkXNoPath:
+                    with self.assertRaises(nx.NetworkXNoPath):
+                        batched_graph.get_graph_distance(id_1, id_2)
+                    continue
+                self.assertAlmostEqual(batched_graph.get_graph_distance(id_1, id_2), d, delta=1e-12 * d)
+
+        # A miss computes the shortest paths of up to batch_size sources at once
+        prefetching_graph = DistanceGraph(self.dataset, batch_size=8)
+        prefetching_graph.compute()
+        id_1, id_2 = next((id_1, id_2) for id_1 in ids for id_2 in ids
+                          if id_1 != id_2 and not prefetching_graph.graph.has_edge(id_1, id_2))
+        try:
+            prefetching_graph.get_graph_distance(id_1, id_2)
+        except nx.NetworkXNoPath:
+            pass
+        self.assertEqual(len(prefetching_graph.shortest_paths), 8)
+        self.assertIn(id_1, prefetching_graph.shortest_paths)
+
+        # Unknown trajectories are not nodes of the graph
+        for g in [graph, batched_graph]:
+            with self.assertRaises(nx.NodeNotFound):
+                g.get_graph_distance(ids[0], 'unknown')
+            with self.assertRaises(nx.NodeNotFound):
+                g.get_graph_distance('unknown', ids[0])
+
+        # A new node makes the cached shortest paths stale
+        batched_graph.add_node(self.dataset.trajectories[0])
+        self.assertEqual(len(batched_graph.shortest_paths), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+
+from entities.Dataset import Dataset
+from entities.Trajectory import Trajectory
+from mdl_anonymizer.distances.trajectory.DistanceMatrix import DistanceMatrix, SLRUCache
+from tests import TEST_ROOT_DIR
+from tests.TestBase import TestBase
+
+
+class TestDistanceMatrix(TestBase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.dataset = Dataset()
+        path = f"{TEST_ROOT_DIR}/../examples/data/mock_dataset.csv"
+        self.dataset.from_file(path)
+
+    def test_store(self):
+        trajectories = self.dataset.trajectories
+        centroid = Trajectory("C_1")
+
+        # The condensed matrix of 46 trajectories takes 4140 bytes
+        for max_bytes in [None, 4000]:
+            matrix = DistanceMatrix(trajectories, max_bytes=max_bytes)
+            self.assertEqual(matrix.dense, max_bytes is None)
+
+            self.assertIsNone(matrix.get(trajectories[0], trajectories[1]))
+            matrix.put(trajectories[1], trajectories[0], 0.5)
+            matrix.put(centroid, trajectories[2], 2.0)
+            self.assertEqual(matrix.get(trajectories[0], trajectories[1]), 0.5)
+            self.assertEqual(matrix.get(trajectories[2], centroid), 2.0)
+
+            matrix.put_many(trajectories[3], trajectories[:5], np.arange(5, dtype=np.float64))
+            distances = matrix.get_many(trajectories[3], trajectories[:6])
+            self.assertEqual(distances[:3].tolist(), [0, 1, 2])
+            # The distance of a trajectory to itself is always 0, the not computed ones are missing
+            self.assertEqual(distances[3], 0)
+            self.assertEqual(distances[4], 4)
+            self.assertTrue(np.isnan(distances[5]))
+
+            self.assertEqual(matrix.get(trajectories[3], trajectories[3]), 0)
+            matrix.put(centroid, centroid, 1.0)
+            self.assertEqual(matrix.get(centroid, centroid), 0)
+
+            self.assertEqual(matrix.stats()['hits'], 9)
+            self.assertEqual(matrix.stats()['misses'], 2)
+
+            matrix.clear()
+            self.assertIsNone(matrix.get(trajectories[0], trajectories[1]))
+
+    def test_bounded_cache(self):
+        matrix = DistanceMatrix(self.dataset.trajectories, max_bytes=1500)
+        self.assertFalse(matrix.dense)
+        self.assertEqual(matrix.cache.capacity, 10)
+
+        reference = self.dataset.trajectories[0]
+        matrix.put_many(reference, self.dataset.trajectories[1:], np.arange(1, 46, dtype=np.float64))
+        self.assertEqual(len(matrix.cache), 10)
+        self.assertEqual(matrix.stats()['evictions'], 35)
+        # The cached distances and that of the reference to itself
+        self.assertEqual(np.count_nonzero(~np.isnan(matrix.get_many(reference, self.dataset.trajectories))), 11)
+
+    def test_slru(self):
+        cache = SLRUCache(5)
+        for key in range(5):
+            cache.put(key, key)
+        # Hit entries are protected
+        cache.get(0)
+        cache.get(1)
+        for key in range(5, 8):
+            cache.put(key, key)
+
+        self.assertEqual(len(cache), 5)
+        self.assertEqual(cache.evictions, 3)
+        self.assertEqual(cache.get(0), 0)
+        self.assertEqual(cache.get(1), 1)
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(7), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,16 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
 
+import numpy as np
+
+from entities.ColumnarDataset import ColumnarDataset
 from entities.Dataset import Dataset
 from factories.anonymization_method_factory import AnonymizationMethodFactory
 from factories.trajectory_distance_factory import TrajectoryDistanceFactory
+from mdl_anonymizer.distances.trajectory.Martinez2021 import Distance as martinez_module
+from mdl_anonymizer.distances.trajectory.Martinez2021.Distance import resampled_indices
 from tests import TEST_ROOT_DIR
 from tests.TestBase import TestBase
 
@@ -20,7 +28,7 @@ class TestMartinez2021distance(TestBase):
         distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset)
         d = distance.compute(self.dataset.get_trajectory(1), self.dataset.get_trajectory(2))
 
-        self.assertEqual(d, 937.0414983342348)
+        self.assertEqual(d, 937.04150390625)
 
     def test_lambda(self):
         params = {
@@ -30,7 +38,7 @@ class TestMartinez2021distance(TestBase):
         distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, params)
         d = distance.compute(self.dataset.get_trajectory(3), self.dataset.get_trajectory(4))
 
-        self.assertEqual(d, 2168.2984763410896)
+        self.assertEqual(d, 2168.298583984375)
 
     def test_lambda_max_distance(self):
         params = {
@@ -41,7 +49,7 @@ class TestMartinez2021distance(TestBase):
         distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, params)
         d = distance.compute(self.dataset.get_trajectory(1), self.dataset.get_trajectory(2))
 
-        self.assertEqual(d, 0.047126622056823324)
+        self.assertEqual(d, 0.04712662100791931)
 
     def test_normalize(self):
         params = {
@@ -50,7 +58,158 @@ class TestMartinez2021distance(TestBase):
         distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, params)
         d = distance.compute(self.dataset.get_trajectory(1), self.dataset.get_trajectory(2))
 
-        self.assertEqual(d, 0.04716909971646222)
+        self.assertEqual(d, 0.04716910049319267)
+
+    def test_normalize_columnar(self):
+        dataset = ColumnarDataset()
+        dataset.from_file(f"{TEST_ROOT_DIR}/../examples/data/mock_dataset.csv")
+        distance = TrajectoryDistanceFactory.get("Martinez2021", dataset, {'normalized': True})
+        d = distance.compute(dataset.get_trajectory(1), dataset.get_trajectory(2))
+        self.assertEqual(d, 0.04716910049319267)
+
+        distance.compute_reference_trajectory()
+        location = distance.reference_trajectory.locations[0]
+        self.assertEqual(location.timestamp, dataset.get_min_timestamp())
+        self.assertEqual((location.x, location.y), (float(dataset.lon.min()), float(dataset.lat.min())))
+
+        # The locations of the trajectories are not accessed, so they are still views of the dataset
+        self.assertTrue(dataset.is_packed())
+
+    def test_compute_many(self):
+        distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, {'normalized': True})
+        reference = self.dataset.get_trajectory(1)
+        expected = [distance.compute_without_map(reference, t) for t in self.dataset.trajectories]
+
+        # Computed distances are rounded to the precision of the distance matrix (float32)
+        distances = distance.compute_many(reference, self.dataset.trajectories)
+        self.assertEqual(distances.shape, (46,))
+        np.testing.assert_array_equal(distances, np.float32(expected))
+
+        # So they are the same as the stored ones
+        # The distance of the reference to itself is always a hit
+        self.assertEqual(distance.compute(reference, self.dataset.get_trajectory(2)), distances[1])
+        self.assertEqual(distance.distance_matrix.stats()['hits'], 2)
+        np.testing.assert_array_equal(distance.compute_many(reference, self.dataset.trajectories), distances)
+
+        # Also those computed one by one
+        other = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, {'normalized': True})
+        self.assertEqual(other.compute(reference, self.dataset.get_trajectory(2)), distances[1])
+        self.assertEqual(other.compute(reference, self.dataset.get_trajectory(2)), distances[1])
+        self.assertEqual(other.distance_matrix.stats()['hits'], 1)
+
+    def test_precompute(self):
+        params = {
+            'p_lambda': 0.16,
+            'max_dist': 19865,
+            'normalized': True
+        }
+        distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, dict(params))
+        expected = [distance.compute_many_without_map(t, self.dataset.trajectories[i + 1:])
+                    for i, t in enumerate(self.dataset.trajectories)]
+        expected = np.concatenate(expected).astype(np.float32)
+
+        for n_jobs in [1, 2]:
+            distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset,
+                                                     dict(params, precompute=True, n_jobs=n_jobs))
+            self.assertTrue(np.array_equal(distance.distance_matrix.condensed, expected))
+
+            # Every distance is known, including that of the trajectory to itself
+            distance.compute_many(self.dataset.get_trajectory(1), self.dataset.trajectories)
+            self.assertEqual(distance.cache_stats()['misses'], 0)
+
+    def test_cache_folder(self):
+        params = {
+            'p_lambda': 0.16,
+        }
+        with tempfile.TemporaryDirectory() as folder:
+            distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, dict(params, cache_folder=folder))
+            d = distance.compute(self.dataset.get_trajectory(3), self.dataset.get_trajectory(4))
+            self.assertEqual(len(os.listdir(folder)), 1)
+
+            # Reused by the next run
+            distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, dict(params, cache_folder=folder))
+            self.assertEqual(distance.compute(self.dataset.get_trajectory(4), self.dataset.get_trajectory(3)),
+                             np.float32(d))
+            self.assertEqual(distance.cache_stats()['hits'], 1)
+
+            # Other parameters, other file
+            TrajectoryDistanceFactory.get("Martinez2021", self.dataset, {'p_lambda': 0.2, 'cache_folder': folder})
+            self.assertEqual(len(os.listdir(folder)), 2)
+
+    def test_lambda_estimation(self):
+        distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset)
+        low, high = distance.lambda_confidence_interval
+        self.assertTrue(low < distance.p_lambda < high)
+        # The estimation does not use the distance cache
+        self.assertEqual(distance.cache_stats()['cached'], 0)
+        self.assertTrue(np.isnan(distance.distance_matrix.condensed).all())
+
+        parallel_distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, {'n_jobs': 2})
+        self.assertAlmostEqual(parallel_distance.p_lambda, distance.p_lambda, places=12)
+        self.assertAlmostEqual(parallel_distance.max_dist, distance.max_dist, places=6)
+
+        # Same sample for the same seed
+        params = {'sample_size': 20, 'seed': 1}
+        sampled_distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, dict(params))
+        self.assertEqual(TrajectoryDistanceFactory.get("Martinez2021", self.dataset, dict(params)).p_lambda,
+                         sampled_distance.p_lambda)
+        self.assertNotEqual(sampled_distance.p_lambda, distance.p_lambda)
+
+    def test_lambda_cache_folder(self):
+        with tempfile.TemporaryDirectory() as folder:
+            distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, {'cache_folder': folder})
+            self.assertEqual(len(os.listdir(folder)), 2)
+
+            # Reused by the next run, without estimating it again
+            with mock.patch.object(martinez_module, 'sum_component_rows', side_effect=AssertionError):
+                stored_distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, {'cache_folder': folder})
+            self.assertEqual(stored_distance.p_lambda, distance.p_lambda)
+            self.assertEqual(stored_distance.max_dist, distance.max_dist)
+            self.assertEqual(stored_distance.lambda_confidence_interval, distance.lambda_confidence_interval)
+            self.assertEqual(len(os.listdir(folder)), 2)
+
+            # Other sample, other file
+            params = {'cache_folder': folder, 'sample_size': 20, 'seed': 1}
+            sampled_distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, params)
+            self.assertNotEqual(sampled_distance.p_lambda, distance.p_lambda)
+            self.assertEqual(len([f for f in os.listdir(folder) if f.endswith('.json')]), 2)
+
+    def test_bounds(self):
+        for params in [{'p_lambda': 0.16}, {'p_lambda': 0.16, 'max_dist': 19865, 'normalized': True}]:
+            distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, dict(params))
+            for t in self.dataset.trajectories:
+                lower, upper = distance.bounds_many(t, self.dataset.trajectories)
+                distances = distance.compute_many_without_map(t, self.dataset.trajectories)
+                self.assertTrue(np.all(lower <= distances))
+                self.assertTrue(np.all(distances <= upper))
+
+    def test_compute_bounded(self):
+        distance = TrajectoryDistanceFactory.get("Martinez2021", self.dataset, {'p_lambda': 0.16})
+        t1, t2 = self.dataset.get_trajectory(3), self.dataset.get_trajectory(4)
+        d = distance.compute_without_map(t1, t2)
+        self.assertEqual(distance.compute_bounded(t1, t2, d * 1.01), d)
+        self.assertEqual(distance.compute_bounded(t1, t2, d * 0.99), np.inf)
+
+        # Same nearest trajectory, with its exact distance
+        for t in self.dataset.trajectories:
+            distances = distance.compute_many_without_map(t, self.dataset.trajectories)
+            bounded_distances = distance.compute_many_bounded(t, self.dataset.trajectories)
+            self.assertEqual(np.argmin(bounded_distances), np.argmin(distances))
+            self.assertEqual(np.min(bounded_distances), np.min(distances))
+            self.assertTrue(np.all(np.isinf(bounded_distances) | (bounded_distances == distances)))
+
+    def test_resampled_indices(self):
+        for length_1 in range(1, 60):
+            for length_2 in range(1, 60):
+                h = round((length_1 + length_2) / 2)
+                gap = length_1 / h
+                index = 0
+                expected = []
+                for _ in range(h):
+                    expected.append(min(round(index), length_1 - 1))
+                    index += gap
+
+                self.assertEqual(resampled_indices(length_1, h).tolist(), expected)
 
 
 if __name__ == '__main__':
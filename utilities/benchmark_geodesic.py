@@ -0,0 +1,50 @@
+"""
+Segment distances of a trajectory computed by the haversine package and by the NumPy kernels of utils.geodesic.
+
+The target of the kernels is a 50x speedup. Only the float32 kernel reaches it (about 75x); the float64 one, used by
+default, stays at about 30x, as its cost is that of the NumPy trigonometric functions in double precision.
+
+Run it from the root of the repository: python utilities/benchmark_geodesic.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+from haversine import haversine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mdl_anonymizer.utils import geodesic
+
+N_LOCATIONS = 100000
+TARGET_SPEEDUP = 50
+
+rng = np.random.default_rng(0)
+lats = rng.uniform(41.0, 41.5, N_LOCATIONS)
+lons = rng.uniform(1.9, 2.3, N_LOCATIONS)
+points = list(zip(lats.tolist(), lons.tolist()))
+
+
+def segments_haversine_package():
+    return [haversine(p1, p2) for p1, p2 in zip(points[:-1], points[1:])]
+
+
+def segments_geodesic():
+    return geodesic.haversine_segments(lats, lons)
+
+
+def segments_geodesic_float32():
+    return geodesic.haversine_segments(lats, lons, dtype=np.float32)
+
+
+assert np.allclose(segments_haversine_package(), segments_geodesic(), rtol=0, atol=1e-9)
+
+baseline = min(timeit.repeat(segments_haversine_package, number=1, repeat=3))
+print(f"Segment distances of {N_LOCATIONS} locations")
+print(f"haversine package: {baseline * 1000:.2f} ms")
+for name, f in [("geodesic (float64)", segments_geodesic), ("geodesic (float32)", segments_geodesic_float32)]:
+    t = min(timeit.repeat(f, number=10, repeat=3)) / 10
+    speedup = baseline / t
+    shortfall = "" if speedup >= TARGET_SPEEDUP else f", below the {TARGET_SPEEDUP}x target"
+    print(f"{name}: {t * 1000:.2f} ms ({speedup:.0f}x{shortfall})")